@@ -0,0 +1,374 @@
+"""
+Struct-of-arrays representation of a program for inputs too large for the objects of while_ast.
+
+The Parser fills an Arena directly when given one as its nodes (see while_ast.Nodes). A node is an index into parallel
+arrays instead of an object, and its Loc is kept as two offsets. The Parser creates every node after its children, so
+the nodes are in postorder and the nodes of an expression are contiguous: it is checked, evaluated and emitted by a
+single pass over its range, operands first. Statements are walked with an explicit stack.
+The meaning of the columns depends on the kind of the node:
+    kind    op        a       b       c          d
+    LIT               const                      first
+    BOOL              value                      first
+    SYM               name    decl               first
+    BIN     operator  lhs     rhs                first
+    UNARY   operator  rhs                        first
+    ERR                                          first
+    DECL    type      init    name    slot       counter
+    ASSIGN            init    name    decl
+    LIST              item    number
+    IF                cond    cons    alt
+    WHILE             cond    body
+    PROG              stmt    ret     num_slots
+first is the first node of an expression, item the index of the first statement of a list in Arena.items, counter the
+DeclStmt.counter of the declaration; decl, slot and num_slots as well as the column ty, the type of an expression, are
+set by check.
+"""
+
+import operator
+from array import array
+from collections import Counter
+
+from closure import BIN_OPS
+from loc import Loc
+from tok import Tag
+from while_ast import Emit, Sema, same
+
+LIT, BOOL, SYM, BIN, UNARY, ERR, DECL, ASSIGN, LIST, IF, WHILE, PROG = range(12)
+CLASSES = ("LitExpr", "BoolExpr", "SymExpr", "BinExpr", "UnaryExpr", "ErrExpr",
+           "DeclStmt", "AssignStmt", "StmtList", "IfStmt", "WhileStmt", "Prog")
+
+TAGS      = {0: None, **{tag.value: tag for tag in Tag}} # codes of types and operators
+BIN_FUNCS = {tag.value: func for tag, func in BIN_OPS.items()}
+UNARY_FUNCS = {Tag.T_ADD.value: operator.pos, Tag.T_SUB.value: operator.neg, Tag.K_NOT.value: operator.not_}
+
+PUSH, POP = -1, -2 # tasks on the stack of check besides nodes
+
+class Arena: # pylint: disable=too-many-instance-attributes # one per column
+    def __init__(self):
+        self.kind   = array("B")
+        self.op     = array("B")
+        self.ty     = array("B")
+        self.a      = array("i")
+        self.b      = array("i")
+        self.c      = array("i")
+        self.d      = array("i")
+        self.begin  = array("i")
+        self.finis  = array("i")
+        self.items  = array("i") # statements of the StmtLists
+        self.names  = []         # identifiers
+        self.consts = []         # literals
+        self.ids    = {}         # identifier (str) or literal (int) -> its index in names or consts
+        self.src    = None
+        self.num_decls = 0 # see while_ast.Nodes
+
+    def __len__(self):
+        return len(self.kind)
+
+    def add(self, kind, loc, cols):
+        """
+        Appends a node of kind at loc with the columns (op, a, b, c, d); d is None for the first node of an expression.
+        """
+        node = len(self.kind)
+        op, a, b, c, d = cols
+        self.src = loc.src
+        self.kind.append(kind)
+        self.op.append(op)
+        self.ty.append(0)
+        self.a.append(a)
+        self.b.append(b)
+        self.c.append(c)
+        self.d.append(node if d is None else d)
+        self.begin.append(loc.begin)
+        self.finis.append(loc.finis)
+        return node
+
+    def intern(self, table, val):
+        if (idx := self.ids.get(val)) is None:
+            idx = self.ids[val] = len(table)
+            table.append(val)
+        return idx
+
+    def loc(self, node):
+        return Loc(self.src, self.begin[node], self.finis[node])
+
+    def classes(self):
+        """
+        Number of nodes per AST class, like opt.nodes would yield them.
+        """
+        return Counter(CLASSES[kind] for kind in self.kind)
+
+    # builders; see while_ast.Nodes
+
+    def prog(self, loc, stmt, ret):
+        return self.add(PROG, loc, (0, stmt, ret, 0, 0))
+
+    def decl_stmt(self, loc, ty, sym, init):
+        self.num_decls += 1
+        return self.add(DECL, loc, (ty.value, init, self.intern(self.names, sym.sym), -1, self.num_decls - 1))
+
+    def assign_stmt(self, loc, sym, init):
+        return self.add(ASSIGN, loc, (0, init, self.intern(self.names, sym.sym), -1, 0))
+
+    def stmt_list(self, loc, stmts):
+        self.items.extend(stmts)
+        return self.add(LIST, loc, (0, len(self.items) - len(stmts), len(stmts), 0, 0))
+
+    def if_stmt(self, loc, cond, cons, alt):
+        return self.add(IF, loc, (0, cond, cons, alt, 0))
+
+    def while_stmt(self, loc, cond, body):
+        return self.add(WHILE, loc, (0, cond, body, 0, 0))
+
+    def bin_expr(self, loc, lhs, op, rhs):
+        return self.add(BIN, loc, (op.value, lhs, rhs, 0, self.d[lhs]))
+
+    def unary_expr(self, loc, op, rhs):
+        return self.add(UNARY, loc, (op.value, rhs, 0, 0, self.d[rhs]))
+
+    def bool_expr(self, loc, val):
+        return self.add(BOOL, loc, (0, int(val), 0, 0, None))
+
+    def sym_expr(self, loc, tok):
+        return self.add(SYM, loc, (0, self.intern(self.names, tok.sym), -1, 0, None))
+
+    def lit_expr(self, loc, val):
+        return self.add(LIT, loc, (0, self.intern(self.consts, val), 0, 0, None))
+
+    def err_expr(self, loc):
+        return self.add(ERR, loc, (0, 0, 0, 0, None))
+
+    # traversals of the program, the last node
+
+    def check(self, diags = None):
+        Checker(self, diags).prog(len(self) - 1)
+
+    def eval(self, fuel = None):
+        prog = len(self) - 1
+        kind, a, b, c, items = self.kind, self.a, self.b, self.c, self.items
+        env   = [None] * c[prog]
+        stack = [a[prog]]
+        while stack:
+            node = stack.pop()
+            if kind[node] == LIST:
+                stack.extend(reversed(items[a[node]:a[node] + b[node]]))
+            elif kind[node] == DECL:
+                env[c[node]] = self.value(a[node], env)
+            elif kind[node] == ASSIGN:
+                env[c[c[node]]] = self.value(a[node], env)
+            elif kind[node] == IF:
+                stack.append(b[node] if self.value(a[node], env) else c[node])
+            elif kind[node] == WHILE:
+                if self.value(a[node], env):
+                    stack += (node, b[node])
+                    if fuel is not None:
+                        fuel.tick(self.loc(node))
+        print(self.value(b[prog], env))
+
+    def value(self, expr, env):
+        kind, op, a, b, c, consts = self.kind, self.op, self.a, self.b, self.c, self.consts
+        vals = []
+        for node in range(self.d[expr], expr + 1):
+            if kind[node] == SYM:
+                vals.append(env[c[b[node]]])
+            elif kind[node] == LIT:
+                vals.append(consts[a[node]])
+            elif kind[node] == BIN:
+                rhs = vals.pop()
+                vals[-1] = BIN_FUNCS[op[node]](vals[-1], rhs)
+            elif kind[node] == UNARY:
+                vals[-1] = UNARY_FUNCS[op[node]](vals[-1])
+            elif kind[node] == BOOL:
+                vals.append(bool(a[node]))
+        return vals[-1]
+
+    def emit(self, out):
+        Writer(self, out).prog(len(self) - 1)
+
+class Checker:
+    """
+    Prog.check for an Arena, with the same diagnostics in the same order.
+    """
+    def __init__(self, arena, diags):
+        self.arena = arena
+        self.sema  = Sema(diags) # maps name indices to DECL nodes
+        self.diags = self.sema.diags
+        self.names = arena.names
+
+    def prog(self, prog):
+        arena = self.arena
+        stack = [arena.a[prog]]
+        while stack:
+            task = stack.pop()
+            if task == PUSH:
+                self.sema.push()
+            elif task == POP:
+                self.sema.pop()
+            else:
+                self.stmt(task, stack)
+        self.expr(arena.b[prog])
+        arena.c[prog] = self.sema.max_slots
+
+    def stmt(self, stmt, stack):
+        arena = self.arena
+        kind, a, b = arena.kind[stmt], arena.a[stmt], arena.b[stmt]
+        if kind == LIST:
+            stack.extend(reversed(arena.items[a:a + b]))
+        elif kind == DECL:
+            init_ty, ty = self.expr(a), TAGS[arena.op[stmt]]
+            if not same(init_ty, ty):
+                self.diags.err(arena.loc(stmt), f"initialization of declaration statement is of type '{init_ty}' but '{self.names[b]}' is declared of type '{ty}'")
+            self.bind(b, stmt)
+            arena.c[stmt] = self.sema.alloc()
+        elif kind == ASSIGN:
+            init_ty = self.expr(a)
+            decl    = arena.c[stmt] = self.find(b, Loc(arena.src, arena.begin[stmt], arena.begin[stmt] + len(self.names[b]) - 1))
+            if decl >= 0 and not same(init_ty, TAGS[arena.op[decl]]):
+                self.diags.err(arena.loc(stmt), f"right-hand side of asssignment statement is of type '{init_ty}' but '{self.names[b]}' is declared of type '{TAGS[arena.op[decl]]}'")
+                self.diags.note(arena.loc(decl), "previous declaration here")
+        else:
+            cond_ty = self.expr(a)
+            if not same(cond_ty, Tag.K_BOOL):
+                self.diags.err(arena.loc(a), f"condition of {'an if' if kind == IF else 'a while'} statement must be of type `bool` but is of type '{cond_ty}'")
+            stack += (POP, arena.c[stmt], PUSH, POP, b, PUSH) if kind == IF else (POP, b, PUSH)
+
+    def expr(self, expr):
+        """
+        Checks the nodes of expr in postorder and returns its type.
+        """
+        arena = self.arena
+        kind, op, ty, a, b = arena.kind, arena.op, arena.ty, arena.a, arena.b
+        for node in range(arena.d[expr], expr + 1):
+            if kind[node] == SYM:
+                decl = b[node] = self.find(a[node], arena.loc(node))
+                ty[node] = arena.op[decl] if decl >= 0 else 0
+            elif kind[node] == LIT:
+                ty[node] = Tag.K_INT.value
+            elif kind[node] == BOOL:
+                ty[node] = Tag.K_BOOL.value
+            elif kind[node] == BIN:
+                self.bin_expr(node)
+            elif kind[node] == UNARY:
+                tag = TAGS[op[node]]
+                expected_ty = Tag.K_BOOL if tag is Tag.K_NOT else Tag.K_INT
+                if not same(TAGS[ty[a[node]]], expected_ty):
+                    self.diags.err(arena.loc(a[node]), f"operand of operator '{tag}' must be of type '{expected_ty}' but is of type '{TAGS[ty[a[node]]]}'")
+                ty[node] = expected_ty.value
+        return TAGS[ty[expr]]
+
+    def bin_expr(self, node):
+        arena = self.arena
+        tag   = TAGS[arena.op[node]]
+        expected_ty = Tag.K_BOOL if tag.is_logic() else Tag.K_INT
+        l_ty, r_ty  = TAGS[arena.ty[arena.a[node]]], TAGS[arena.ty[arena.b[node]]]
+        if not same(l_ty, expected_ty):
+            self.diags.err(arena.loc(arena.a[node]), f"left-hand side of operator '{tag}' must be of type '{expected_ty}' but is of type '{l_ty}'")
+        if not same(r_ty, expected_ty):
+            self.diags.err(arena.loc(arena.b[node]), f"right-hand side of operator '{tag}' must be of type '{expected_ty}' but is of type '{r_ty}'")
+        arena.ty[node] = (Tag.K_INT if tag.is_arith() else Tag.K_BOOL).value
+
+    def find(self, name, loc):
+        if (decl := self.sema.lookup(name)) is not None:
+            return decl
+        self.diags.err(loc, f"identifier '{self.names[name]}' not found")
+        return -1
+
+    def bind(self, name, decl):
+        if self.names[name] == "<error>":
+            return
+        if (prev := self.sema.insert(name, decl)) is not None:
+            self.diags.err(self.arena.loc(decl), f"redeclaration of '{self.names[name]}' in the same scope")
+            self.diags.note(self.arena.loc(prev), "previous declaration here")
+
+class Writer:
+    """
+    Prog.emit for an Arena, with the same output.
+    """
+    def __init__(self, arena, out):
+        self.arena = arena
+        self.out   = out
+
+    def prog(self, prog):
+        arena, out = self.arena, self.out
+        ret_ty = TAGS[arena.ty[arena.b[prog]]]
+        if out.emit is Emit.C:
+            out.c_prologue(ret_ty)
+            out.indent()
+        stack = [arena.a[prog]]
+        while stack:
+            task = stack.pop()
+            if isinstance(task, str):
+                out.write(task)
+            elif callable(task):
+                task()
+            else:
+                self.stmt(task, stack)
+        out.ret_head(ret_ty)
+        out.write(self.expr(arena.b[prog]))
+        out.ret_tail(ret_ty)
+
+    def stmt(self, stmt, stack):
+        """
+        Writes what precedes the nested statements of stmt and pushes what follows as tasks in reverse order:
+        nodes to emit, strings to write and indent/dedent.
+        """
+        arena, out = self.arena, self.out
+        kind, a, b, c = arena.kind[stmt], arena.a[stmt], arena.b[stmt], arena.c[stmt]
+        if kind == LIST:
+            if out.emit is Emit.PY and b == 0:
+                out.write(f"{out.ind}pass\n")
+            for item in reversed(arena.items[a:a + b]):
+                stack += ("\n", item, out.ind)
+        elif kind == DECL:
+            if out.emit is Emit.PY:
+                out.write(f"{self.var(stmt)} = {self.expr(a)}")
+            else:
+                out.write(f"{TAGS[arena.op[stmt]]} {self.var(stmt)} = {self.expr(a)};")
+        elif kind == ASSIGN:
+            out.write(f"{self.var(c, b)} = {self.expr(a)}" + ("" if out.emit is Emit.PY else ";"))
+        else:
+            head = "if" if kind == IF else "while"
+            if out.emit is Emit.WHILE:
+                out.write(f"{head} {self.expr(a)} {{\n")
+            elif out.emit is Emit.C:
+                out.write(f"{head} ({self.expr(a)}) {{\n")
+            else:
+                out.write(f"{head} {self.expr(a)}:\n")
+            tasks = [out.indent, b, out.dedent]
+            if kind == IF:
+                tasks += [f"{out.ind}else:\n" if out.emit is Emit.PY else f"{out.ind}}} else {{\n", out.indent, c, out.dedent]
+            if out.emit is not Emit.PY:
+                tasks.append(f"{out.ind}}}")
+            stack += reversed(tasks)
+
+    def var(self, decl, name = None):
+        """
+        Name of the variable declared by decl, or of the identifier name if decl is not resolved; see while_ast.name.
+        """
+        arena, emit = self.arena, self.out.emit
+        if decl < 0:              return arena.names[name]
+        if emit is Emit.WHILE:    return arena.names[arena.b[decl]]
+        if emit is Emit.C:        return f"_{arena.names[arena.b[decl]]}"
+        return f"{arena.names[arena.b[decl]]}_{arena.d[decl]}"
+
+    def expr(self, expr):
+        arena, emit = self.arena, self.out.emit
+        kind, op, a, b = arena.kind, arena.op, arena.a, arena.b
+        texts = []
+        for node in range(arena.d[expr], expr + 1):
+            if kind[node] == SYM:
+                texts.append(self.var(b[node], a[node]))
+            elif kind[node] == LIT:
+                texts.append(f"{arena.consts[a[node]]}")
+            elif kind[node] == BIN:
+                rhs = texts.pop()
+                tag = TAGS[op[node]]
+                sym = {Tag.K_AND: "&", Tag.K_OR: "|"}.get(tag, str(tag)) if emit is Emit.C else str(tag)
+                texts[-1] = f"({texts[-1]} {sym} {rhs})"
+            elif kind[node] == UNARY:
+                sym = "!" if emit is Emit.C and TAGS[op[node]] is Tag.K_NOT else str(TAGS[op[node]])
+                texts[-1] = f"{sym}({texts[-1]})"
+            elif kind[node] == BOOL:
+                texts.append(("True" if a[node] else "False") if emit is Emit.PY else ("true" if a[node] else "false"))
+            else:
+                texts.append("<error>")
+        return texts[-1]
@@ -0,0 +1,236 @@
+"""
+--batch: runs a checked Prog once per row of a table, with all rows at once.
+
+The columns of the table override the initializers of top-level DeclStmts. Every variable holds a NumPy array with one
+lane per row, and each statement runs on all lanes at once under a mask of the lanes that reached it:
+    * an IfStmt runs each branch with the lanes whose condition selects it,
+    * a WhileStmt runs its body as long as its condition holds in any lane, with the other lanes masked off,
+    * an AssignStmt only changes the lanes of the mask.
+Expressions have no side effects, so they are computed for all lanes.
+The lanes are int64 at first. A lane whose arithmetic overflows is dropped, and the dropped rows run again on arrays of
+Python ints, which is slower but exact.
+A fuel.Fuel counts the iterations of loops over all lanes at once as steps.
+NumPy is only needed for --batch.
+"""
+
+import csv
+import re
+import sys
+
+try:
+    import numpy as np
+except ImportError:
+    np = None # pylint: disable=invalid-name
+
+from closure import BIN_OPS
+from tok import Tag
+from while_ast import DeclStmt, AssignStmt, StmtList, IfStmt, WhileStmt, \
+    BinExpr, UnaryExpr, BoolExpr, LitExpr, SymExpr, run
+
+INT64_MIN = -2**63
+INT64_MAX =  2**63 - 1
+
+class Lanes:
+    """
+    Evaluates a Prog on arrays; with exact, they hold Python ints and never overflow.
+    """
+    def __init__(self, alive, exact, overrides, fuel = None):
+        self.exact     = exact
+        self.overrides = overrides # id(DeclStmt) -> array
+        self.alive     = alive     # lanes that did not overflow
+        self.mask      = alive     # lanes that execute the current statement
+        self.env       = None
+        self.fuel      = fuel
+
+    def drop(self, overflow):
+        overflow = overflow & self.mask
+        if overflow.any():
+            self.alive = self.alive & ~overflow
+            self.mask  = self.mask  & ~overflow
+
+    def spread(self, val):
+        """
+        With exact, turns a value that does not depend on the rows, still a scalar, into an array of the lanes: NumPy
+        cannot hold a Python int beyond int64 otherwise.
+        """
+        if not self.exact or isinstance(val, np.ndarray):
+            return val
+        return np.full(self.alive.shape, val, dtype=bool if isinstance(val, np.bool_) else object)
+
+    # Prog
+
+    def prog(self, prog):
+        self.env = [None] * prog.num_slots
+        run(self.stmt(prog.stmt))
+        ret = run(self.expr(prog.ret))
+        return np.broadcast_to(self.spread(ret), self.alive.shape).tolist()
+
+    # Stmt
+
+    def stmt(self, stmt):
+        env = self.env
+        if isinstance(stmt, DeclStmt):
+            # no lane outside the mask reads this slot before declaring it again, so all lanes may be overwritten
+            if (val := self.overrides.get(id(stmt))) is None:
+                val = yield self.expr(stmt.init)
+            env[stmt.slot] = self.spread(val)
+        elif isinstance(stmt, AssignStmt):
+            val = yield self.expr(stmt.init)
+            env[stmt.decl.slot] = np.where(self.mask, self.spread(val), env[stmt.decl.slot])
+        elif isinstance(stmt, StmtList):
+            for inner in stmt.stmts:
+                yield self.stmt(inner)
+        elif isinstance(stmt, WhileStmt):
+            yield self.while_stmt(stmt)
+        elif isinstance(stmt, IfStmt):
+            yield self.if_stmt(stmt)
+        else:
+            assert False
+
+    def if_stmt(self, if_stmt):
+        cond  = yield self.expr(if_stmt.cond)
+        outer = self.mask
+        for block, mask in ((if_stmt.cons, outer & cond), (if_stmt.alt, outer & np.logical_not(cond))):
+            self.mask = mask & self.alive
+            if self.mask.any():
+                yield self.stmt(block)
+        self.mask = outer & self.alive
+
+    def while_stmt(self, while_stmt):
+        outer = self.mask
+        while True:
+            cond = yield self.expr(while_stmt.cond)
+            self.mask = self.mask & cond & self.alive
+            if not self.mask.any():
+                break
+            if self.fuel is not None:
+                self.fuel.tick(while_stmt.loc)
+            yield self.stmt(while_stmt.body)
+        self.mask = outer & self.alive
+
+    # Expr
+
+    def expr(self, expr):
+        if isinstance(expr, BinExpr):
+            lhs = yield self.expr(expr.lhs)
+            rhs = yield self.expr(expr.rhs)
+            return self.bin_expr(expr.op, lhs, rhs)
+        if isinstance(expr, UnaryExpr):
+            rhs = yield self.expr(expr.rhs)
+            if expr.op is Tag.K_NOT:
+                return np.logical_not(rhs)
+            if expr.op is Tag.T_SUB:
+                if not self.exact:
+                    self.drop(rhs == INT64_MIN)
+                return -rhs
+            return rhs
+        if isinstance(expr, SymExpr):
+            return self.env[expr.decl.slot]
+        if isinstance(expr, BoolExpr):
+            return np.bool_(expr.val)
+        if isinstance(expr, LitExpr):
+            if self.exact:
+                return self.spread(expr.val)
+            if not INT64_MIN <= expr.val <= INT64_MAX:
+                self.drop(self.mask)
+                return np.int64(0)
+            return np.int64(expr.val)
+        assert False
+
+    def bin_expr(self, op, lhs, rhs):
+        res = BIN_OPS[op](lhs, rhs)
+        if self.exact:
+            return res
+        # int64 wraps around silently
+        if op is Tag.T_ADD:
+            self.drop(((lhs ^ res) & (rhs ^ res)) < 0)
+        elif op is Tag.T_SUB:
+            self.drop(((lhs ^ rhs) & (lhs ^ res)) < 0)
+        elif op is Tag.T_MUL:
+            # the product in floating point is off by far less than a factor of 2
+            self.drop(np.abs(np.multiply(lhs, rhs, dtype=np.float64)) >= 2.0**62)
+        return res
+
+def lanes64(decls, columns, num_rows):
+    """
+    Returns the rows whose values fit into int64 and the overrides of the declarations decls by columns for them.
+    """
+    fits = np.ones(num_rows, dtype=bool)
+    fast = {}
+    for decl, column in zip(decls, columns):
+        if decl.ty is Tag.K_INT:
+            fits &= (column >= INT64_MIN) & (column <= INT64_MAX)
+            fast[id(decl)] = np.where(fits, column, 0).astype(np.int64)
+        else:
+            fast[id(decl)] = column.astype(bool)
+    return fits, fast
+
+def inputs(prog):
+    """
+    Returns the top-level DeclStmts by name: those whose initializers the columns of a table may override.
+    """
+    return {stmt.sym.sym: stmt for stmt in prog.stmt.stmts if isinstance(stmt, DeclStmt)}
+
+def evaluate(prog, names, rows, fuel = None):
+    """
+    Returns the result of prog for each of the rows, tuples of values for the top-level declarations called names.
+    """
+    if np is None:
+        sys.exit("error: --batch requires NumPy")
+    tops = inputs(prog)
+    for name in names:
+        if name not in tops:
+            sys.exit(f"error: '{name}' is not declared at the top level of the program")
+    decls   = [tops[name] for name in names]
+    columns = [np.array([row[col] for row in rows], dtype=object) for col in range(len(names))]
+
+    fits, fast = lanes64(decls, columns, len(rows))
+    with np.errstate(over="ignore"):
+        lanes   = Lanes(fits, False, fast, fuel)
+        results = lanes.prog(prog)
+    dropped = np.flatnonzero(~lanes.alive)
+    if dropped.size:
+        for row, res in zip(dropped.tolist(), evaluate_exact(prog, decls, columns, dropped, fuel)):
+            results[row] = res
+    return results
+
+def evaluate_exact(prog, decls, columns, rows, fuel):
+    """
+    Returns the results of prog with Python ints for the rows dropped from the int64 lanes.
+    """
+    exact = {id(decl): column[rows] if decl.ty is Tag.K_INT else column[rows].astype(bool)
+             for decl, column in zip(decls, columns)}
+    return Lanes(np.ones(rows.size, dtype=bool), True, exact, fuel).prog(prog)
+
+def read_table(filename, decls):
+    """
+    Reads a CSV file whose header names top-level declarations and whose rows hold values for them.
+    decls maps these names to their types; returns the names and the rows.
+    """
+    with open(filename, "r", encoding="ASCII", newline="") as file:
+        lines = list(csv.reader(file))
+    if not lines:
+        sys.exit(f"error: {filename}: missing header")
+    names, rows = [name.strip() for name in lines[0]], []
+    for num, line in enumerate(lines[1:], 2):
+        if len(line) != len(names):
+            sys.exit(f"error: {filename}:{num}: expected {len(names)} value(s) but found {len(line)}")
+        row = []
+        for name, text in zip(names, map(str.strip, line)):
+            if decls.get(name) is Tag.K_BOOL and text in ("true", "false"):
+                row.append(text == "true")
+            elif decls.get(name) is not Tag.K_BOOL and re.fullmatch(r"-?[0-9]+", text):
+                row.append(int(text))
+            else:
+                sys.exit(f"error: {filename}:{num}: invalid value '{text}' for '{name}'")
+        rows.append(tuple(row))
+    return names, rows
+
+def run_table(prog, filename, fuel = None):
+    """
+    Prints the result of prog for each row of the table in filename.
+    """
+    decls       = {stmt.sym.sym: stmt.ty for stmt in prog.stmt.stmts if isinstance(stmt, DeclStmt)}
+    names, rows = read_table(filename, decls)
+    results     = evaluate(prog, names, rows, fuel)
+    sys.stdout.write("".join(f"{res}\n" for res in results))
@@ -0,0 +1,3 @@
+"""
+Benchmarks; run them from the repository root, e.g. `python -m bench.lex`.
+"""
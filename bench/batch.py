@@ -0,0 +1,84 @@
+"""
+Compares --batch to running the closure engine once per row, on test/fib.while and test/sum.while over many values of
+n, on a program whose constants exceed int64, so that all of its rows run again on Python ints, and on one whose loop
+-O1 replaces by a closed form in n. Each program is also run with --batch at -O1, which must give the same results.
+"""
+
+import argparse
+import contextlib
+import io
+import random
+import time
+
+import batch
+import closure
+import opt
+from bench.eval import parse
+from while_ast import DeclStmt, LitExpr
+
+BIG = """int n = 0;
+int a = 5000000000;
+a = a * a;
+int big = 100000000000000000000;
+if n > 45 {
+    big = -big;
+}
+return a + n + big;
+"""
+
+EVENS = """int n = 0;
+int s = 0;
+int i = 0;
+while i < n {
+    s = s + 2 * i;
+    i = i + 1;
+}
+return s;
+"""
+
+def compare(name, prog, rows):
+    """
+    Times prog on rows with --batch and then once per row with closure, which must agree; returns the results.
+    """
+    start   = time.perf_counter()
+    results = batch.evaluate(prog, ["n"], rows)
+    secs    = time.perf_counter() - start
+    print(f"{name}: batch:   {secs:.3f}s ({len(rows) / secs:,.0f} rows/s)")
+
+    decl = next(stmt for stmt in prog.stmt.stmts if isinstance(stmt, DeclStmt) and stmt.sym.sym == "n")
+    out  = io.StringIO()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(out):
+        for (n,) in rows:
+            decl.init = LitExpr(decl.init.loc, n)
+            closure.eval_prog(prog)
+    base  = time.perf_counter() - start
+    print(f"{name}: closure: {base:.3f}s ({len(rows) / base:,.0f} rows/s), {base / secs:.1f}x slower")
+    assert out.getvalue().split() == [str(res) for res in results], f"batch disagrees with closure on {name}"
+    return results
+
+def main():
+    cli = argparse.ArgumentParser(description=__doc__)
+    cli.add_argument("--rows", type=int, default=100000, help="number of values of n")
+    cli.add_argument("--max",  type=int, default=90,     help="largest n; beyond 92, the result exceeds int64")
+    cli.add_argument("--seed", type=int, default=1,      help="seed of the values of n")
+    args = cli.parse_args()
+
+    rng  = random.Random(args.seed)
+    rows = [(rng.randint(0, args.max),) for _ in range(args.rows)]
+
+    texts = {}
+    for name in ("fib.while", "sum.while"):
+        with open(f"test/{name}", "r", encoding="ASCII") as file:
+            texts[name] = file.read()
+    texts["big.while"]   = BIG
+    texts["evens.while"] = EVENS
+    for name, text in texts.items():
+        results = compare(name, parse(name, text), rows)
+        prog    = parse(name, text)
+        closed  = opt.optimize(prog, batch.inputs(prog).values())["closed loops"]
+        assert batch.evaluate(prog, ["n"], rows) == results, f"batch at -O1 disagrees on {name}"
+        print(f"{name}: batch at -O1 agrees, {closed} closed loop(s)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Times parse, check, eval and emit on deeply nested machine-generated programs, and checks that the engines, among them
+the default one, closure, agree.
+"""
+
+import argparse
+import io
+import os
+import sys
+import tempfile
+import time
+
+from parse import Parser
+import closure
+import vm
+import while_ast
+
+SHAPES = {
+    # left-associative chain: the lhs spine is as deep as the chain is long
+    "chain" : lambda n: "int a = 1;\nreturn " + " + ".join(["a"] * n) + ";\n",
+    # right-nested parenthesized expression
+    "parens": lambda n: "int a = 1;\nreturn " + "(a + " * n + "a" + ")" * n + ";\n",
+    "unary" : lambda n: "return " + "-" * n + "1;\n",
+    # every loop runs once: the innermost body terminates all of them
+    # note that the emitted indentation grows with the depth: emitting this shape is quadratic, hence --block-depth
+    "while" : lambda n: "int x = 0;\n" + "while x < 1 {\n" * n + "x = x + 1;\n" + "}\n" * n + "return x;\n",
+}
+
+def measure(path):
+    times = {}
+    with open(path, "r", encoding="ASCII") as file:
+        start = time.perf_counter()
+        prog  = Parser(file).parse_prog()
+        times["parse"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    prog.check()
+    times["check"] = time.perf_counter() - start
+
+    out  = sys.stdout
+    res  = {}
+    for engine, run in (("ast", prog.eval), ("closure", lambda: closure.eval_prog(prog)),
+                        ("vm", lambda: vm.eval_prog(prog))):
+        sys.stdout = io.StringIO()
+        try:
+            start = time.perf_counter()
+            run()
+            times[f"eval {engine}"] = time.perf_counter() - start
+            res[engine] = sys.stdout.getvalue()
+        finally:
+            sys.stdout = out
+    assert len(set(res.values())) == 1, f"the engines disagree on {path}: {res}"
+
+    start = time.perf_counter()
+    prog.emit(while_ast.Emitter(io.StringIO(), while_ast.Emit.WHILE))
+    times["emit"] = time.perf_counter() - start
+    return times
+
+def main():
+    cli = argparse.ArgumentParser(description=__doc__)
+    cli.add_argument("--depth", type=int, default=100000, help="nesting depth of the generated programs")
+    cli.add_argument("--block-depth", type=int, default=10000, help="nesting depth of the generated while loops")
+    cli.add_argument("--shapes", nargs="+", choices=SHAPES, default=list(SHAPES), help="programs to generate")
+    args = cli.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for shape in args.shapes:
+            depth = args.block_depth if shape == "while" else args.depth
+            path  = os.path.join(tmp, f"{shape}.while")
+            with open(path, "w", encoding="ASCII") as file:
+                file.write(SHAPES[shape](depth))
+
+            times  = measure(path)
+            total  = sum(times.values())
+            phases = ", ".join(f"{phase}: {secs:.3f}s" for phase, secs in times.items())
+            print(f"{shape:<6} depth={depth}  {phases}  ({depth / total:,.0f} levels/s)")
+
+if __name__ == "__main__":
+    main()
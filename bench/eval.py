@@ -0,0 +1,65 @@
+"""
+Compares the evaluation engines on test/fib.while and test/fac.while scaled to a large n.
+"""
+
+import argparse
+import contextlib
+import io
+import re
+import sys
+import time
+
+import closure
+import ir
+import tier
+import vm
+from parse import Parser
+
+def scaled(path, n):
+    with open(path, "r", encoding="ASCII") as file:
+        text = file.read()
+    return re.sub(r"int n = \d+;", f"int n = {n};", text, count=1)
+
+def parse(name, text):
+    file = io.StringIO(text)
+    file.name = name
+    prog = Parser(file).parse_prog()
+    prog.check()
+    return prog
+
+ENGINES = {
+    "ast"    : lambda prog: prog.eval(),
+    "tier"   : lambda prog: prog.eval(tier.Tiering().run),
+    "closure": closure.eval_prog,
+    "vm"     : vm.eval_prog,
+    "ir"     : lambda prog: ir.eval_func(ir.build(prog)),
+}
+
+def measure(engine, prog):
+    out   = io.StringIO()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(out):
+        engine(prog)
+    return time.perf_counter() - start, out.getvalue()
+
+def main():
+    cli = argparse.ArgumentParser(description=__doc__)
+    cli.add_argument("--fib", type=int, default=100000, help="n for test/fib.while")
+    cli.add_argument("--fac", type=int, default=20000,  help="n for test/fac.while")
+    cli.add_argument("--engines", nargs="+", default=list(ENGINES), choices=list(ENGINES), help="engines to compare")
+    args = cli.parse_args()
+
+    if hasattr(sys, "set_int_max_str_digits"):
+        sys.set_int_max_str_digits(0) # results of large n have many digits
+
+    for path, n in (("test/fib.while", args.fib), ("test/fac.while", args.fac)):
+        prog = parse(path, scaled(path, n))
+        base, expected = None, None
+        for name in args.engines:
+            secs, out = measure(ENGINES[name], prog)
+            assert expected is None or out == expected, f"{name} disagrees on {path}"
+            base, expected = base or secs, out
+            print(f"{path} n={n} {name:>8}: {secs:.3f}s ({base / secs:.1f}x)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""
+Measures what --max-steps and --timeout cost each engine (see fuel.py).
+
+Every engine runs a loop of cheap statements on small ints, where counting the steps weighs most, once without limits
+and once with limits too large to be hit.
+"""
+
+import argparse
+
+import closure
+import fuel
+import ir
+import pyexec
+import tier
+import vm
+from bench.eval import measure, parse
+
+PROG = """int n = {n};
+int s = 0;
+int i = 0;
+while i < n {{
+    s = s + i;
+    if s > 1000 {{
+        s = s - 1000;
+    }}
+    i = i + 1;
+}}
+return s;
+"""
+
+ENGINES = {
+    "ast"    : lambda prog, limits: prog.eval(tier.Tiering(threshold=float("inf"), fuel=limits).run),
+    "tier"   : lambda prog, limits: prog.eval(tier.Tiering(fuel=limits).run),
+    "closure": closure.eval_prog,
+    "vm"     : vm.eval_prog,
+    "ir"     : lambda prog, limits: ir.eval_func(ir.build(prog), limits),
+    "py"     : lambda prog, limits: pyexec.run(pyexec.compile_prog(prog, "<bench>", limits is not None), limits),
+}
+
+def main():
+    cli = argparse.ArgumentParser(description=__doc__)
+    cli.add_argument("-n", type=int, default=300000, help="iterations of the loop")
+    cli.add_argument("--engines", nargs="+", default=list(ENGINES), choices=list(ENGINES), help="engines to compare")
+    args = cli.parse_args()
+
+    prog = parse("fuel.while", PROG.format(n=args.n))
+    for name in args.engines:
+        engine     = ENGINES[name]
+        free, out  = measure(lambda prog: engine(prog, None), prog) # pylint: disable=cell-var-from-loop
+        fueled, fo = measure(lambda prog: engine(prog, fuel.Fuel(2**62, 1e9)), prog) # pylint: disable=cell-var-from-loop
+        assert out == fo, f"{name} disagrees with limits"
+        print(f"{name:>8}: {free:.3f}s without limits, {fueled:.3f}s with ({(fueled / free - 1) * 100:+.1f}%)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+"""
+Generates random, type-correct and terminating While programs.
+
+The output only depends on the seed and the parameters:
+    stmts   number of top-level statements
+    depth   maximal nesting depth of if/while blocks
+    trips   maximal trip count of each loop
+All ints stay within INT_BOUND times a small factor, so the C backend, which computes with int, agrees with the others.
+Every loop has its own counter, which bounds the trip count and is never assigned otherwise.
+"""
+
+import argparse
+import random
+import sys
+
+INT_BOUND = 1000000
+REL_OPS   = ("==", "!=", "<", "<=", ">", ">=")
+
+class Generator:
+    def __init__(self, seed, trips = 10):
+        self.rng    = random.Random(seed)
+        self.trips  = trips
+        self.scopes = [] # per scope: [(name, type, assignable)]
+        self.count  = 0
+        self.lines  = []
+        self.ind    = ""
+
+    def fresh(self, prefix):
+        self.count += 1
+        return f"{prefix}{self.count}"
+
+    def vars(self, ty, assignable = False):
+        visible = {}
+        for scope in self.scopes:
+            for name, var_ty, var_assignable in scope:
+                visible[name] = (var_ty, var_assignable) # inner declarations shadow outer ones
+        return [name for name, (var_ty, var_assignable) in visible.items()
+                if var_ty == ty and (var_assignable or not assignable)]
+
+    def line(self, text):
+        self.lines.append(f"{self.ind}{text}\n")
+
+    # Expr
+
+    def lit(self):
+        return str(self.rng.randint(0, 9))
+
+    def term(self):
+        """
+        A variable, a literal or a variable scaled by a literal: at most 9 * INT_BOUND.
+        """
+        names = self.vars("int")
+        roll  = self.rng.random()
+        if not names or roll < 0.25:
+            return self.lit()
+        name = self.rng.choice(names)
+        if roll < 0.4:
+            return f"{self.lit()} * {name}"
+        if roll < 0.5:
+            return f"-{name}"
+        return name
+
+    def int_expr(self):
+        """
+        The sum of up to four terms.
+        """
+        res = self.term()
+        for _ in range(self.rng.randint(0, 3)):
+            res += f" {self.rng.choice('+-')} {self.term()}"
+        return res
+
+    def bool_expr(self, depth = 2):
+        roll  = self.rng.random()
+        names = self.vars("bool")
+        if depth == 0 or roll < 0.2:
+            if names and roll < 0.15:
+                return self.rng.choice(names)
+            if roll < 0.05:
+                return self.rng.choice(("true", "false"))
+            return f"{self.term()} {self.rng.choice(REL_OPS)} {self.term()}"
+        if roll < 0.3:
+            return f"not ({self.bool_expr(depth - 1)})"
+        if roll < 0.7:
+            return f"{self.int_expr()} {self.rng.choice(REL_OPS)} {self.int_expr()}"
+        return f"({self.bool_expr(depth - 1)}) {self.rng.choice(('and', 'or'))} ({self.bool_expr(depth - 1)})"
+
+    # Stmt
+
+    def clamp(self, name):
+        self.line(f"if {name} > {INT_BOUND} or {name} < -{INT_BOUND} {{ {name} = {self.lit()}; }}")
+
+    def decl(self):
+        if self.rng.random() < 0.7:
+            name, init = self.fresh("x"), self.int_expr()
+            self.line(f"int {name} = {init};")
+            self.scopes[-1].append((name, "int", True))
+            self.clamp(name)
+        else:
+            name, init = self.fresh("b"), self.bool_expr()
+            self.line(f"bool {name} = {init};")
+            self.scopes[-1].append((name, "bool", True))
+
+    def assign(self):
+        ints, bools = self.vars("int", True), self.vars("bool", True)
+        if ints and (not bools or self.rng.random() < 0.7):
+            name = self.rng.choice(ints)
+            self.line(f"{name} = {self.int_expr()};")
+            self.clamp(name)
+        elif bools:
+            name = self.rng.choice(bools)
+            self.line(f"{name} = {self.bool_expr()};")
+        else:
+            self.decl()
+
+    def open(self, head):
+        self.line(head + " {")
+        self.scopes.append([])
+        self.ind += "    "
+
+    def close(self, tail = "}"):
+        self.ind = self.ind[:-4]
+        self.scopes.pop()
+        self.line(tail)
+
+    def body(self, depth):
+        for _ in range(self.rng.randint(1, 4)):
+            self.stmt(depth - 1)
+
+    def stmt(self, depth):
+        roll = self.rng.random()
+        if depth > 0 and roll < 0.15:
+            self.open(f"if {self.bool_expr()}")
+            self.body(depth)
+            if self.rng.random() < 0.5:
+                self.close("} else {")
+                self.scopes.append([])
+                self.ind += "    "
+                self.body(depth)
+            self.close()
+        elif depth > 0 and roll < 0.25:
+            counter = self.fresh("i")
+            self.line(f"int {counter} = 0;")
+            self.scopes[-1].append((counter, "int", False))
+            cond = f"{counter} < {self.rng.randint(0, self.trips)}"
+            if self.rng.random() < 0.3:
+                cond += f" and ({self.bool_expr(1)})"
+            self.open(f"while {cond}")
+            self.body(depth)
+            self.line(f"{counter} = {counter} + 1;")
+            self.close()
+        elif roll < 0.45:
+            self.decl()
+        else:
+            self.assign()
+
+    def prog(self, stmts = 100, depth = 3):
+        self.scopes = [[]]
+        self.lines  = []
+        self.decl()
+        for _ in range(stmts):
+            self.stmt(depth)
+        ints = self.vars("int")
+        self.line(f"return {' + '.join(self.rng.sample(ints, min(3, len(ints))))};")
+        return "".join(self.lines)
+
+def generate(seed, stmts = 100, depth = 3, trips = 10):
+    return Generator(seed, trips).prog(stmts, depth)
+
+def main():
+    cli = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    cli.add_argument("--seed",  type=int, default=0,   help="random seed")
+    cli.add_argument("--stmts", type=int, default=100, help="number of top-level statements")
+    cli.add_argument("--depth", type=int, default=3,   help="maximal nesting depth")
+    cli.add_argument("--trips", type=int, default=10,  help="maximal trip count of each loop")
+    args = cli.parse_args()
+    sys.stdout.write(generate(args.seed, args.stmts, args.depth, args.trips))
+
+if __name__ == "__main__":
+    main()
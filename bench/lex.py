@@ -0,0 +1,61 @@
+"""
+Compares tokens/sec of the char-by-char Lexer against the BufLexer on large inputs.
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+from lexer import Lexer, BufLexer
+from tok import Tag
+
+STMT = """int x{i} = {i};
+while x{i} >= 1 and not (x{i} == 42) {{
+    x{i} = x{i} - 1;
+    bool b{i} = x{i} != 3 or x{i} <= 7;
+}}
+"""
+
+def generate(path, stmts):
+    with open(path, "w", encoding="ASCII") as file:
+        for i in range(stmts):
+            file.write(STMT.format(i=i))
+        file.write("return 0;\n")
+
+def tokens(lexer_class, path):
+    with open(path, "r", encoding="ASCII") as file:
+        lexer = lexer_class(file)
+        while True:
+            tok = lexer.lex()
+            yield tok
+            if tok.isa(Tag.M_EOF): return
+
+def key(tok):
+    return (tok.tag, str(tok), str(tok.loc))
+
+def measure(lexer_class, path):
+    start = time.perf_counter()
+    num   = sum(1 for _ in tokens(lexer_class, path))
+    return num, time.perf_counter() - start
+
+def main():
+    cli = argparse.ArgumentParser(description=__doc__)
+    cli.add_argument("--stmts", type=int, default=20000, help="number of generated statements")
+    args = cli.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "lex.while")
+        generate(path, args.stmts)
+        size = os.path.getsize(path)
+
+        for old, new in zip(tokens(Lexer, path), tokens(BufLexer, path)):
+            assert key(old) == key(new), f"token mismatch: {key(old)} vs {key(new)}"
+
+        print(f"input: {size / 2**20:.2f} MiB")
+        for lexer_class in (Lexer, BufLexer):
+            num, secs = measure(lexer_class, path)
+            print(f"{lexer_class.__name__:>8}: {num} tokens in {secs:.3f}s = {num / secs:,.0f} tokens/s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""
+Measures the memory a checked program takes per node, as objects (while_ast) and as an arena.Arena.
+"""
+
+import argparse
+import gc
+import io
+import tracemalloc
+
+from arena import Arena
+from bench.gen import generate
+from opt import num_nodes
+from parse import Parser
+from while_ast import Nodes
+
+def retained(text, nodes):
+    """
+    Returns the checked program of text built with nodes and the bytes it retains.
+    """
+    file = io.StringIO(text)
+    file.name = "gen.while"
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    prog   = Parser(file, nodes=nodes).parse_prog()
+    prog   = nodes if isinstance(nodes, Arena) else prog
+    prog.check()
+    gc.collect()
+    size   = tracemalloc.get_traced_memory()[0] - before - len(text) # the Source holds the text
+    tracemalloc.stop()
+    return prog, size
+
+def main():
+    cli = argparse.ArgumentParser(description=__doc__)
+    cli.add_argument("--seed",  type=int, default=1,    help="seed of the generated program")
+    cli.add_argument("--stmts", type=int, default=2000, help="number of generated statements")
+    args = cli.parse_args()
+
+    text = generate(args.seed, args.stmts, 3, 10)
+    prog, size = retained(text, Nodes())
+    num  = num_nodes(prog)
+    del prog
+    print(f"{num} nodes")
+    print(f"objects: {size / 2**20:6.1f} MiB, {size / num:6.1f} bytes/node")
+    _, size = retained(text, Arena())
+    print(f"arena:   {size / 2**20:6.1f} MiB, {size / num:6.1f} bytes/node")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Compares the evaluation engines at -O0, -O1 and -O2 on a loop full of constant subexpressions, dead branches,
+loop-invariant expressions and multiplications of induction variables.
+Since n is a constant, -O1 replaces both loops by the closed forms of their results, which leaves nothing to -O2.
+"""
+
+import argparse
+
+import ir
+import opt
+from bench.eval import ENGINES, measure, parse
+
+PROG = """int n = {n};
+int m = 3;
+int s = 0;
+while m < 5 {{
+    int i = 0;
+    while i < n and true {{
+        s = s + i * (2 * 3 - 5) + 0;
+        if 1 > 2 {{
+            s = s - 1;
+        }} else {{
+            s = s + -(-1) * 1;
+        }}
+        while false {{
+            s = 0;
+        }}
+        s = s + (m * m + 1) * i;
+        i = i + 1 * 1;
+    }}
+    m = m + 1;
+}}
+return s;
+"""
+
+def compare(name, prog, optd, func):
+    secs0, out0 = measure(ENGINES[name], prog)
+    secs1, out1 = measure(ENGINES[name], optd)
+    assert out0 == out1, f"{name} disagrees with -O1"
+    res = f"-O0 {secs0:.3f}s, -O1 {secs1:.3f}s ({secs0 / secs1:.1f}x)"
+    if name == "ir":
+        secs2, out2 = measure(ir.eval_func, func)
+        assert out0 == out2, f"{name} disagrees with -O2"
+        res += f", -O2 {secs2:.3f}s ({secs0 / secs2:.1f}x)"
+    return res
+
+def main():
+    cli = argparse.ArgumentParser(description=__doc__)
+    cli.add_argument("-n", type=int, default=50000, help="number of iterations of the inner loop")
+    cli.add_argument("--engines", nargs="+", default=list(ENGINES), choices=list(ENGINES), help="engines to compare")
+    args = cli.parse_args()
+
+    text = PROG.format(n=args.n)
+    prog = parse("opt.while", text)
+    optd = parse("opt.while", text)
+    counts = opt.optimize(optd)
+    print(f"-O1 of {opt.num_nodes(prog)} node(s) " + ", ".join(f"{name}: {num}" for name, num in counts.items()))
+
+    func  = ir.build(optd)
+    stats = func.optimize()
+    print("-O2 " + ", ".join(f"{name}: {num}" for name, num in stats.items()))
+
+    for name in args.engines:
+        print(f"n={args.n} {name:>8}: {compare(name, prog, optd, func)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+"""
+Measures parse time and peak memory of lexing and parsing a large input.
+"""
+
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+
+from parse import Parser
+from bench.lex import generate
+
+def main():
+    cli = argparse.ArgumentParser(description=__doc__)
+    cli.add_argument("--stmts", type=int, default=20000, help="number of generated statements")
+    args = cli.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "parse.while")
+        generate(path, args.stmts)
+
+        with open(path, "r", encoding="ASCII") as file:
+            start = time.perf_counter()
+            Parser(file).parse_prog()
+            secs  = time.perf_counter() - start
+
+        with open(path, "r", encoding="ASCII") as file:
+            tracemalloc.start()
+            prog = Parser(file).parse_prog()
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            del prog
+
+    print(f"parse: {secs:.3f}s, peak memory: {peak / 2**20:.1f} MiB")
+
+if __name__ == "__main__":
+    main()
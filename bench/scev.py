@@ -0,0 +1,117 @@
+"""
+Checks and times the closed forms of -O1 (scev.py) on random nests of counting loops.
+
+Every program is run by each engine with and without the rewrite, and all results must agree. The loops count up or
+down by a constant from a literal or a variable to a literal or a variable, and accumulate polynomials of their counters
+and of variables declared outside; some contain an IfStmt, which keeps them from being closed.
+"""
+
+import argparse
+import random
+
+import opt
+from bench.eval import ENGINES, measure, parse
+
+class Loops:
+    def __init__(self, seed, trips):
+        self.rng   = random.Random(seed)
+        self.trips = trips
+        self.count = 0
+        self.lines = []
+        self.ind   = ""
+
+    def fresh(self, prefix):
+        self.count += 1
+        return f"{prefix}{self.count}"
+
+    def line(self, text):
+        self.lines.append(f"{self.ind}{text}\n")
+
+    def term(self, names):
+        """
+        A product of up to two of names, scaled by a small literal.
+        """
+        factors = [str(self.rng.randint(1, 3))] + self.rng.sample(names, min(len(names), self.rng.randint(0, 2)))
+        return " * ".join(factors)
+
+    def loop(self, accs, outer, depth):
+        """
+        Emits a loop that adds to the accumulators accs; outer are the counters of the enclosing loops.
+        """
+        counter, step = self.fresh("i"), self.rng.randint(1, 3)
+        ends = [str(self.rng.randint(0, self.trips)), str(self.rng.randint(0, self.trips))] + outer
+        init, bound = self.rng.choice(ends), self.rng.choice(ends)
+        up = self.rng.random() < 0.5
+        if init.isdigit() and bound.isdigit() and (int(init) < int(bound)) != up:
+            init, bound = bound, init # most loops should run
+        self.line(f"int {counter} = {init};")
+        if up:
+            cond, update = self.rng.choice((f"{counter} < {bound}", f"{counter} <= {bound}", f"{bound} > {counter}")), "+"
+        else:
+            cond, update = self.rng.choice((f"{counter} > {bound}", f"{counter} >= {bound}", f"{bound} < {counter}")), "-"
+        if up and init == "0" and bound.isdigit() and step == 1 and self.rng.random() < 0.3:
+            cond = f"{counter} != {bound}"
+        self.line(f"while {cond} {{")
+        self.ind += "    "
+        for acc in self.rng.sample(accs, self.rng.randint(1, len(accs))):
+            if self.rng.random() < 0.3:
+                temp = self.fresh("t")
+                self.line(f"int {temp} = {self.term(outer + [counter])};")
+                self.line(f"{acc} = {acc} + {temp};")
+            else:
+                self.line(f"{acc} = {acc} {self.rng.choice('+-')} {self.term(outer + [counter])};")
+        if depth > 0 and self.rng.random() < 0.4:
+            self.loop(accs, outer + [counter], depth - 1)
+        elif self.rng.random() < 0.1:
+            self.line(f"if {counter} < {self.rng.randint(0, self.trips)} {{ {accs[0]} = {accs[0]} + 1; }}")
+        self.line(f"{counter} = {counter} {update} {step};")
+        self.ind = self.ind[:-4]
+        self.line("}")
+
+    def prog(self, loops, depth):
+        accs = [self.fresh("s") for _ in range(3)]
+        for acc in accs:
+            self.line(f"int {acc} = {self.rng.randint(0, 9)};")
+        for _ in range(loops):
+            self.loop(accs, [], depth)
+        self.line(f"return {' + '.join(accs)};")
+        return "".join(self.lines)
+
+def check(name, text, secs):
+    """
+    Runs text with and without the closed forms on the engines in secs, adding up their times; returns the loops closed.
+    """
+    prog = parse(name, text)
+    optd = parse(name, text)
+    closed   = opt.optimize(optd)["closed loops"]
+    expected = None
+    for engine, times in secs.items():
+        for level, tree in enumerate((prog, optd)):
+            time, out = measure(ENGINES[engine], tree)
+            assert expected is None or out == expected, f"{engine} -O{level} disagrees on {name}:\n{text}"
+            expected = out
+            times[level] += time
+    return closed
+
+def main():
+    cli = argparse.ArgumentParser(description=__doc__)
+    cli.add_argument("--progs", type=int, default=100, help="number of random programs")
+    cli.add_argument("--loops", type=int, default=4,   help="number of top-level loops per program")
+    cli.add_argument("--depth", type=int, default=1,   help="maximal nesting depth")
+    cli.add_argument("--trips", type=int, default=100, help="largest literal bound")
+    cli.add_argument("--seed",  type=int, default=0,   help="seed of the first program")
+    cli.add_argument("--engines", nargs="+", default=list(ENGINES), choices=list(ENGINES), help="engines to compare")
+    args = cli.parse_args()
+
+    loops, closed, secs = 0, 0, {name: [0.0, 0.0] for name in args.engines}
+    for seed in range(args.seed, args.seed + args.progs):
+        text    = Loops(seed, args.trips).prog(args.loops, args.depth)
+        loops  += text.count("while ")
+        closed += check(f"scev{seed}.while", text, secs)
+
+    print(f"{args.progs} programs, {closed} of {loops} loops closed")
+    for name, (secs0, secs1) in secs.items():
+        print(f"{name:>8}: -O0 {secs0:.3f}s, -O1 {secs1:.3f}s ({secs0 / secs1:.1f}x)")
+
+if __name__ == "__main__":
+    main()
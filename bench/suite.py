@@ -0,0 +1,200 @@
+"""
+Times every phase on a program generated by bench/gen.py and checks that all backends agree on the result:
+    lex.*     tokenizing with Lexer and BufLexer
+    parse     Parser.parse_prog
+    check     Prog.check
+    ast.*     serial.dump and serial.load of the checked AST, which replace parse and check on a cache hit
+    eval.*    the evaluation engines, at -O0 and after -O1/-O2
+    opt.*     the optimization passes
+    emit.*    emission for every Emit target
+    run.*     the generated Python (in-process) and C (built with $CC, default: cc)
+The timings are the minimum of --repeat runs.
+With --output, the results are written as JSON; --baseline compares them to such a file of an earlier commit.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import closure
+import ir
+import opt
+import serial
+import tier
+import vm
+from bench.gen import generate
+from lexer import Lexer, BufLexer
+from loc import Source
+from parse import Parser
+from tok import Tag
+from while_ast import Emit, to_str
+
+def source(text):
+    file = io.StringIO(text)
+    file.name = "gen.while"
+    return file
+
+def parse(text):
+    return Parser(source(text)).parse_prog()
+
+def checked(text):
+    prog = parse(text)
+    prog.check()
+    return prog
+
+def lex(lexer_class, text):
+    lexer = lexer_class(source(text))
+    num   = 1
+    while not lexer.lex().isa(Tag.M_EOF):
+        num += 1
+    return num
+
+def optimized(text):
+    prog = checked(text)
+    opt.optimize(prog)
+    return prog
+
+def commit():
+    try:
+        res = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=False,
+                             cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    except OSError:
+        return None
+    return res.stdout.strip() or None
+
+class Suite:
+    def __init__(self, text, repeat):
+        self.text    = text
+        self.repeat  = repeat
+        self.phases  = {}
+        self.results = {}
+
+    def time(self, phase, func, setup = None):
+        """
+        Records the minimal time of func(setup()) and returns its last result; setup is not timed.
+        """
+        best = None
+        for _ in range(self.repeat):
+            arg   = setup() if setup else None
+            start = time.perf_counter()
+            res   = func(arg) if setup else func()
+            secs  = time.perf_counter() - start
+            best  = secs if best is None else min(best, secs)
+        self.phases[phase] = best
+        return res
+
+    def eval(self, phase, engine, setup):
+        def func(node):
+            out = io.StringIO()
+            with contextlib.redirect_stdout(out):
+                engine(node)
+            return out.getvalue()
+        self.results[phase] = self.time(phase, func, setup).strip().lower() # Python prints False, the rest false
+
+    def front(self):
+        self.time("lex.Lexer",    lambda: lex(Lexer, self.text))
+        self.time("lex.BufLexer", lambda: lex(BufLexer, self.text))
+        self.time("parse",        lambda: parse(self.text))
+        self.time("check",        lambda prog: prog.check(), lambda: parse(self.text))
+        prog = checked(self.text)
+        data = serial.dump(prog, 0)
+        self.time("ast.dump",     lambda: serial.dump(prog, 0))
+        self.time("ast.load",     lambda: serial.load(data, Source("gen.while", self.text)))
+
+    def engines(self):
+        prog = checked(self.text)
+        for name, engine in (("ast", lambda prog: prog.eval()), ("ast-tier", lambda prog: prog.eval(tier.Tiering().run)),
+                             ("closure", closure.eval_prog), ("vm", vm.eval_prog)):
+            self.eval(f"eval.{name}", engine, lambda: prog)
+        self.eval("eval.ir", ir.eval_func, lambda: ir.build(prog))
+
+        self.time("opt.O1", opt.optimize, lambda: checked(self.text))
+        optd = optimized(self.text)
+        self.eval("eval.vm-O1", vm.eval_prog, lambda: optd)
+        self.time("opt.ir-build", ir.build, lambda: optd)
+        self.time("opt.O2", lambda func: func.optimize(), lambda: ir.build(optd))
+        func = ir.build(optd)
+        func.optimize()
+        self.eval("eval.ir-O2", ir.eval_func, lambda: func)
+
+    def backends(self, run_c):
+        prog = checked(self.text)
+        for emit in Emit:
+            self.time(f"emit.{emit.name}", lambda emit=emit: to_str(prog, emit))
+        code = compile(to_str(prog, Emit.PY), "gen.py", "exec")
+        self.eval("run.py", lambda code: exec(code, {"__name__": "__main__"}), lambda: code) # pylint: disable=exec-used
+        if run_c:
+            self.run_c(to_str(prog, Emit.C))
+
+    def run_c(self, text):
+        compiler = os.environ.get("CC", "cc")
+        with tempfile.TemporaryDirectory() as tmp:
+            c_file, exe = os.path.join(tmp, "gen.c"), os.path.join(tmp, "gen")
+            with open(c_file, "w", encoding="ASCII") as file:
+                file.write(text)
+            try:
+                res = self.time("run.cc", lambda: subprocess.run([compiler, "-O2", "-o", exe, c_file], check=False))
+            except OSError as error:
+                print(f"skipping C: cannot run '{compiler}': {error.strerror}", file=sys.stderr)
+                return
+            if res.returncode != 0:
+                sys.exit(f"error: '{compiler}' failed on the generated C")
+            res = self.time("run.c", lambda: subprocess.run([exe], capture_output=True, text=True, check=False))
+            self.results["run.c"] = res.stdout.strip().lower()
+
+def compare(phases, path, threshold):
+    with open(path, "r", encoding="UTF-8") as file:
+        base = json.load(file)
+    print(f"compared to {path} ({base.get('commit') or 'unknown commit'}):")
+    for phase, secs in phases.items():
+        if (old := base["phases"].get(phase)) and secs:
+            ratio = secs / old
+            print(f"{phase:>14}: {old:.4f}s -> {secs:.4f}s ({ratio:.2f}x){' slower' if ratio > threshold else ''}")
+
+def main():
+    cli = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    cli.add_argument("--seed",      type=int,   default=0,   help="random seed of the generator")
+    cli.add_argument("--stmts",     type=int,   default=300, help="number of top-level statements")
+    cli.add_argument("--depth",     type=int,   default=3,   help="maximal nesting depth")
+    cli.add_argument("--trips",     type=int,   default=20,  help="maximal trip count of each loop")
+    cli.add_argument("--repeat",    type=int,   default=3,   help="number of runs per phase")
+    cli.add_argument("--no-c",      action="store_true",     help="do not build and run the generated C")
+    cli.add_argument("--output",    metavar="FILE",          help="write the results as JSON to FILE")
+    cli.add_argument("--baseline",  metavar="FILE",          help="compare to the JSON results in FILE")
+    cli.add_argument("--threshold", type=float, default=1.1, help="ratio beyond which --baseline reports a phase as slower")
+    args = cli.parse_args()
+
+    text  = generate(args.seed, args.stmts, args.depth, args.trips)
+    suite = Suite(text, args.repeat)
+    suite.front()
+    suite.engines()
+    suite.backends(not args.no_c)
+
+    for phase, secs in suite.phases.items():
+        print(f"{phase:>14}: {secs:.4f}s")
+    if len(set(suite.results.values())) != 1:
+        for phase, res in suite.results.items():
+            print(f"{phase:>14}: {res}", file=sys.stderr)
+        sys.exit(f"error: the backends disagree on seed {args.seed}")
+    result = next(iter(suite.results.values()))
+    print(f"all {len(suite.results)} backends agree: {result}")
+
+    if args.baseline:
+        compare(suite.phases, args.baseline, args.threshold)
+    if args.output:
+        params = {name: getattr(args, name) for name in ("seed", "stmts", "depth", "trips", "repeat")}
+        size   = {"bytes": len(text), "tokens": lex(BufLexer, text), "nodes": opt.num_nodes(checked(text))}
+        with open(args.output, "w", encoding="UTF-8") as file:
+            json.dump({"commit": commit(), "python": platform.python_version(), "params": params, "size": size,
+                       "phases": suite.phases, "result": result}, file, indent=2)
+            file.write("\n")
+
+if __name__ == "__main__":
+    main()
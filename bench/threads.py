@@ -0,0 +1,66 @@
+"""
+Compiles thousands of programs with compiler.compile_source in a pool of threads and checks that the results stay apart.
+
+Every program is compiled once on its own first. Then all of them are compiled at once by the threads of a pool, in a
+shuffled order and several times over, and each result must equal the one compiled on its own: the same diagnostics,
+all of them in the program's own file, and the same outputs for every target. A third of the programs refer to an
+identifier of their own that is never declared, so that their diagnostics differ from those of all other programs.
+"""
+
+import argparse
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from bench.gen import generate
+from compiler import compile_source
+
+def program(seed, stmts):
+    """
+    Returns the name, the text and the optimization level of the program for seed.
+    """
+    text = generate(seed, stmts, depth=2)
+    if seed % 3 == 0:
+        text = text.replace("return ", f"return undeclared{seed} + ", 1)
+    return f"p{seed}.while", text, seed % 3
+
+def summary(name, result):
+    """
+    What must not depend on the other compilations.
+    """
+    for diag in result.diagnostics:
+        assert diag.loc.src.name == name, f"{name} reported a diagnostic of {diag.loc.src.name}"
+    return [str(diag) for diag in result.diagnostics], result.errors, result.outputs
+
+def main():
+    cli = argparse.ArgumentParser(description=__doc__)
+    cli.add_argument("--progs",   type=int, default=2000, help="number of random programs")
+    cli.add_argument("--stmts",   type=int, default=8,    help="number of top-level statements per program")
+    cli.add_argument("--threads", type=int, default=16,   help="size of the thread pool")
+    cli.add_argument("--rounds",  type=int, default=2,    help="how often each program is compiled by the pool")
+    cli.add_argument("--seed",    type=int, default=0,    help="seed of the first program")
+    args = cli.parse_args()
+
+    progs = [program(seed, args.stmts) for seed in range(args.seed, args.seed + args.progs)]
+    start = time.perf_counter()
+    alone = [summary(name, compile_source(text, name, level)) for name, text, level in progs]
+    secs  = time.perf_counter() - start
+
+    jobs = list(range(len(progs))) * args.rounds
+    random.Random(args.seed).shuffle(jobs)
+    def job(idx):
+        name, text, level = progs[idx]
+        return idx, summary(name, compile_source(text, name, level))
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(args.threads) as pool:
+        for idx, res in pool.map(job, jobs):
+            assert res == alone[idx], f"{progs[idx][0]} differs when compiled along with the others"
+    pooled = time.perf_counter() - start
+
+    failed = sum(errors != 0 for _, errors, _ in alone)
+    print(f"{len(progs)} programs ({failed} with errors), {len(jobs)} compilations by {args.threads} threads agree")
+    print(f"alone: {secs:.3f}s, pool: {pooled:.3f}s for {args.rounds}x as many")
+
+if __name__ == "__main__":
+    main()
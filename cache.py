@@ -0,0 +1,84 @@
+"""
+An on-disk cache with LRU eviction whose entries are keyed by content hashes.
+
+Entries live in $WHILEC_CACHE_DIR (default: $XDG_CACHE_HOME/whilec or ~/.cache/whilec), one subdirectory per kind.
+Every hit refreshes the modification time of the entry; when the total size of a kind exceeds its bound,
+the least recently used entries are removed.
+"""
+
+from functools import lru_cache
+import glob
+import hashlib
+import importlib.util
+import os
+import tempfile
+
+def cache_dir():
+    if (path := os.environ.get("WHILEC_CACHE_DIR")):
+        return path
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "whilec")
+
+@lru_cache(maxsize=None)
+def compiler_version():
+    """
+    Digest of the compiler's own sources and the Python bytecode version.
+    """
+    digest = hashlib.sha256(importlib.util.MAGIC_NUMBER)
+    for path in sorted(glob.glob(os.path.join(os.path.dirname(os.path.abspath(__file__)), "*.py"))):
+        with open(path, "rb") as file:
+            digest.update(file.read())
+    return digest.hexdigest()
+
+class Cache:
+    def __init__(self, kind, max_bytes = 64 * 2**20, directory = None):
+        self.dir       = os.path.join(directory or cache_dir(), kind)
+        self.max_bytes = max_bytes
+
+    def key(self, *parts):
+        digest = hashlib.sha256(compiler_version().encode())
+        for part in parts:
+            part = part if isinstance(part, bytes) else str(part).encode()
+            digest.update(len(part).to_bytes(8, "little"))
+            digest.update(part)
+        return digest.hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.dir, key)
+
+    def get(self, key):
+        try:
+            with open(self.path(key), "rb") as file:
+                data = file.read()
+            os.utime(self.path(key)) # mark as recently used
+            return data
+        except OSError:
+            return None
+
+    def put(self, key, data):
+        try:
+            os.makedirs(self.dir, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=self.dir, prefix=".tmp-")
+            with os.fdopen(fd, "wb") as file:
+                file.write(data)
+            os.replace(tmp, self.path(key)) # atomic, in case of concurrent runs
+            self.evict()
+        except OSError:
+            pass # the cache is an optimization only
+
+    def evict(self):
+        entries = []
+        for entry in os.scandir(self.dir):
+            if entry.is_file() and not entry.name.startswith("."):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Thin client for server.py: behaves like while.py but leaves the work to a running server.
+
+It only imports the standard library, so its startup is cheap.
+The protocol is JSON, one object per line, over a Unix socket. A request is
+    {"id": ..., "name": "fib.while", "source": "...", "actions": ["check", "eval", ...], "engine": "closure", "opt": 0,
+     "max_steps": null, "timeout": null}
+and its response, which may arrive out of order, is one of
+    {"id": ..., "status": 0, "diagnostics": ["..."], "outputs": {"eval": "...", "emit-c": "..."}}
+on success,
+    {"id": ..., "status": 1, "diagnostics": ["..."], "outputs": {...}[, "errors": n]}
+if the front end reported n errors, with no outputs, or else if the evaluation hit max_steps or timeout or Python
+could not compile the output of the Python backend, with its diagnostic last and the outputs of the actions before it,
+and
+    {"id": ..., "status": 1, "error": "..."}
+for malformed requests and internal errors.
+"""
+
+import argparse
+import json
+import os
+import socket
+import sys
+
+ACTIONS = ("check", "eval", "emit-while", "emit-c", "emit-py")
+ENGINES = ("ast", "closure", "vm", "ir", "py")
+
+def socket_path():
+    default = os.path.join(os.environ.get("XDG_RUNTIME_DIR") or os.environ.get("TMPDIR", "/tmp"), f"whilec-{os.getuid()}.sock")
+    return os.environ.get("WHILEC_SOCKET", default)
+
+cli = argparse.ArgumentParser(
+    description="Client for the While compiler server.",
+    epilog="Use '-' to output to stdout. Output names may contain {stem}, {name} and {dir} like for while.py.")
+
+cli.add_argument(      "--eval",      nargs="?", const="closure", choices=ENGINES,       dest="eval", help="interpret input program with the given engine (default: closure); right before an input file, only --eval=engine works")
+cli.add_argument("-o", "--output",    action="store", metavar="output", dest="output",    help="print program again")
+cli.add_argument(      "--output-c",  action="store", metavar="output", dest="output_c",  help="compile program to C")
+cli.add_argument(      "--output-py", action="store", metavar="output", dest="output_py", help="compile program to Python")
+cli.add_argument("-O",                type=int, choices=[0, 1, 2], default=0, metavar="level", dest="opt", help="optimization level (default: 0)")
+cli.add_argument(      "--max-steps", type=int, metavar="N",                              dest="max_steps", help="stop an evaluation after N iterations of loops")
+cli.add_argument(      "--timeout",   type=float, metavar="seconds",                      dest="timeout", help="stop an evaluation after the given wall-clock time")
+cli.add_argument(      "--socket",    action="store", metavar="path", default=socket_path(), dest="socket", help="socket of the server (default: %(default)s)")
+cli.add_argument("files",             nargs="+", metavar="file",                          help="input files")
+
+# action -> argument naming its output
+OUTPUTS = {"emit-while": "output", "emit-c": "output_c", "emit-py": "output_py"}
+
+def output_name(pattern, path):
+    if pattern == "-":
+        return pattern
+    base = os.path.basename(path)
+    return pattern.format(stem=os.path.splitext(base)[0], name=base, dir=os.path.dirname(path) or ".")
+
+def requests(args):
+    actions = ["check"] + (["eval"] if args.eval else []) + [act for act, arg in OUTPUTS.items() if getattr(args, arg)]
+    for idx, path in enumerate(args.files):
+        with open(path, "r", encoding="ASCII") as file:
+            source = file.read()
+        yield {"id": idx, "name": path, "source": source, "actions": actions, "engine": args.eval, "opt": args.opt,
+               "max_steps": args.max_steps, "timeout": args.timeout}
+
+def report(args, path, response):
+    """
+    Prints the response like while.py would and returns the exit status.
+    """
+    if "error" in response:
+        print(f"error: {path}: {response['error']}", file=sys.stderr)
+        return response["status"]
+    # the diagnostic of a failed evaluation comes last; while.py prints it on stderr
+    failed = response["status"] != 0 and "errors" not in response
+    lines  = response["diagnostics"]
+    for line in lines[:-1] if failed else lines:
+        print(line)
+    if failed:
+        print(lines[-1], file=sys.stderr)
+        return response["status"]
+    if response["status"] != 0:
+        print(f"error: aborting due to {response['errors']} error(s)", file=sys.stderr)
+        return response["status"]
+
+    outputs = response["outputs"]
+    if "eval" in outputs:
+        sys.stdout.write(outputs["eval"])
+    for act, arg in OUTPUTS.items():
+        if act in outputs:
+            name = output_name(getattr(args, arg), path)
+            if name == "-":
+                sys.stdout.write(outputs[act])
+            else:
+                if os.path.dirname(name):
+                    os.makedirs(os.path.dirname(name), exist_ok=True)
+                with open(name, "w", encoding="ASCII") as file:
+                    file.write(outputs[act])
+    return 0
+
+def main():
+    args = cli.parse_args()
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(args.socket)
+        except OSError as error:
+            sys.exit(f"error: cannot connect to server at '{args.socket}': {error.strerror}; start it with ./server.py")
+
+        with sock.makefile("rwb") as stream:
+            try:
+                for request in requests(args): # all at once, so the server can work on them concurrently
+                    stream.write(json.dumps(request).encode() + b"\n")
+            except OSError as error:
+                sys.exit(f"error: cannot open '{error.filename}': {error.strerror}")
+            stream.flush()
+            sock.shutdown(socket.SHUT_WR)
+
+            responses = {}
+            for line in stream:
+                response = json.loads(line)
+                responses[response["id"]] = response
+
+    status = 0
+    for idx, path in enumerate(args.files): # in the order of the input files
+        response = responses.get(idx, {"status": 1, "error": "no response from server"})
+        status   = max(status, report(args, path, response))
+    sys.exit(status)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+"""
+Translates a checked Prog once into nested Python closures and runs those.
+
+In contrast to Prog.eval, operators are dispatched and the slots assigned by Prog.check are looked up only once,
+when building the closures. Loops only count their steps if there is a fuel.Fuel.
+Building and running the closures recurses once per nesting level, so a program nested deeper than the recursion
+limit allows runs on vm instead, which keeps its own stacks.
+"""
+
+import operator
+
+import vm
+from tok import Tag
+from while_ast import DeclStmt, AssignStmt, StmtList, IfStmt, WhileStmt, \
+    BinExpr, UnaryExpr, BoolExpr, LitExpr, SymExpr
+
+BIN_OPS = {
+    Tag.T_ADD: operator.add,
+    Tag.T_SUB: operator.sub,
+    Tag.T_MUL: operator.mul,
+    Tag.K_AND: operator.and_,
+    Tag.K_OR : operator.or_,
+    Tag.T_EQ : operator.eq,
+    Tag.T_NE : operator.ne,
+    Tag.T_LT : operator.lt,
+    Tag.T_LE : operator.le,
+    Tag.T_GT : operator.gt,
+    Tag.T_GE : operator.ge,
+}
+
+class Closures:
+    def __init__(self, fuel = None):
+        self.fuel = fuel
+
+    # Prog
+
+    def prog(self, prog):
+        stmt = self.stmt(prog.stmt)
+        ret  = self.expr(prog.ret)
+        size = prog.num_slots
+
+        def run():
+            env = [None] * size
+            stmt(env)
+            return ret(env)
+        return run
+
+    # Stmt
+
+    def stmt(self, stmt):
+        if isinstance(stmt, DeclStmt):
+            return self.store(stmt.slot, stmt.init)
+        if isinstance(stmt, AssignStmt):
+            return self.store(stmt.decl.slot, stmt.init)
+        if isinstance(stmt, StmtList):
+            return self.stmt_list(stmt)
+        if isinstance(stmt, IfStmt):
+            return self.if_stmt(stmt)
+        if isinstance(stmt, WhileStmt):
+            return self.while_stmt(stmt)
+        assert False
+
+    def store(self, slot, init):
+        if isinstance(init, (LitExpr, BoolExpr)):
+            val = init.val
+            def store_val(env):
+                env[slot] = val
+            return store_val
+
+        if isinstance(init, SymExpr):
+            src = init.decl.slot
+            def store_sym(env):
+                env[slot] = env[src]
+            return store_sym
+
+        expr = self.expr(init)
+        def store(env):
+            env[slot] = expr(env)
+        return store
+
+    def stmt_list(self, stmt_list):
+        stmts = [self.stmt(stmt) for stmt in stmt_list.stmts]
+        if not stmts:
+            return lambda env: None
+        if len(stmts) == 1:
+            return stmts[0]
+
+        def run(env):
+            for stmt in stmts:
+                stmt(env)
+        return run
+
+    def if_stmt(self, if_stmt):
+        cond = self.expr(if_stmt.cond)
+        cons = self.stmt(if_stmt.cons)
+        alt  = self.stmt(if_stmt.alt)
+
+        def run(env):
+            if cond(env):
+                cons(env)
+            else:
+                alt(env)
+        return run
+
+    def while_stmt(self, while_stmt):
+        cond  = self.expr(while_stmt.cond)
+        stmts = [self.stmt(stmt) for stmt in while_stmt.body.stmts]
+
+        if self.fuel is None:
+            def run(env):
+                while cond(env):
+                    for stmt in stmts:
+                        stmt(env)
+            return run
+
+        fuel, loc = self.fuel, while_stmt.loc
+        def run_fueled(env):
+            while cond(env):
+                fuel.steps -= 1
+                if fuel.steps < 0:
+                    fuel.refill(loc)
+                for stmt in stmts:
+                    stmt(env)
+        return run_fueled
+
+    # Expr
+
+    def expr(self, expr):
+        if isinstance(expr, (LitExpr, BoolExpr)):
+            val = expr.val
+            return lambda env: val
+        if isinstance(expr, SymExpr):
+            slot = expr.decl.slot
+            return lambda env: env[slot]
+        if isinstance(expr, BinExpr):
+            return self.bin_expr(expr)
+        if isinstance(expr, UnaryExpr):
+            return self.unary_expr(expr)
+        assert False
+
+    def bin_expr(self, bin_expr):
+        op = BIN_OPS[bin_expr.op]
+        lhs, rhs = bin_expr.lhs, bin_expr.rhs
+
+        # specialize the most common operand combinations to save a call per operand
+        if isinstance(lhs, SymExpr):
+            l_slot = lhs.decl.slot
+            if isinstance(rhs, SymExpr):
+                r_slot = rhs.decl.slot
+                return lambda env: op(env[l_slot], env[r_slot])
+            if isinstance(rhs, (LitExpr, BoolExpr)):
+                r_val = rhs.val
+                return lambda env: op(env[l_slot], r_val)
+
+        l = self.expr(lhs)
+        if isinstance(rhs, (LitExpr, BoolExpr)):
+            r_val = rhs.val
+            return lambda env: op(l(env), r_val)
+        r = self.expr(rhs)
+        return lambda env: op(l(env), r(env))
+
+    def unary_expr(self, unary_expr):
+        rhs = self.expr(unary_expr.rhs)
+        if unary_expr.op is Tag.K_NOT: return lambda env: not rhs(env)
+        if unary_expr.op is Tag.T_ADD: return rhs
+        if unary_expr.op is Tag.T_SUB: return lambda env: -rhs(env)
+        assert False
+
+def compile_prog(prog, fuel = None):
+    return Closures(fuel).prog(prog)
+
+def eval_prog(prog, fuel = None):
+    # the program has no side effects before it prints its result, so it may start over
+    used = None if fuel is None else (fuel.left, fuel.steps)
+    try:
+        res = compile_prog(prog, fuel)()
+    except RecursionError:
+        if fuel is not None:
+            fuel.left, fuel.steps = used
+        vm.eval_prog(prog, fuel)
+        return
+    print(res)
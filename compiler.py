@@ -0,0 +1,54 @@
+"""
+Library API: compiles a program given as a string into its checked AST, diagnostics and emitted code.
+
+All state is held per compilation and nothing is printed, so several programs may be compiled at the same time in
+threads of one process; python -m bench.threads checks that the results stay apart.
+Like while.py, -O2 hands the optimized SSA form to the C and Python backends.
+"""
+
+import io
+
+import ir
+import opt
+from err import Diagnostics
+from parse import Parser
+from while_ast import Emit, to_str
+
+class Result:
+    """
+    What compile_source made of a program:
+        prog        the Prog, checked and, with -O1 or more, optimized
+        backend     what the C and Python backends consumed: prog or, with -O2, an ir.Func; None if there were errors
+        diagnostics the err.Diagnostics of the front end, in the order they were reported
+        outputs     Emit -> emitted code; empty if there were errors
+    """
+    def __init__(self, prog, backend, diagnostics, outputs):
+        self.prog        = prog
+        self.backend     = backend
+        self.diagnostics = diagnostics
+        self.outputs     = outputs
+
+    @property
+    def errors(self):
+        return sum(diag.kind == "error" for diag in self.diagnostics)
+
+def compile_source(text, name, level = 0, emits = tuple(Emit)):
+    """
+    Compiles text, the contents of the file name, at optimization level and emits it for each target in emits.
+    """
+    diags = Diagnostics(echo=False)
+    file  = io.StringIO(text)
+    file.name = name
+    prog = Parser(file, diags=diags).parse_prog()
+    prog.check(diags)
+    if diags.num_errors != 0:
+        return Result(prog, None, diags.items, {})
+
+    if level >= 1:
+        opt.optimize(prog)
+    backend = prog
+    if level >= 2:
+        backend = ir.build(prog)
+        backend.optimize()
+    outputs = {emit: to_str(prog if emit is Emit.WHILE else backend, emit) for emit in emits}
+    return Result(prog, backend, diags.items, outputs)
@@ -1,13 +1,42 @@
 """
-Helper to emit and keep track of errors.
+Helpers to emit and keep track of errors.
+
+Every compilation reports to a Diagnostics of its own, which the Lexer, the Parser and the Sema hand around, so that
+several programs may be compiled at the same time; see compiler.py.
 """
 
-NUM_ERRORS = 0
+class Diagnostic:
+    __slots__ = ("kind", "loc", "msg")
+
+    def __init__(self, kind, loc, msg):
+        self.kind = kind # "error" or "note"
+        self.loc  = loc
+        self.msg  = msg
+
+    def __str__(self):
+        return f"{self.loc}: {self.kind}: {self.msg}"
+
+class Diagnostics:
+    """
+    Records the diagnostics of a compilation in order.
+    With echo, each is also printed when reported, to file or else to whatever sys.stdout is at that moment.
+    """
+    def __init__(self, echo = True, file = None):
+        self.echo  = echo
+        self.file  = file
+        self.items = [] # Diagnostic
+        self.num_errors = 0
+
+    def report(self, kind, loc, args):
+        diag = Diagnostic(kind, loc, " ".join(map(str, args)))
+        self.items.append(diag)
+        if self.echo:
+            print(diag, file=self.file)
+        return diag
 
-def err(loc, *args, **kwargs):
-    global NUM_ERRORS
-    NUM_ERRORS += 1
-    print(f"{loc}: error: "+" ".join(map(str, args)), **kwargs)
+    def err(self, loc, *args):
+        self.num_errors += 1
+        self.report("error", loc, args)
 
-def note(loc, *args, **kwargs):
-    print(f"{loc}: note: "+" ".join(map(str, args)), **kwargs)
+    def note(self, loc, *args):
+        self.report("note", loc, args)
@@ -0,0 +1,85 @@
+"""
+--max-steps and --timeout: bounds on the work of an evaluation.
+
+A step is an iteration of a loop. Every engine counts steps at the start of each loop body, so the same program stops
+after the same number of steps in every engine at the same optimization level. The engines decrement Fuel.steps
+inline - in the closures, the bytecode, the SSA form or the generated Python and C - and only call Fuel.refill with
+where the loop is once the count drops below zero: its Loc or, from generated code, its offset into the source.
+refill hands out at most CHUNK steps at a time and checks the clock in between, so the hot path is a decrement and a
+comparison, and a timeout is noticed within CHUNK steps.
+When a limit is hit, refill raises Exhausted, which unwinds the engine; native code cannot raise, so its callback
+records the exception and makes the C function return (see native.py).
+"""
+
+import time
+
+from loc import Loc
+
+CHUNK = 10000 # steps between looks at the clock
+
+class Exhausted(Exception):
+    """
+    Raised when an evaluation hits a limit in the loop at where, which was about to run another iteration.
+    """
+    def __init__(self, where, msg):
+        super().__init__(msg)
+        self.where = where
+        self.msg   = msg
+
+    def loc(self, src):
+        """
+        Returns the start of the loop, so that all engines report the same Loc; src is the Source the offsets from
+        generated code refer to.
+        """
+        if isinstance(self.where, Loc):
+            return Loc(self.where.src, self.where.begin, self.where.begin)
+        return Loc(src, self.where, self.where)
+
+class Fuel:
+    def __init__(self, max_steps = None, timeout = None):
+        self.max_steps = max_steps
+        self.timeout   = timeout
+        self.left      = max_steps # steps not handed out yet; None for no limit
+        self.deadline  = None if timeout is None else time.monotonic() + timeout
+        self.steps     = 0         # steps handed out but not used yet
+        self.exhausted = None      # the Exhausted that native code could not raise
+
+    def refill(self, where):
+        """
+        Called at the start of a loop body once steps dropped below zero; accounts for the current step and returns
+        the new steps.
+        """
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            raise Exhausted(where, f"evaluation timed out after {self.timeout:g}s in this loop")
+        chunk = CHUNK
+        if self.left is not None:
+            if self.left == 0:
+                raise Exhausted(where, f"evaluation exceeded {self.max_steps} step(s) in this loop")
+            chunk      = min(chunk, self.left)
+            self.left -= chunk
+        self.steps = chunk - 1
+        return self.steps
+
+    def tick(self, where):
+        """
+        Counts a step for the engines where an inline decrement is no cheaper than a call.
+        """
+        self.steps -= 1
+        if self.steps < 0:
+            self.refill(where)
+
+    def refill_native(self, where):
+        """
+        refill for the callback of native code: returns -1 instead of raising.
+        """
+        try:
+            return self.refill(where)
+        except Exhausted as error:
+            self.exhausted = error
+            return -1
+
+def limits(max_steps, timeout):
+    """
+    Returns a Fuel for the limits given on the command line, or None if there are none.
+    """
+    return None if max_steps is None and timeout is None else Fuel(max_steps, timeout)
@@ -0,0 +1,824 @@
+"""
+-O2: a control-flow graph of basic blocks in SSA form, built from a checked Prog, and optimizations on top of it.
+
+The SSA construction follows Braun et al., "Simple and Efficient Construction of Static Single Assignment Form".
+Since all instructions are pure and total, an instruction may be moved or removed as long as its operands stay
+available; this makes the following passes simple:
+    * copy propagation: removes trivial phis - the only copies left after construction,
+    * global value numbering: folds constants and shares equal instructions along the dominator tree,
+    * dead-store elimination: removes instructions and phis whose values are never read,
+    * loop-invariant code motion: hoists instructions out of loops into the loop's preheader,
+    * strength reduction: turns multiplications of an induction variable by an invariant into additions.
+Func.run interprets the result; Func.emit writes it as C (with gotos) or Python (as a state machine).
+"""
+
+import operator
+
+from closure import BIN_OPS
+from tok import Tag
+from while_ast import Emit, DeclStmt, AssignStmt, StmtList, IfStmt, WhileStmt, \
+    BinExpr, UnaryExpr, BoolExpr, LitExpr, SymExpr, run
+
+UNARY_OPS = {
+    Tag.T_SUB: operator.neg,
+    Tag.K_NOT: operator.not_,
+}
+
+NAMES = {
+    Tag.T_ADD: "add",
+    Tag.T_SUB: "sub",
+    Tag.T_MUL: "mul",
+    Tag.K_AND: "and",
+    Tag.K_OR : "or",
+    Tag.T_EQ : "eq",
+    Tag.T_NE : "ne",
+    Tag.T_LT : "lt",
+    Tag.T_LE : "le",
+    Tag.T_GT : "gt",
+    Tag.T_GE : "ge",
+}
+
+COMMUTATIVE = (Tag.T_ADD, Tag.T_MUL, Tag.K_AND, Tag.K_OR, Tag.T_EQ, Tag.T_NE)
+
+# Values
+
+class Value:
+    def __init__(self, ty):
+        self.ty = ty
+        self.id = 0 # assigned by Func.number
+
+    def name(self, emit = None):
+        return f"v{self.id}" if emit is None else f"_v{self.id}"
+
+class Const(Value):
+    def __init__(self, val):
+        super().__init__(Tag.K_BOOL if isinstance(val, bool) else Tag.K_INT)
+        self.val = val
+
+    def name(self, emit = None):
+        if isinstance(self.val, bool):
+            if emit is Emit.PY: return "True" if self.val else "False"
+            return "true" if self.val else "false"
+        return f"{self.val}" if self.val >= 0 or emit is None else f"({self.val})"
+
+class Instr(Value):
+    def __init__(self, ty, block, op, args):
+        super().__init__(ty)
+        self.block = block
+        self.op    = op
+        self.args  = args
+
+    def __str__(self):
+        op = "neg" if self.op is Tag.T_SUB and len(self.args) == 1 else "not" if self.op is Tag.K_NOT else NAMES[self.op]
+        return f"{self.name()}: {self.ty} = {op} " + ", ".join(arg.name() for arg in self.args)
+
+    def expr(self, emit):
+        args = [arg.name(emit) for arg in self.args]
+        if len(args) == 1:
+            if self.op is Tag.K_NOT: return f"not {args[0]}" if emit is Emit.PY else f"!{args[0]}"
+            return f"-{args[0]}"
+        op = str(self.op)
+        if self.op is Tag.K_AND: op = "&"
+        if self.op is Tag.K_OR:  op = "|"
+        return f"{args[0]} {op} {args[1]}"
+
+class Phi(Value):
+    def __init__(self, ty, block):
+        super().__init__(ty)
+        self.block = block
+        self.args  = [] # one per predecessor of block
+
+    def __str__(self):
+        args = ", ".join(f"[{pred.name()}: {arg.name()}]" for pred, arg in zip(self.block.preds, self.args))
+        return f"{self.name()}: {self.ty} = phi {args}"
+
+    def name_in(self, emit):
+        return f"{self.name(emit)}_in"
+
+# Blocks
+
+class Jump:
+    def __init__(self, target):
+        self.target = target
+
+class Branch:
+    def __init__(self, cond, then, other):
+        self.cond  = cond
+        self.then  = then
+        self.other = other
+
+class Ret:
+    def __init__(self, val):
+        self.val = val
+
+def succs(term):
+    if isinstance(term, Jump):   return [term.target]
+    if isinstance(term, Branch): return [term.then, term.other]
+    return []
+
+class Block:
+    def __init__(self, idx):
+        self.id     = idx
+        self.preds  = []
+        self.phis   = []
+        self.instrs = []
+        self.term   = None
+        self.loop   = None # Loc of the WhileStmt whose body starts here; see fuel.py
+
+    def name(self):
+        return f"bb{self.id}"
+
+class Loop:
+    def __init__(self, header, preheader, latch, blocks):
+        self.header    = header
+        self.preheader = preheader # the only predecessor of header outside the loop
+        self.latch     = latch     # the only predecessor of header inside the loop
+        self.blocks    = blocks
+
+    def invariant(self, val):
+        return isinstance(val, Const) or val.block not in self.blocks
+
+    def enters(self):
+        """
+        Whether the condition folds to true on entry, so that the body runs at least once.
+        """
+        pre_idx = self.header.preds.index(self.preheader)
+        def value(val):
+            if isinstance(val, Phi) and val.block is self.header:
+                return val.args[pre_idx] if isinstance(val.args[pre_idx], Const) else None
+            if isinstance(val, Instr) and val.block is self.header:
+                args = [value(arg) for arg in val.args]
+                return fold(Instr(val.ty, None, val.op, args)) if None not in args else None
+            return val if isinstance(val, Const) else None
+
+        cond = value(self.header.term.cond)
+        return cond is not None and cond.val is True
+
+    def always_run(self, idom):
+        """
+        Returns the blocks that run whenever the preheader does: the header and, if the body runs at least once, the
+        blocks on every path through it, which dominate the latch.
+        """
+        blocks = {self.header}
+        if self.enters():
+            block = self.latch
+            while block is not self.header:
+                blocks.add(block)
+                block = idom[block]
+        return blocks
+
+# Construction
+
+class Builder:
+    """
+    Lowers a checked Prog to a Func; like the traversals in while_ast, the methods are generators driven by run.
+    """
+    def __init__(self, func):
+        self.func       = func
+        self.defs       = {} # Block -> DeclStmt -> Value
+        self.incomplete = {} # Block -> DeclStmt -> Phi whose args are filled in when the block is sealed
+        self.sealed     = set()
+        self.cur        = self.new_block()
+        self.sealed.add(self.cur) # the entry has no predecessors
+
+    def new_block(self):
+        block = self.func.new_block()
+        self.defs[block]       = {}
+        self.incomplete[block] = {}
+        return block
+
+    def seal(self, block):
+        for decl, phi in self.incomplete.pop(block).items():
+            for pred in block.preds:
+                phi.args.append((yield self.read(decl, pred)))
+        self.sealed.add(block)
+
+    def write(self, decl, val):
+        self.defs[self.cur][decl] = val
+
+    def read(self, decl, block):
+        defs = self.defs[block]
+        if decl in defs:
+            return defs[decl]
+        if block not in self.sealed:
+            val = Phi(decl.ty, block)
+            block.phis.append(val)
+            self.incomplete[block][decl] = val
+        elif len(block.preds) == 1:
+            val = yield self.read(decl, block.preds[0])
+        else:
+            assert block.preds, "use of an undefined variable"
+            val = Phi(decl.ty, block)
+            block.phis.append(val)
+            defs[decl] = val # breaks cycles
+            for pred in block.preds:
+                val.args.append((yield self.read(decl, pred)))
+        defs[decl] = val
+        return val
+
+    def jump(self, target):
+        self.cur.term = Jump(target)
+        target.preds.append(self.cur)
+
+    # Prog
+
+    def prog(self, prog):
+        yield self.stmt(prog.stmt)
+        self.cur.term = Ret((yield self.expr(prog.ret)))
+
+    # Stmt
+
+    def stmt(self, stmt):
+        if isinstance(stmt, IfStmt):
+            yield self.if_stmt(stmt)
+        elif isinstance(stmt, WhileStmt):
+            yield self.while_stmt(stmt)
+        elif isinstance(stmt, StmtList):
+            for s in stmt.stmts:
+                yield self.stmt(s)
+        elif isinstance(stmt, DeclStmt):
+            self.write(stmt, (yield self.expr(stmt.init)))
+        elif isinstance(stmt, AssignStmt):
+            self.write(stmt.decl, (yield self.expr(stmt.init)))
+        else:
+            assert False
+
+    def if_stmt(self, if_stmt):
+        cond  = yield self.expr(if_stmt.cond)
+        head  = self.cur
+        then  = self.new_block()
+        then.preds.append(head)
+        yield self.seal(then)
+        self.cur = then
+        yield self.stmt(if_stmt.cons)
+        then_end = self.cur
+
+        other = self.new_block()
+        other.preds.append(head)
+        yield self.seal(other)
+        self.cur = other
+        yield self.stmt(if_stmt.alt)
+        head.term = Branch(cond, then, other)
+
+        join = self.new_block()
+        self.jump(join)
+        self.cur = then_end
+        self.jump(join)
+        join.preds.reverse() # then first
+        self.cur = join
+        yield self.seal(join)
+
+    def while_stmt(self, while_stmt):
+        preheader = self.cur
+        header    = self.new_block()
+        self.jump(header)
+
+        self.cur = header
+        cond     = yield self.expr(while_stmt.cond)
+        body     = self.new_block()
+        body.loop = while_stmt.loc
+        body.preds.append(header)
+        yield self.seal(body)
+
+        self.cur = body
+        yield self.stmt(while_stmt.body)
+        latch = self.cur
+        self.jump(header)
+        yield self.seal(header)
+
+        blocks = set(self.func.blocks[header.id:])
+        exit_  = self.new_block()
+        header.term = Branch(cond, body, exit_)
+        exit_.preds.append(header)
+        yield self.seal(exit_)
+        self.cur = exit_
+
+        # inner loops are finished first and thus come first
+        self.func.loops.append(Loop(header, preheader, latch, blocks))
+
+    # Expr
+
+    def expr(self, expr):
+        if isinstance(expr, (LitExpr, BoolExpr)):
+            return Const(expr.val)
+        if isinstance(expr, SymExpr):
+            return (yield self.read(expr.decl, self.cur))
+        if isinstance(expr, BinExpr):
+            lhs = yield self.expr(expr.lhs)
+            rhs = yield self.expr(expr.rhs)
+            return self.cur_instr(expr.ty, expr.op, [lhs, rhs])
+        if isinstance(expr, UnaryExpr):
+            rhs = yield self.expr(expr.rhs)
+            if expr.op is Tag.T_ADD:
+                return rhs
+            return self.cur_instr(expr.ty, expr.op, [rhs])
+        assert False
+
+    def cur_instr(self, ty, op, args):
+        instr = Instr(ty, self.cur, op, args)
+        self.cur.instrs.append(instr)
+        return instr
+
+# Passes and output
+
+def fold(instr):
+    """
+    Returns the value that instr can be replaced with or None.
+    """
+    args = instr.args
+    if all(isinstance(arg, Const) for arg in args):
+        if len(args) == 1:
+            return Const(UNARY_OPS[instr.op](args[0].val))
+        return Const(BIN_OPS[instr.op](args[0].val, args[1].val))
+
+    def is_const(val, c):
+        return isinstance(val, Const) and type(val.val) is type(c) and val.val == c
+
+    if len(args) == 2:
+        lhs, rhs = args
+        if instr.op is Tag.T_ADD:
+            if is_const(lhs, 0): return rhs
+            if is_const(rhs, 0): return lhs
+        elif instr.op is Tag.T_SUB:
+            if is_const(rhs, 0): return lhs
+            if lhs is rhs:       return Const(0)
+        elif instr.op is Tag.T_MUL:
+            if is_const(lhs, 1): return rhs
+            if is_const(rhs, 1): return lhs
+            if is_const(lhs, 0) or is_const(rhs, 0): return Const(0)
+        elif instr.op in (Tag.K_AND, Tag.K_OR) and lhs is rhs:
+            return lhs
+    return None
+
+def induction_vars(loop, pre_idx):
+    """
+    Returns the basic induction variables of loop: phi -> (op of the step, step).
+    """
+    ivs = {}
+    for phi in loop.header.phis:
+        step = phi.args[1 - pre_idx]
+        if isinstance(step, Instr) and step.op in (Tag.T_ADD, Tag.T_SUB) and len(step.args) == 2:
+            lhs, rhs = step.args
+            if lhs is phi and loop.invariant(rhs):
+                ivs[phi] = (step.op, rhs)
+            elif rhs is phi and step.op is Tag.T_ADD and loop.invariant(lhs):
+                ivs[phi] = (step.op, lhs)
+    return ivs
+
+def emit_term(out, block):
+    """
+    Writes the terminator of block including the copies into the phis of its successors.
+    """
+    c, term = out.emit is Emit.C, block.term
+
+    def goto(succ):
+        i = succ.preds.index(block)
+        for phi in succ.phis:
+            out.write(f"{out.ind}{phi.name_in(out.emit)} = {phi.args[i].name(out.emit)}{';' if c else ''}\n")
+        out.write(f"{out.ind}goto {succ.name()};\n" if c else f"{out.ind}bb = {succ.id}\n")
+
+    if isinstance(term, Jump):
+        goto(term.target)
+    elif isinstance(term, Branch):
+        cond = term.cond.name(out.emit)
+        out.write(f"{out.ind}if ({cond}) {{\n" if c else f"{out.ind}if {cond}:\n")
+        out.indent()
+        goto(term.then)
+        out.dedent()
+        out.write(f"{out.ind}}} else {{\n" if c else f"{out.ind}else:\n")
+        out.indent()
+        goto(term.other)
+        out.dedent()
+        if c:
+            out.write(f"{out.ind}}}\n")
+    else:
+        val = term.val.name(out.emit)
+        if c and out.export is not None:
+            out.write(f"{out.ind}return {val};\n")
+        elif c:
+            fmt = f'{val} ? "true\\n" : "false\\n"' if term.val.ty is Tag.K_BOOL else f'"%i\\n", {val}'
+            out.write(f"{out.ind}printf({fmt});\n")
+            out.write(f"{out.ind}return 0;\n")
+        else:
+            out.write(f'{out.ind}print("true" if {val} else "false")\n' if term.val.ty is Tag.K_BOOL else f"{out.ind}print({val})\n")
+            out.write(f"{out.ind}return\n")
+
+# Func
+
+class Func:
+    def __init__(self):
+        self.blocks  = []
+        self.loops   = []
+        self.forward = {} # Value -> Value that replaces it
+        self.consts  = {} # (type, val) -> Const
+
+    def new_block(self):
+        block = Block(len(self.blocks))
+        self.blocks.append(block)
+        return block
+
+    def resolve(self, val):
+        root = val
+        while root in self.forward:
+            root = self.forward[root]
+        while val in self.forward: # path compression
+            self.forward[val], val = root, self.forward[val]
+        return root
+
+    def replace(self, old, new):
+        self.forward[old] = new
+
+    def rewrite(self):
+        """
+        Replaces all uses of forwarded values.
+        """
+        resolve = self.resolve
+        for block in self.blocks:
+            for phi in block.phis:
+                phi.args = [resolve(arg) for arg in phi.args]
+            for instr in block.instrs:
+                instr.args = [resolve(arg) for arg in instr.args]
+            if isinstance(block.term, Branch):
+                block.term.cond = resolve(block.term.cond)
+            elif isinstance(block.term, Ret):
+                block.term.val = resolve(block.term.val)
+        self.forward = {}
+
+    def number(self):
+        idx = 0
+        for block in self.blocks:
+            for val in block.phis + block.instrs:
+                val.id = idx
+                idx   += 1
+        return idx
+
+    def rpo(self):
+        """
+        Returns the blocks in reverse post-order.
+        """
+        order, seen, stack = [], {self.blocks[0]}, [(self.blocks[0], iter(succs(self.blocks[0].term)))]
+        while stack:
+            block, it = stack[-1]
+            for succ in it:
+                if succ not in seen:
+                    seen.add(succ)
+                    stack.append((succ, iter(succs(succ.term))))
+                    break
+            else:
+                stack.pop()
+                order.append(block)
+        order.reverse()
+        return order
+
+    def dominators(self):
+        """
+        Returns the immediate dominator of each block (Cooper, Harvey, Kennedy: "A Simple, Fast Dominance Algorithm").
+        """
+        order = self.rpo()
+        index = {block: i for i, block in enumerate(order)}
+        idom  = {order[0]: order[0]}
+
+        def intersect(b1, b2):
+            while b1 is not b2:
+                while index[b1] > index[b2]:
+                    b1 = idom[b1]
+                while index[b2] > index[b1]:
+                    b2 = idom[b2]
+            return b1
+
+        changed = True
+        while changed:
+            changed = False
+            for block in order[1:]:
+                preds    = [pred for pred in block.preds if pred in idom]
+                new_idom = preds[0]
+                for pred in preds[1:]:
+                    new_idom = intersect(pred, new_idom)
+                if idom.get(block) is not new_idom:
+                    idom[block] = new_idom
+                    changed     = True
+        return order, idom
+
+    # Passes - each returns the number of changes it made
+
+    def copy_prop(self):
+        num, changed = 0, True
+        while changed:
+            changed = False
+            for block in self.blocks:
+                phis = []
+                for phi in block.phis:
+                    args = {self.resolve(arg) for arg in phi.args} - {phi}
+                    if len(args) == 1:
+                        self.replace(phi, args.pop())
+                        num    += 1
+                        changed = True
+                    else:
+                        phis.append(phi)
+                block.phis = phis
+        self.rewrite()
+        return num
+
+    def gvn(self):
+        order, idom = self.dominators()
+        children    = {block: [] for block in order}
+        for block in order[1:]:
+            children[idom[block]].append(block)
+
+        num   = 0
+        table = {}
+        stack = [order[0]]
+        undo  = [] # per block on the stack: keys to remove from table when leaving its dominator subtree
+        while stack:
+            block = stack.pop()
+            if block is None:
+                for key in undo.pop():
+                    del table[key]
+                continue
+
+            added = []
+            num  += self.gvn_block(block, table, added)
+            undo.append(added)
+            stack.append(None)
+            stack += children[block]
+        self.rewrite()
+        return num
+
+    def gvn_block(self, block, table, added):
+        num = 0
+        for phi in block.phis:
+            phi.args = [self.intern(self.resolve(arg)) for arg in phi.args]
+            key = (block, *phi.args)
+            if key in table:
+                self.replace(phi, table[key])
+                num += 1
+            else:
+                table[key] = phi
+                added.append(key)
+        block.phis = [phi for phi in block.phis if phi not in self.forward]
+
+        instrs = []
+        for instr in block.instrs:
+            instr.args = [self.intern(self.resolve(arg)) for arg in instr.args]
+            if (val := fold(instr)) is not None:
+                self.replace(instr, self.intern(val))
+                num += 1
+                continue
+            args = sorted(instr.args, key=id) if instr.op in COMMUTATIVE else instr.args
+            key  = (instr.op, *args)
+            if key in table:
+                self.replace(instr, table[key])
+                num += 1
+            else:
+                table[key] = instr
+                added.append(key)
+                instrs.append(instr)
+        block.instrs = instrs
+        return num
+
+    def intern(self, val):
+        """
+        Equal constants become the same value.
+        """
+        if isinstance(val, Const):
+            return self.consts.setdefault((type(val.val), val.val), val)
+        return val
+
+    def dse(self):
+        live  = set()
+        stack = []
+        for block in self.blocks:
+            if isinstance(block.term, Branch):
+                stack.append(block.term.cond)
+            elif isinstance(block.term, Ret):
+                stack.append(block.term.val)
+        while stack:
+            val = stack.pop()
+            if val not in live and not isinstance(val, Const):
+                live.add(val)
+                stack += val.args
+
+        num = 0
+        for block in self.blocks:
+            phis   = [phi   for phi   in block.phis   if phi   in live]
+            instrs = [instr for instr in block.instrs if instr in live]
+            num   += len(block.phis) - len(phis) + len(block.instrs) - len(instrs)
+            block.phis, block.instrs = phis, instrs
+        return num
+
+    def licm(self):
+        _, idom = self.dominators()
+        num = 0
+        for loop in self.loops:
+            # int arithmetic may overflow, which is undefined in C, so it only moves out of blocks that run anyway
+            always = loop.always_run(idom)
+            # blocks are created in order, so definitions inside the loop come before their uses except for phis
+            for block in sorted(loop.blocks, key=lambda block: block.id):
+                instrs = []
+                for instr in block.instrs:
+                    if (instr.ty is Tag.K_BOOL or block in always) and all(loop.invariant(arg) for arg in instr.args):
+                        instr.block = loop.preheader
+                        loop.preheader.instrs.append(instr)
+                        num += 1
+                    else:
+                        instrs.append(instr)
+                block.instrs = instrs
+        return num
+
+    def strength_reduce(self):
+        _, idom = self.dominators()
+        num = 0
+        for loop in self.loops:
+            pre_idx = loop.header.preds.index(loop.preheader)
+            ivs     = induction_vars(loop, pre_idx)
+            always  = loop.always_run(idom) # the multiplications in the preheader may overflow, like in licm
+            for block in sorted(loop.blocks, key=lambda block: block.id):
+                for instr in block.instrs:
+                    if block not in always or instr.op is not Tag.T_MUL or len(instr.args) != 2:
+                        continue
+                    iv, factor = instr.args
+                    if iv not in ivs:
+                        factor, iv = iv, factor
+                    if iv not in ivs or not loop.invariant(factor):
+                        continue
+
+                    self.replace(instr, self.reduce(loop, pre_idx, iv, ivs[iv], factor))
+                    num += 1
+        self.rewrite()
+        return num
+
+    def reduce(self, loop, pre_idx, iv, iv_step, factor):
+        """
+        iv * factor becomes a new induction variable: iv's initial value * factor, then += step * factor.
+        """
+        op, step = iv_step
+        init = self.append(loop.preheader, Tag.T_MUL, [iv.args[pre_idx], factor])
+        inc  = self.append(loop.preheader, Tag.T_MUL, [step, factor])
+        phi  = Phi(Tag.K_INT, loop.header)
+        succ = self.append(loop.latch, op, [phi, inc])
+        phi.args = [init, succ] if pre_idx == 0 else [succ, init]
+        loop.header.phis.append(phi)
+        return phi
+
+    def append(self, block, op, args):
+        """
+        Appends a new int instruction to block unless it folds to an existing value.
+        """
+        args  = [self.resolve(arg) for arg in args]
+        instr = Instr(Tag.K_INT, block, op, args)
+        if (val := fold(instr)) is not None:
+            return val
+        block.instrs.append(instr)
+        return instr
+
+    def optimize(self):
+        """
+        Runs all passes and returns the number of changes per pass.
+        """
+        stats = {}
+        def count(name, num):
+            stats[name] = stats.get(name, 0) + num
+
+        count("copy propagation", self.copy_prop())
+        count("value numbering",  self.gvn())
+        count("code motion",      self.licm())
+        count("strength reduction", self.strength_reduce())
+        count("copy propagation", self.copy_prop())
+        count("value numbering",  self.gvn())
+        count("dead stores",      self.dse())
+        return stats
+
+    # Interpreter
+
+    def lower(self, fuel = None):
+        """
+        Returns the registers, initialized with the constants, and per block:
+            (instrs, cond or -1, (edge to the successor taken if cond holds, edge to the other one))
+        where each instruction is (dst, fn, a, b or -1) and each edge is (block, phis, phi args).
+        For a Ret, cond holds the result and the edges are None.
+        With fuel, the body of a loop starts with an instruction that counts a step.
+        """
+        regs = [None] * self.number()
+
+        def reg(val):
+            if isinstance(val, Const):
+                regs.append(val.val)
+                return len(regs) - 1
+            return val.id
+
+        def edge(pred, succ):
+            # phis are parallel copies on the edge from pred to succ
+            i = succ.preds.index(pred)
+            return succ.id, [phi.id for phi in succ.phis], [reg(phi.args[i]) for phi in succ.phis]
+
+        code = []
+        for block in self.blocks:
+            instrs = []
+            if fuel is not None and block.loop is not None:
+                regs += [block.loop, None]
+                instrs.append((len(regs) - 1, fuel.tick, len(regs) - 2, -1))
+            for instr in block.instrs:
+                if len(instr.args) == 1:
+                    instrs.append((instr.id, UNARY_OPS[instr.op], reg(instr.args[0]), -1))
+                else:
+                    instrs.append((instr.id, BIN_OPS[instr.op], reg(instr.args[0]), reg(instr.args[1])))
+            term = block.term
+            if isinstance(term, Jump):
+                code.append((instrs, -1, (edge(block, term.target), None)))
+            elif isinstance(term, Branch):
+                code.append((instrs, reg(term.cond), (edge(block, term.then), edge(block, term.other))))
+            else:
+                code.append((instrs, reg(term.val), None))
+        return regs, code
+
+    def run(self, fuel = None):
+        """
+        Interprets the Func and returns the result.
+        """
+        regs, code = self.lower(fuel)
+        block = 0
+        while True:
+            instrs, cond, edges = code[block]
+            for dst, fn, a, b in instrs:
+                regs[dst] = fn(regs[a]) if b < 0 else fn(regs[a], regs[b])
+            if edges is None:
+                return regs[cond]
+            block, dsts, srcs = edges[1] if cond >= 0 and not regs[cond] else edges[0]
+            for dst, val in zip(dsts, [regs[src] for src in srcs]):
+                regs[dst] = val
+
+    # Output
+
+    def __str__(self):
+        self.number()
+        res = ""
+        for block in self.blocks:
+            preds = ", ".join(pred.name() for pred in block.preds)
+            res  += f"{block.name()}:" + (f" ; preds {preds}" if preds else "") + "\n"
+            for val in block.phis + block.instrs:
+                res += f"    {val}\n"
+            term = block.term
+            if isinstance(term, Jump):
+                res += f"    jmp {term.target.name()}\n"
+            elif isinstance(term, Branch):
+                res += f"    br {term.cond.name()}, {term.then.name()}, {term.other.name()}\n"
+            else:
+                res += f"    ret {term.val.name()}\n"
+        return res
+
+    def emit(self, out):
+        """
+        Writes the Func to out, a while_ast.Emitter for Emit.C or Emit.PY.
+        """
+        self.number()
+        c = out.emit is Emit.C
+        if c:
+            ret = next(block.term for block in self.blocks if isinstance(block.term, Ret))
+            out.c_prologue(ret.val.ty)
+        else:
+            out.write("def main():\n")
+        out.indent()
+        if not c:
+            out.py_prologue()
+
+        if c:
+            for block in self.blocks:
+                for phi in block.phis:
+                    out.write(f"{out.ind}{phi.ty} {phi.name(out.emit)}, {phi.name_in(out.emit)};\n")
+                for instr in block.instrs:
+                    out.write(f"{out.ind}{instr.ty} {instr.name(out.emit)};\n")
+        else:
+            out.write(f"{out.ind}bb = 0\n")
+            out.write(f"{out.ind}while True:\n")
+            out.indent()
+
+        for block in self.blocks:
+            if c:
+                out.write(f"{block.name()}:\n")
+            else:
+                out.write(f"{out.ind}{'if' if block.id == 0 else 'elif'} bb == {block.id}:\n")
+                out.indent()
+            if block.loop is not None:
+                out.fuel_check(block.loop.begin)
+            for phi in block.phis:
+                out.write(f"{out.ind}{phi.name(out.emit)} = {phi.name_in(out.emit)}{';' if c else ''}\n")
+            for instr in block.instrs:
+                out.write(f"{out.ind}{instr.name(out.emit)} = {instr.expr(out.emit)}{';' if c else ''}\n")
+            emit_term(out, block)
+            if not c:
+                out.dedent()
+
+        out.dedent()
+        if c:
+            out.write("}\n")
+        else:
+            out.dedent()
+            out.write("\nmain()\n")
+
+def build(prog):
+    func = Func()
+    run(Builder(func).prog(prog))
+    return func
+
+def eval_func(func, fuel = None):
+    print(func.run(fuel))
@@ -2,32 +2,69 @@
 Lexes an input file and produces Tokens.
 """
 
-from copy import deepcopy
+import re
 import string
+import sys
 
-from err import err
-from loc import Pos, Loc
+from err import Diagnostics
+from loc import Source, Loc
 from tok import Tag, Tok
 
+KEYWORDS = {
+    "and"   : Tag.K_AND,
+    "or"    : Tag.K_OR,
+    "not"   : Tag.K_NOT,
+    "bool"  : Tag.K_BOOL,
+    "int"   : Tag.K_INT,
+    "true"  : Tag.K_TRUE,
+    "false" : Tag.K_FALSE,
+    "return": Tag.K_RETURN,
+    "if"    : Tag.K_IF,
+    "else"  : Tag.K_ELSE,
+    "while" : Tag.K_WHILE,
+}
+
+OPERATORS = {
+    "{" : Tag.D_BRACE_L,
+    "}" : Tag.D_BRACE_R,
+    "(" : Tag.D_PAREN_L,
+    ")" : Tag.D_PAREN_R,
+    "+" : Tag.T_ADD,
+    "-" : Tag.T_SUB,
+    "*" : Tag.T_MUL,
+    ";" : Tag.T_SEMICOLON,
+    "=" : Tag.T_ASSIGN,
+    "==": Tag.T_EQ,
+    "!=": Tag.T_NE,
+    "<" : Tag.T_LT,
+    "<=": Tag.T_LE,
+    ">" : Tag.T_GT,
+    ">=": Tag.T_GE,
+}
+
+# One alternative per token class; longer operators must come first.
+TOKEN = re.compile(r"""
+      (?P<ws>[ \t\n\r\x0b\x0c]+)
+    | (?P<lit>[0-9]+)
+    | (?P<sym>[a-zA-Z][a-zA-Z0-9]*)
+    | (?P<op>==|!=|<=|>=|[{}()+\-*;=<>])
+    | (?P<bang>!.?)
+    | (?P<bad>.)
+""", re.VERBOSE | re.DOTALL)
+
 class Lexer:
-    def __init__(self, file):
-        self.file = file
-        self.loc  = Loc(file.name, Pos(1, 1), Pos(1, 1))
-        self.peek = Pos(1, 1)
-        self.str  = ""
-        self.keywords = {
-            "and"   : Tag.K_AND,
-            "or"    : Tag.K_OR,
-            "not"   : Tag.K_NOT,
-            "bool"  : Tag.K_BOOL,
-            "int"   : Tag.K_INT,
-            "true"  : Tag.K_TRUE,
-            "false" : Tag.K_FALSE,
-            "return": Tag.K_RETURN,
-            "if"    : Tag.K_IF,
-            "else"  : Tag.K_ELSE,
-            "while" : Tag.K_WHILE,
-        }
+    """
+    Reads the input char by char.
+    Kept as reference for BufLexer.
+    """
+    def __init__(self, file, diags = None):
+        self.file  = file
+        self.diags = diags if diags is not None else Diagnostics()
+        self.src   = Source(file.name) # line starts are recorded while reading
+        self.loc   = Loc(self.src, 0, 0)
+        self.peek  = 0
+        self.str   = ""
+        self.keywords = KEYWORDS
 
     def accept_if(self, pred):
         tell = self.file.tell()
@@ -35,15 +72,12 @@ class Lexer:
 
         if pred(char):
             self.str += char
-            self.loc.finis = deepcopy(self.peek)
+            self.loc.finis = self.peek
 
-            if char == "": # end of file
-                pass
-            elif char == "\n":
-                self.peek.row += 1
-                self.peek.col = 1
-            else:
-                self.peek.col += 1
+            if char != "": # not end of file
+                self.peek += 1
+                if char == "\n":
+                    self.src.lines.append(self.peek)
             return True
 
         self.file.seek(tell) # undo read
@@ -57,8 +91,7 @@ class Lexer:
 
     def lex(self):
         while True:
-            self.loc.begin = deepcopy(self.peek)
-            self.loc.finis = deepcopy(self.peek)
+            self.loc = Loc(self.src, self.peek, self.peek)
             self.str = ""
 
             if self.accept("" ): return Tok(self.loc, Tag.M_EOF)
@@ -88,7 +121,7 @@ class Lexer:
             if self.accept("!"):
                 if self.accept("="): return Tok(self.loc, Tag.T_NE)
                 self.eat()
-                err(self.loc.anew_begin(), f"invalid input char '{self.str}'; maybe you wanted to use '!='?")
+                self.diags.err(self.loc.anew_begin(), f"invalid input char '{self.str}'; maybe you wanted to use '!='?")
                 continue
 
             # literal
@@ -102,7 +135,46 @@ class Lexer:
                 while self.accept_if(lambda char : char in string.ascii_letters or char in string.digits):
                     pass
                 if self.str in self.keywords: return Tok(self.loc, self.keywords[self.str])
-                return Tok(self.loc, self.str)
+                return Tok(self.loc, sys.intern(self.str)) # Sema looks it up by hash and equality
 
             self.eat()
-            err(self.loc.anew_begin(), f"invalid input char '{self.str}'")
+            self.diags.err(self.loc.anew_begin(), f"invalid input char '{self.str}'")
+
+class BufLexer:
+    """
+    Reads the whole input at once and scans it with the master pattern TOKEN.
+    Yields the same Tok stream and diagnostics as Lexer.
+    """
+    def __init__(self, file, diags = None, region = None):
+        """
+        Given a region (src, begin, end), scans src.text from offset begin up to end instead of reading file; see
+        watch.py.
+        """
+        src, begin, end = region if region is not None else (Source(file.name, file.read()), 0, None)
+        self.diags  = diags if diags is not None else Diagnostics()
+        self.src    = src
+        self.text   = src.text
+        self.offset = begin # where to continue scanning
+        self.end    = len(self.text) if end is None else end
+        self.keywords = KEYWORDS
+
+    def lex(self):
+        while True:
+            match = TOKEN.match(self.text, self.offset, self.end)
+            if match is None:
+                return Tok(Loc(self.src, self.offset, self.offset), Tag.M_EOF)
+
+            kind  = match.lastgroup
+            begin = self.offset
+            self.offset = match.end()
+            if kind == "ws": continue
+
+            text = match.group()
+            loc  = Loc(self.src, begin, self.offset - 1)
+            if kind == "op":  return Tok(loc, OPERATORS[text])
+            if kind == "lit": return Tok(loc, int(text))
+            if kind == "sym": return Tok(loc, self.keywords.get(text) or sys.intern(text))
+            if kind == "bang":
+                self.diags.err(loc.anew_begin(), f"invalid input char '{text}'; maybe you wanted to use '!='?")
+            else:
+                self.diags.err(loc.anew_begin(), f"invalid input char '{text}'")
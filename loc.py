@@ -1,10 +1,15 @@
 """
 Helpers to keep track of source code locations.
+
+A Loc only stores offsets into its Source.
+Rows and columns are computed on demand when a Loc is printed.
 """
 
-from copy import deepcopy
+from bisect import bisect_right
 
 class Pos:
+    __slots__ = ("row", "col")
+
     def __init__(self, row, col):
         self.row = row
         self.col = col
@@ -18,24 +23,63 @@ class Pos:
     def __ne__(self, other):
         return not self == other
 
+class Source:
+    __slots__ = ("name", "text", "lines", "moved")
+
+    def __init__(self, name, text = None):
+        self.name  = name
+        self.text  = text
+        self.lines = None if text is not None else [0] # offsets of all line starts; see line_starts
+        self.moved = None # see move
+
+    def move(self, end, delta, succ):
+        """
+        The text was edited before offset end and now lives in succ: offsets from end on moved by delta.
+        Locs into this Source stay valid, so the nodes after an edit need not be touched; see watch.py.
+        """
+        self.moved = (end, delta, succ)
+        self.text  = None
+        self.lines = None
+
+    def line_starts(self):
+        if self.lines is None:
+            self.lines = [0]
+            find = self.text.find
+            offset = find("\n")
+            while offset != -1:
+                self.lines.append(offset + 1)
+                offset = find("\n", offset + 1)
+        return self.lines
+
+    def pos(self, offset):
+        src = self
+        while src.moved is not None:
+            end, delta, src = src.moved
+            if offset >= end:
+                offset += delta
+        lines = src.line_starts()
+        row   = bisect_right(lines, offset)
+        return Pos(row, offset - lines[row - 1] + 1)
+
 class Loc:
-    def __init__(self, file, begin, finis):
-        self.file = file
-        self.begin = begin
-        self.finis = finis
+    __slots__ = ("src", "begin", "finis")
+
+    def __init__(self, src, begin, finis):
+        self.src   = src
+        self.begin = begin # offset of the first char
+        self.finis = finis # offset of the last char
 
     def __str__(self):
+        begin = self.src.pos(self.begin)
         if self.begin == self.finis:
-            return f"{self.file}:{self.begin}"
-        if self.begin.row == self.finis.row:
-            return f"{self.file}:{self.begin}-{self.finis.col}"
-        return f"{self.file}:{self.begin}-{self.finis}"
+            return f"{self.src.name}:{begin}"
+        finis = self.src.pos(self.finis)
+        if begin.row == finis.row:
+            return f"{self.src.name}:{begin}-{finis.col}"
+        return f"{self.src.name}:{begin}-{finis}"
 
     def anew_begin(self):
-        return Loc(self.file, self.begin, self.begin)
+        return Loc(self.src, self.begin, self.begin)
 
     def anew_finis(self):
-        return Loc(self.file, self.finis, self.finis)
-
-    def copy(self):
-        return Loc(self.file, deepcopy(self.begin), deepcopy(self.finis))
+        return Loc(self.src, self.finis, self.finis)
@@ -0,0 +1,74 @@
+"""
+Builds the output of the C backend into a shared object and calls it in-process.
+
+The program becomes an exported function (see Emitter.export) which is compiled with $CC (default: cc).
+The shared objects are cached on disk, keyed by the source text, the optimization level, the C compiler and its flags,
+so a repeated run of the same program skips both the front end and the C compiler.
+Like --output-c, the program computes with C's int.
+With --max-steps or --timeout, the loops count their steps and call back into fuel.Fuel (see fuel.py); such builds are
+cached apart from the others.
+"""
+
+import ctypes
+import os
+import subprocess
+import sys
+import tempfile
+
+from cache import Cache
+from while_ast import Emit, Emitter
+
+FLAGS  = ("-O2", "-shared", "-fPIC")
+EXPORT = "while_main"
+REFILL = ctypes.CFUNCTYPE(ctypes.c_long, ctypes.c_long) # fuel.Fuel.refill_native
+
+def compiler():
+    return os.environ.get("CC", "cc")
+
+def key(cache, text, opt, fueled):
+    return cache.key(text, opt, fueled, compiler(), *FLAGS)
+
+def load(text, opt, fueled = False):
+    cache = Cache("native")
+    if cache.get(k := key(cache, text, opt, fueled)) is not None:
+        try:
+            return ctypes.CDLL(cache.path(k))
+        except OSError:
+            pass # corrupt or evicted in the meantime; it will be rebuilt
+    return None
+
+def build(node, text, opt, fueled = False):
+    """
+    Compiles node, a Prog or an ir.Func, caches the shared object and loads it.
+    """
+    cache = Cache("native")
+    with tempfile.TemporaryDirectory() as tmp:
+        c_file  = os.path.join(tmp, "prog.c")
+        so_file = os.path.join(tmp, "prog.so")
+        with open(c_file, "w", encoding="ASCII") as file:
+            out = Emitter(file, Emit.C, export=EXPORT)
+            out.fuel = fueled
+            node.emit(out)
+
+        try:
+            res = subprocess.run([compiler(), *FLAGS, "-o", so_file, c_file], capture_output=True, text=True, check=False)
+        except OSError as error:
+            sys.exit(f"error: cannot run C compiler '{compiler()}': {error.strerror}")
+        if res.returncode != 0:
+            sys.exit(f"error: C compiler '{compiler()}' failed:\n{res.stderr}")
+
+        with open(so_file, "rb") as file:
+            cache.put(key(cache, text, opt, fueled), file.read())
+        return ctypes.CDLL(so_file) # the library stays loaded after its file is gone
+
+def run(lib, fuel = None):
+    """
+    Calls the program in lib, which must have been built with fueled = fuel is not None.
+    """
+    if fuel is None:
+        res = getattr(lib, EXPORT)()
+    else:
+        res = getattr(lib, EXPORT)(REFILL(fuel.refill_native))
+        if fuel.exhausted is not None:
+            raise fuel.exhausted
+    print(bool(res) if ctypes.c_int.in_dll(lib, f"{EXPORT}_is_bool").value else res)
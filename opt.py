@@ -0,0 +1,164 @@
+"""
+-O1: simplifies a checked Prog in place.
+
+Expressions in While have no side effects, so an operand may be dropped whenever the result does not depend on it:
+    * BinExpr/UnaryExpr over LitExpr/BoolExpr are folded,
+    * identities like x + 0, x * 1, b and true, not not b are simplified,
+    * IfStmts with a constant condition are replaced by the branch taken,
+    * WhileStmts whose condition is constantly false are removed,
+    * counting loops are replaced by the closed forms of their results; see scev.py.
+The slots assigned by Prog.check stay valid, so the result can be fed to every backend.
+"""
+
+import scev
+from closure import BIN_OPS
+from tok import Tag
+from while_ast import Prog, DeclStmt, AssignStmt, StmtList, IfStmt, WhileStmt, \
+    BinExpr, UnaryExpr, BoolExpr, LitExpr, run
+
+def const(loc, val):
+    return BoolExpr(loc, val) if isinstance(val, bool) else LitExpr(loc, val)
+
+def is_const(expr, val):
+    # 1 == True and 0 == False in Python: compare the types, too
+    return isinstance(expr, (LitExpr, BoolExpr)) and type(expr.val) is type(val) and expr.val == val
+
+def nodes(node):
+    """
+    Yields all nodes of the tree rooted at node.
+    """
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        yield node
+        if isinstance(node, Prog):
+            stack += (node.stmt, node.ret)
+        elif isinstance(node, (DeclStmt, AssignStmt)):
+            stack.append(node.init)
+        elif isinstance(node, StmtList):
+            stack += node.stmts
+        elif isinstance(node, IfStmt):
+            stack += (node.cond, node.cons, node.alt)
+        elif isinstance(node, WhileStmt):
+            stack += (node.cond, node.body)
+        elif isinstance(node, BinExpr):
+            stack += (node.lhs, node.rhs)
+        elif isinstance(node, UnaryExpr):
+            stack.append(node.rhs)
+
+def num_nodes(node):
+    return sum(1 for _ in nodes(node))
+
+class Optimizer:
+    # Prog
+
+    def prog(self, prog):
+        run(self.stmt_list(prog.stmt))
+        prog.ret = run(self.expr(prog.ret))
+
+    # Stmt - like the traversals in while_ast, these are generators driven by run
+
+    def stmt_list(self, stmt_list):
+        stmts = []
+        for stmt in stmt_list.stmts:
+            stmts += yield self.stmt(stmt)
+        stmt_list.stmts = stmts
+
+    def stmt(self, stmt):
+        """
+        Returns the list of statements that replace stmt.
+        """
+        if isinstance(stmt, (DeclStmt, AssignStmt)):
+            stmt.init = yield self.expr(stmt.init)
+            return [stmt]
+        if isinstance(stmt, StmtList):
+            yield self.stmt_list(stmt)
+            return [stmt]
+        if isinstance(stmt, IfStmt):
+            return (yield self.if_stmt(stmt))
+        if isinstance(stmt, WhileStmt):
+            return (yield self.while_stmt(stmt))
+        assert False
+
+    def if_stmt(self, if_stmt):
+        if_stmt.cond = yield self.expr(if_stmt.cond)
+        yield self.stmt_list(if_stmt.cons)
+        yield self.stmt_list(if_stmt.alt)
+
+        if isinstance(if_stmt.cond, BoolExpr):
+            taken = if_stmt.cons if if_stmt.cond.val else if_stmt.alt
+            if not any(isinstance(stmt, DeclStmt) for stmt in taken.stmts):
+                return taken.stmts
+            # keep the scope of the declarations: if true { taken } else {}
+            if_stmt.cond = const(if_stmt.cond.loc, True)
+            if_stmt.cons = taken
+            if_stmt.alt  = StmtList(if_stmt.alt.loc, [])
+        elif not if_stmt.cons.stmts and not if_stmt.alt.stmts:
+            return []
+        return [if_stmt]
+
+    def while_stmt(self, while_stmt):
+        while_stmt.cond = yield self.expr(while_stmt.cond)
+        if is_const(while_stmt.cond, False):
+            return []
+        yield self.stmt_list(while_stmt.body)
+        return [while_stmt]
+
+    # Expr
+
+    def expr(self, expr):
+        """
+        Returns the expression that replaces expr.
+        """
+        if isinstance(expr, BinExpr):
+            expr.lhs = yield self.expr(expr.lhs)
+            expr.rhs = yield self.expr(expr.rhs)
+            return self.bin_expr(expr)
+        if isinstance(expr, UnaryExpr):
+            expr.rhs = yield self.expr(expr.rhs)
+            return self.unary_expr(expr)
+        return expr
+
+    def bin_expr(self, bin_expr):
+        op, lhs, rhs = bin_expr.op, bin_expr.lhs, bin_expr.rhs
+        if isinstance(lhs, (LitExpr, BoolExpr)) and isinstance(rhs, (LitExpr, BoolExpr)):
+            return const(bin_expr.loc, BIN_OPS[op](lhs.val, rhs.val))
+
+        if op is Tag.T_ADD:
+            if is_const(lhs, 0): return rhs
+            if is_const(rhs, 0): return lhs
+        elif op is Tag.T_SUB:
+            if is_const(rhs, 0): return lhs
+        elif op is Tag.T_MUL:
+            if is_const(lhs, 1): return rhs
+            if is_const(rhs, 1): return lhs
+            if is_const(lhs, 0) or is_const(rhs, 0): return const(bin_expr.loc, 0)
+        elif op is Tag.K_AND:
+            if is_const(lhs, True ): return rhs
+            if is_const(rhs, True ): return lhs
+            if is_const(lhs, False) or is_const(rhs, False): return const(bin_expr.loc, False)
+        elif op is Tag.K_OR:
+            if is_const(lhs, False): return rhs
+            if is_const(rhs, False): return lhs
+            if is_const(lhs, True ) or is_const(rhs, True ): return const(bin_expr.loc, True)
+        return bin_expr
+
+    def unary_expr(self, unary_expr):
+        op, rhs = unary_expr.op, unary_expr.rhs
+        if op is Tag.T_ADD:
+            return rhs
+        if isinstance(rhs, (LitExpr, BoolExpr)):
+            return const(unary_expr.loc, not rhs.val if op is Tag.K_NOT else -rhs.val)
+        if isinstance(rhs, UnaryExpr) and rhs.op is op:
+            return rhs.rhs # not not b, - - x
+        return unary_expr
+
+def optimize(prog, inputs = ()):
+    """
+    Optimizes prog in place and returns the number of changes per kind.
+    inputs are DeclStmts whose initializers may be replaced later, like --batch does, so their values are not assumed.
+    """
+    before = num_nodes(prog)
+    Optimizer().prog(prog)
+    closed = scev.Closer(inputs).prog(prog)
+    return {"eliminated nodes": before - num_nodes(prog), "closed loops": closed}
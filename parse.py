@@ -4,13 +4,11 @@ Parses a stream of tokens generated by the lexer.
 
 from enum import IntEnum, auto
 
-from while_ast import Prog,                                 \
-    DeclStmt, AssignStmt, StmtList, IfStmt, WhileStmt,      \
-    BinExpr, UnaryExpr, BoolExpr, LitExpr, SymExpr, ErrExpr
-from lexer import Lexer
+from while_ast import Nodes
+from lexer import BufLexer
 from tok import Tag, Tok
 from loc import Loc
-from err import err
+from err import Diagnostics
 
 class Prec(IntEnum):
     BOT   = auto()
@@ -23,10 +21,17 @@ class Prec(IntEnum):
     UNARY = auto()
 
 class Parser:
-    def __init__(self, file):
-        self.lexer = Lexer(file)
+    def __init__(self, file, lexer=BufLexer, nodes=None, diags=None):
+        """
+        nodes builds the AST: a while_ast.Nodes, the default, builds objects, an arena.Arena arrays.
+        The lexer is created as lexer(file, diags); all errors go to diags, a fresh err.Diagnostics by default.
+        """
+        self.diags = diags if diags is not None else Diagnostics()
+        self.lexer = lexer(file, self.diags)
+        self.nodes = nodes if nodes is not None else Nodes()
         self.ahead = self.lexer.lex()
-        self.prev  = None
+        self.prev  = 0 # begin offset of the previous Tok
+        self.num_toks = 1 # including the lookahead
 
         self.prec = {
             Tag.K_OR : [Prec.OR , Prec.AND],
@@ -50,7 +55,7 @@ class Parser:
             self.parser = parser
 
         def loc(self):
-            return Loc(self.parser.ahead.loc.file, self.begin, self.parser.prev)
+            return Loc(self.parser.ahead.loc.src, self.begin, self.parser.prev)
 
     def track(self):
         return self.Tracker(self.ahead.loc.begin, self)
@@ -61,6 +66,7 @@ class Parser:
         result     = self.ahead
         self.prev  = result.loc.begin
         self.ahead = self.lexer.lex()
+        self.num_toks += 1
         return result
 
     def accept(self, tag):
@@ -74,7 +80,7 @@ class Parser:
         if ctxt is None:
             self.err(expected, self.ahead, got)
         else:
-            err(got.loc, f"expected {expected}, got '{got}' while parsing {ctxt}")
+            self.diags.err(got.loc, f"expected {expected}, got '{got}' while parsing {ctxt}")
 
     def expect(self, tag, ctxt):
         if self.ahead.isa(tag): return self.lex()
@@ -90,7 +96,7 @@ class Parser:
         ret  = self.parse_expr("return expression")
         self.expect(Tag.T_SEMICOLON, "at the end of the final return of the program")
         self.expect(Tag.M_EOF, "at the end of the program")
-        return Prog(t.loc(), stmt, ret)
+        return self.nodes.prog(t.loc(), stmt, ret)
 
     def parse_sym(self, ctxt=None):
         if (tok := self.accept(Tag.M_SYM)) is not None: return tok
@@ -101,26 +107,69 @@ class Parser:
 
     # Stmt
 
+    # Nested blocks are parsed with an explicit stack of open statements instead of recursion.
+    # Each entry is a Frame; kind tells which part of which statement the current block belongs to.
+
+    class Frame:
+        def __init__(self, kind, t, cond = None):
+            self.kind  = kind  # "if", "else", "while" or None for the outermost block
+            self.t     = t     # Tracker of the whole statement
+            self.cond  = cond
+            self.cons  = None  # finished consequence of an if statement
+            self.block = None  # Tracker of the current block
+            self.stmts = []    # statements parsed so far in the current block
+
     def parse_stmt(self):
-        t     = self.track()
-        stmts = []
+        stack = [self.Frame(None, None)]
+        stack[-1].block = self.track()
 
         while True:
+            frame = stack[-1]
+
             while self.accept(Tag.T_SEMICOLON):
                 pass
 
             if self.ahead.isa(Tag.K_INT) or self.ahead.isa(Tag.K_BOOL):
-                stmts.append(self.parse_decl_stmt())
+                frame.stmts.append(self.parse_decl_stmt())
             elif self.ahead.isa(Tag.M_SYM):
-                stmts.append(self.parse_assign_stmt())
+                frame.stmts.append(self.parse_assign_stmt())
             elif self.ahead.isa(Tag.K_IF):
-                stmts.append(self.parse_if_stmt())
+                t = self.track()
+                self.eat(Tag.K_IF)
+                stack.append(self.parse_block_head("if", t, "condition of a if statement", "if statement"))
             elif self.ahead.isa(Tag.K_WHILE):
-                stmts.append(self.parse_while_stmt())
+                t = self.track()
+                self.eat(Tag.K_WHILE)
+                stack.append(self.parse_block_head("while", t, "condition of a while statement", "while statement"))
             else:
-                break
-
-        return StmtList(t.loc(), stmts)
+                block_loc = frame.block.loc()
+                block     = self.nodes.stmt_list(block_loc, frame.stmts)
+                if frame.kind is None:
+                    return block
+
+                self.expect(Tag.D_BRACE_R, f"{frame.kind if frame.kind != 'else' else 'if'} statement")
+                if frame.kind == "if":
+                    frame.cons = block
+                    if self.accept(Tag.K_ELSE):
+                        self.expect(Tag.D_BRACE_L, "if statement")
+                        frame.kind  = "else"
+                        frame.block = self.track()
+                        frame.stmts = []
+                        continue
+                    stmt = self.nodes.if_stmt(frame.t.loc(), frame.cond, block, self.nodes.stmt_list(block_loc, []))
+                elif frame.kind == "else":
+                    stmt = self.nodes.if_stmt(frame.t.loc(), frame.cond, frame.cons, block)
+                else:
+                    stmt = self.nodes.while_stmt(frame.t.loc(), frame.cond, block)
+
+                stack.pop()
+                stack[-1].stmts.append(stmt)
+
+    def parse_block_head(self, kind, t, cond_ctxt, ctxt):
+        frame = self.Frame(kind, t, self.parse_expr(cond_ctxt))
+        self.expect(Tag.D_BRACE_L, ctxt)
+        frame.block = self.track()
+        return frame
 
     def parse_assign_stmt(self):
         t    = self.track()
@@ -128,7 +177,7 @@ class Parser:
         self.expect(Tag.T_ASSIGN, "assignment statement")
         expr = self.parse_expr("right-hand side of an assignment statement")
         self.expect(Tag.T_SEMICOLON, "end of an assignment statement")
-        return AssignStmt(t.loc(), sym, expr)
+        return self.nodes.assign_stmt(t.loc(), sym, expr)
 
     def parse_decl_stmt(self):
         t    = self.track()
@@ -137,67 +186,75 @@ class Parser:
         self.expect(Tag.T_ASSIGN, "declaration statement")
         expr = self.parse_expr("right-hand side of a declaration statement")
         self.expect(Tag.T_SEMICOLON, "end of a declaration statement")
-        return DeclStmt(t.loc(), ty, sym, expr)
-
-    def parse_if_stmt(self):
-        t    = self.track()
-        self.eat(Tag.K_IF)
-        cond = self.parse_expr("condition of a if statement")
-        self.expect(Tag.D_BRACE_L, "if statement")
-        cons = self.parse_stmt()
-        self.expect(Tag.D_BRACE_R, "if statement")
-        alt = StmtList(cons.loc, [])
-        if self.accept(Tag.K_ELSE):
-            self.expect(Tag.D_BRACE_L, "if statement")
-            alt = self.parse_stmt()
-            self.expect(Tag.D_BRACE_R, "if statement")
-
-        return IfStmt(t.loc(), cond, cons, alt)
-
-    def parse_while_stmt(self):
-        t    = self.track()
-        self.eat(Tag.K_WHILE)
-        cond = self.parse_expr("condition of a while statement")
-        self.expect(Tag.D_BRACE_L, "while statement")
-        body = self.parse_stmt()
-        self.expect(Tag.D_BRACE_R, "while statement")
-        return WhileStmt(t.loc(), cond, body)
+        return self.nodes.decl_stmt(t.loc(), ty, sym, expr)
 
     # Expr
 
-    def parse_expr(self, ctxt = None, cur_prec = Prec.BOT):
-        t   = self.track()
-        lhs = self.parse_primary_or_unary_expr(ctxt)
-
-        while self.ahead.is_bin_op():
-            (l_prec, r_prec) = self.prec[self.ahead.tag]
-            if l_prec < cur_prec:
-                break
-            op  = self.lex().tag
-            rhs = self.parse_expr("right-hand side of operator '{op}'", r_prec)
-            lhs = BinExpr(t.loc(), lhs, op, rhs)
-
-        return lhs
+    # Precedence climbing with an explicit stack instead of recursion.
+    # An Operand is an expression whose left-hand side is still growing while operators bind at least as strong as prec;
+    # the other stack entries are pending unary operators and opening parentheses.
 
-    def parse_primary_or_unary_expr(self, ctxt):
-        t = self.track()
+    class Operand:
+        def __init__(self, t, prec, ctxt):
+            self.t    = t
+            self.prec = prec
+            self.ctxt = ctxt
+            self.lhs  = None
+            self.op   = None # pending binary operator whose right-hand side is being parsed
 
-        if (tok := self.accept(Tag.K_FALSE)) is not None: return BoolExpr(tok.loc, False  )
-        if (tok := self.accept(Tag.K_TRUE )) is not None: return BoolExpr(tok.loc, True   )
-        if (tok := self.accept(Tag.M_SYM  )) is not None: return SymExpr (tok.loc, tok    )
-        if (tok := self.accept(Tag.M_LIT  )) is not None: return LitExpr (tok.loc, tok.val)
+    class Unary:
+        def __init__(self, t, op):
+            self.t  = t
+            self.op = op
 
-        if self.ahead.tag.is_unary():
-            op  = self.lex().tag
-            rhs = self.parse_expr("unary expression", Prec.NOT if op is Tag.K_NOT else Prec.UNARY)
-            return UnaryExpr(t.loc(), op, rhs)
+    class Paren:
+        pass
 
-        if self.accept(Tag.D_PAREN_L):
-            expr = self.parse_expr()
-            self.expect(Tag.D_PAREN_R, "parenthesized expression")
-            return expr
+    def parse_expr(self, ctxt = None, cur_prec = Prec.BOT):
+        stack = [self.Operand(self.track(), cur_prec, ctxt)]
 
-        if ctxt is not None:
-            self.err("primary or unary expression", ctxt)
-            return ErrExpr(self.ahead.loc)
-        assert False
+        while True:
+            # descend to the next primary expression
+            t = self.track()
+            if self.ahead.tag.is_unary():
+                op = self.lex().tag
+                stack.append(self.Unary(t, op))
+                stack.append(self.Operand(self.track(), Prec.NOT if op is Tag.K_NOT else Prec.UNARY, "unary expression"))
+                continue
+            if self.accept(Tag.D_PAREN_L):
+                stack.append(self.Paren())
+                stack.append(self.Operand(self.track(), Prec.BOT, "parenthesized expression"))
+                continue
+            expr = self.parse_primary_expr(stack[-1].ctxt)
+
+            # ascend as long as expressions are complete
+            while True:
+                top = stack[-1]
+                if isinstance(top, self.Operand):
+                    top.lhs = expr if top.op is None else self.nodes.bin_expr(top.t.loc(), top.lhs, top.op, expr)
+                    top.op  = None
+                    if self.ahead.is_bin_op():
+                        (l_prec, r_prec) = self.prec[self.ahead.tag]
+                        if l_prec >= top.prec:
+                            top.op = self.lex().tag
+                            stack.append(self.Operand(self.track(), r_prec, f"right-hand side of operator '{top.op}'"))
+                            break
+                    stack.pop()
+                    expr = top.lhs
+                    if not stack:
+                        return expr
+                elif isinstance(top, self.Unary):
+                    stack.pop()
+                    expr = self.nodes.unary_expr(top.t.loc(), top.op, expr)
+                else:
+                    stack.pop()
+                    self.expect(Tag.D_PAREN_R, "parenthesized expression")
+
+    def parse_primary_expr(self, ctxt):
+        if (tok := self.accept(Tag.K_FALSE)) is not None: return self.nodes.bool_expr(tok.loc, False  )
+        if (tok := self.accept(Tag.K_TRUE )) is not None: return self.nodes.bool_expr(tok.loc, True   )
+        if (tok := self.accept(Tag.M_SYM  )) is not None: return self.nodes.sym_expr (tok.loc, tok    )
+        if (tok := self.accept(Tag.M_LIT  )) is not None: return self.nodes.lit_expr (tok.loc, tok.val)
+
+        self.err("primary or unary expression", ctxt)
+        return self.nodes.err_expr(self.ahead.loc)
@@ -0,0 +1,124 @@
+"""
+Source-level profiler for the AST interpreter.
+
+Profiler.run replaces while_ast.run as the driver of Prog.eval: its stack of generators mirrors the nesting of the
+statements being executed, so it records, per statement, how often it ran and its cumulative time without touching the
+AST or slowing down unprofiled runs.
+Iterations of a WhileStmt are the executions of its body.
+The collapsed stacks (one 'frame;frame;... weight' per line, weighted by self time in microseconds) nest the frames
+along StmtList/IfStmt/WhileStmt and can be fed to flamegraph tools.
+"""
+
+import time
+from collections import Counter
+from types import GeneratorType
+
+from while_ast import Stmt, StmtList, IfStmt, WhileStmt
+
+STMT_EVALS = {cls.eval.__code__ for cls in (Stmt, *Stmt.__subclasses__()) if "eval" in cls.__dict__}
+
+class Entry:
+    def __init__(self, stmt, path):
+        self.stmt  = stmt
+        self.path  = path # collapsed stack up to and including stmt; fixed as the AST is a tree
+        self.count = 0
+        self.secs  = 0.0 # cumulative, including nested statements
+        self.own   = 0.0 # excluding nested statements
+
+class Frame:
+    __slots__ = ("gen", "entry", "start", "nested")
+
+    def __init__(self, gen, entry, start):
+        self.gen    = gen
+        self.entry  = entry
+        self.start  = start
+        self.nested = 0.0 # time of nested statements
+
+class Profiler:
+    def __init__(self):
+        self.entries = {} # id(stmt) -> Entry
+        self.stacks  = Counter()
+        self.total   = 0.0
+        self.fuel    = None # counts the iterations of loops; see fuel.py
+
+    def run(self, gen):
+        """
+        Drives gen like while_ast.run while timing every statement on the stack.
+        """
+        if type(gen) is not GeneratorType: # pylint: disable=unidiomatic-typecheck
+            return gen
+
+        clock  = time.perf_counter
+        begin  = clock()
+        stack  = [gen]
+        frames = [] # one per statement on stack
+        val    = None
+        self.enter(gen, frames, clock)
+        while stack:
+            try:
+                res = stack[-1].send(val)
+            except StopIteration as stop:
+                done = stack.pop()
+                if frames and frames[-1].gen is done:
+                    self.leave(frames, clock)
+                val = stop.value
+                continue
+
+            if type(res) is GeneratorType: # pylint: disable=unidiomatic-typecheck
+                stack.append(res)
+                self.enter(res, frames, clock)
+                val = None
+            else:
+                val = res
+        self.total += clock() - begin
+        return val
+
+    def enter(self, gen, frames, clock):
+        if gen.gi_code not in STMT_EVALS:
+            return # expressions count towards their statement
+        stmt  = gen.gi_frame.f_locals["self"]
+        if self.fuel is not None and frames and isinstance(frames[-1].entry.stmt, WhileStmt):
+            self.fuel.tick(frames[-1].entry.stmt.loc) # stmt is the body
+        entry = self.entries.get(id(stmt))
+        if entry is None:
+            path  = frames[-1].entry.path if frames else stmt.loc.src.name
+            entry = self.entries[id(stmt)] = Entry(stmt, f"{path};{type(stmt).__name__}@{stmt.loc.src.pos(stmt.loc.begin)}")
+        frames.append(Frame(gen, entry, clock()))
+
+    def leave(self, frames, clock):
+        frame = frames.pop()
+        secs  = clock() - frame.start
+        own   = secs - frame.nested
+        frame.entry.count += 1
+        frame.entry.secs  += secs
+        frame.entry.own   += own
+        self.stacks[frame.entry.path] += own
+        if frames:
+            frames[-1].nested += secs
+
+    # reports
+
+    def iterations(self, stmt):
+        entry = self.entries.get(id(stmt.body))
+        return entry.count if entry is not None else 0
+
+    def hottest(self, num):
+        """
+        Returns the num statements with the highest cumulative time, leaving out StmtLists, which mirror their parent.
+        """
+        entries = [entry for entry in self.entries.values() if not isinstance(entry.stmt, StmtList)]
+        return sorted(entries, key=lambda entry: entry.secs, reverse=True)[:num]
+
+    def report(self, num = 10):
+        lines = [f"{'time':>10} {'%':>6} {'self':>10} {'count':>10} {'iterations':>10}  statement"]
+        for entry in self.hottest(num):
+            stmt  = entry.stmt
+            iters = str(self.iterations(stmt)) if isinstance(stmt, WhileStmt) else ""
+            kind  = "if" if isinstance(stmt, IfStmt) else "while" if isinstance(stmt, WhileStmt) else "stmt"
+            share = 100 * entry.secs / self.total if self.total else 0.0
+            lines.append(f"{entry.secs:>9.4f}s {share:>5.1f}% {entry.own:>9.4f}s {entry.count:>10} {iters:>10}  "
+                         f"{stmt.loc} ({kind})")
+        return "\n".join(lines) + "\n"
+
+    def collapsed(self):
+        return "".join(f"{path} {round(secs * 1e6)}\n" for path, secs in self.stacks.items())
@@ -0,0 +1,47 @@
+"""
+Runs the output of the Python backend in-process.
+
+The compiled code objects are cached on disk in marshal format, keyed by the source text, the optimization level and the compiler version,
+so a repeated run of the same program skips the whole front end and the code generation.
+With fueled, the code counts the steps of its loops with the fuel.Fuel passed to run; see fuel.py.
+"""
+
+import io
+import marshal
+import sys
+
+from cache import Cache
+from while_ast import Emit, Emitter
+
+def compile_prog(node, filename, fueled = False):
+    """
+    Compiles the Python output of node, a Prog or an ir.Func.
+    Gives up via sys.exit if Python cannot compile it: its parser and compiler limit the nesting of blocks, parentheses
+    and expressions.
+    """
+    sink = io.StringIO()
+    out  = Emitter(sink, Emit.PY)
+    out.fuel = fueled
+    node.emit(out)
+    try:
+        return compile(sink.getvalue(), filename, "exec")
+    except (SyntaxError, RecursionError, MemoryError) as error: # MemoryError: a stack of the parser or compiler overflowed
+        reason = error.msg if isinstance(error, SyntaxError) else str(error) or type(error).__name__
+        sys.exit(f"error: {filename}: Python cannot compile the output of the Python backend ({reason}); "
+                 "try --eval=vm")
+
+def load(text, opt, fueled = False):
+    cache = Cache("py")
+    if (data := cache.get(cache.key(text, opt, fueled))) is not None:
+        try:
+            return marshal.loads(data)
+        except (EOFError, ValueError, TypeError):
+            pass # corrupt entry; it will be overwritten
+    return None
+
+def store(text, opt, code, fueled = False):
+    cache = Cache("py")
+    cache.put(cache.key(text, opt, fueled), marshal.dumps(code))
+
+def run(code, fuel = None):
+    exec(code, {"__name__": "__main__", "fuel": fuel}) # pylint: disable=exec-used
@@ -0,0 +1,383 @@
+"""
+-O1: replaces counting loops by closed forms of the values they compute (scalar evolution).
+
+A loop qualifies if its body only declares and assigns int variables with polynomials (+, -, *) and
+    * every variable it assigns is an accumulator v = v + e, where e only reads accumulators solved before v,
+      or is derived, i.e. not read before it is assigned in the body,
+    * its condition compares a polynomial that grows by a nonzero constant per iteration against zero, e.g. i < n,
+      so the trip count k is known: as a number if the values at entry are constant, as a polynomial if the step is 1.
+Values are polynomials in the iteration j with exact rational coefficients; an accumulator sums its increments by
+Faulhaber's formulas. The final values at j = k replace the loop, guarded by its condition unless k is a number:
+    while i < n { s = s + 2 * i; i = i + 1; }  =>  if i < n { s = s + n * n - n - i * i + i; i = n; }
+While has no division, so a closed form must have integer coefficients, which rules out e.g. s = s + i for a symbolic
+trip count; with constant values at entry, every coefficient is a number and the closed form a literal.
+Loops the analysis cannot prove to terminate like this are left alone. See also ir.strength_reduce for -O2.
+"""
+
+from fractions import Fraction
+from math import comb
+
+from tok import Tag
+from while_ast import DeclStmt, AssignStmt, StmtList, IfStmt, WhileStmt, BinExpr, UnaryExpr, LitExpr, SymExpr, run
+
+MAX_TERMS  = 64 # of any polynomial; larger ones are not worth it
+MAX_DEGREE = 4  # of the values in the iteration
+
+ITER = ("j", 0) # atom of the iteration; the others are ("s", id(DeclStmt)) for the value of a variable at the start of
+                # an iteration and ("e", id(DeclStmt)) for its value when the loop is entered
+
+class Unsolvable(Exception):
+    """
+    Raised when a loop or expression has no closed form this pass can express.
+    """
+
+# Polynomials map monomials, sorted tuples of (atom, exponent), to nonzero Fractions.
+
+def constant(val):
+    return {(): Fraction(val)} if val else {}
+
+def atom(key):
+    return {((key, 1),): Fraction(1)}
+
+def add(p, q, sign = 1):
+    res = dict(p)
+    for mono, coef in q.items():
+        coef = res.get(mono, 0) + sign * coef
+        if coef:
+            res[mono] = coef
+        else:
+            del res[mono]
+    return res
+
+def mul(p, q):
+    res = {}
+    for mono_p, coef_p in p.items():
+        for mono_q, coef_q in q.items():
+            exps = dict(mono_p)
+            for key, exp in mono_q:
+                exps[key] = exps.get(key, 0) + exp
+            mono = tuple(sorted(exps.items()))
+            coef = res.get(mono, 0) + coef_p * coef_q
+            if coef:
+                res[mono] = coef
+            else:
+                del res[mono]
+    if len(res) > MAX_TERMS:
+        raise Unsolvable
+    return res
+
+def atoms(p):
+    return {key for mono in p for key, _ in mono}
+
+def split(p, key):
+    """
+    Returns the polynomials c such that p is the sum of c[e] * key^e.
+    """
+    parts = []
+    for mono, coef in p.items():
+        exp = dict(mono).get(key, 0)
+        parts += [{} for _ in range(exp + 1 - len(parts))]
+        parts[exp][tuple((other, num) for other, num in mono if other != key)] = coef
+    return parts
+
+def subst(p, key, q):
+    res, power = {}, constant(1)
+    for part in split(p, key):
+        res   = add(res, mul(part, power))
+        power = mul(power, q)
+    return res
+
+def power_sums(degree):
+    """
+    Returns, for each e up to degree, the polynomial in ITER of the sum of t^e for t from 0 to ITER - 1.
+    """
+    sums = []
+    for exp in range(degree + 1):
+        # ITER^(exp+1) is the sum of (t+1)^(exp+1) - t^(exp+1), which expands into the sums of lower powers
+        res = {((ITER, exp + 1),): Fraction(1)}
+        for lower in range(exp):
+            res = add(res, mul(constant(comb(exp + 1, lower)), sums[lower]), -1)
+        sums.append(mul(res, constant(Fraction(1, exp + 1))))
+    return sums
+
+def summed(p):
+    """
+    Returns the polynomial of the sum of p over the iterations before ITER.
+    """
+    parts = split(p, ITER)
+    if len(parts) > MAX_DEGREE:
+        raise Unsolvable
+    res = {}
+    for part, power_sum in zip(parts, power_sums(len(parts) - 1)):
+        res = add(res, mul(part, power_sum))
+    return res
+
+def poly(expr, lookup):
+    """
+    Generator that returns expr as polynomial, with lookup(decl) giving those of variables.
+    """
+    if isinstance(expr, LitExpr):
+        return constant(expr.val)
+    if isinstance(expr, SymExpr):
+        return lookup(expr.decl)
+    if isinstance(expr, UnaryExpr) and expr.op in (Tag.T_ADD, Tag.T_SUB):
+        rhs = yield poly(expr.rhs, lookup)
+        return rhs if expr.op is Tag.T_ADD else add({}, rhs, -1)
+    if isinstance(expr, BinExpr) and expr.op in (Tag.T_ADD, Tag.T_SUB, Tag.T_MUL):
+        lhs = yield poly(expr.lhs, lookup)
+        rhs = yield poly(expr.rhs, lookup)
+        return mul(lhs, rhs) if expr.op is Tag.T_MUL else add(lhs, rhs, 1 if expr.op is Tag.T_ADD else -1)
+    raise Unsolvable
+
+def starts_replaced(p, closed):
+    """
+    Replaces the values at the start of an iteration in p by their polynomials in ITER.
+    """
+    for kind, key in atoms(p):
+        if kind == "s":
+            if key not in closed:
+                raise Unsolvable
+            p = subst(p, (kind, key), closed[key])
+    return p
+
+def solve(iteration, entries):
+    """
+    Given the values of the assigned variables after an iteration, in terms of those at its start, returns the values
+    of the accumulators at the start of iteration ITER and those of the derived variables after it.
+    """
+    closed, derived, pending = {}, {}, dict(iteration)
+    while pending:
+        ready = [key for key, p in pending.items() if {key2 for kind, key2 in atoms(p) if kind == "s"} <= {key, *closed}]
+        if not ready:
+            raise Unsolvable
+        for key in ready:
+            p = pending.pop(key)
+            if ("s", key) not in atoms(p):
+                derived[key] = p
+                continue
+            step = add(p, atom(("s", key)), -1)
+            if ("s", key) in atoms(step):
+                raise Unsolvable # not v = v + e
+            closed[key] = add(entries[key], summed(starts_replaced(step, closed)))
+    return closed, {key: starts_replaced(p, closed) for key, p in derived.items()}
+
+def trips(diff, op):
+    """
+    Returns the trip count of a loop whose condition is diff op 0, with diff a polynomial in ITER at the start of an
+    iteration, and whether it only holds if the condition holds on entry.
+    """
+    parts = split(diff, ITER)
+    if len(parts) != 2 or atoms(parts[1]) or op not in (Tag.T_LT, Tag.T_LE, Tag.T_GT, Tag.T_GE, Tag.T_NE):
+        raise Unsolvable
+    start, step = parts[0], parts[1][()]
+    if op in (Tag.T_GT, Tag.T_GE):
+        start, step, op = add({}, start, -1), -step, Tag.T_LT if op is Tag.T_GT else Tag.T_LE
+    if not atoms(start):
+        val = start.get((), Fraction(0))
+        if op is Tag.T_NE:
+            num = -val / step
+            if num.denominator != 1 or num < 0:
+                raise Unsolvable
+        elif val > 0 or (val == 0 and op is Tag.T_LT):
+            num = 0
+        elif step < 0:
+            raise Unsolvable # runs forever
+        else: # the first j with val + step * j >= 0 or > 0
+            num = -(val // step) if op is Tag.T_LT else -val // step + 1
+        return constant(num), False
+    if step != 1 or op is Tag.T_NE:
+        raise Unsolvable
+    return add(constant(op is Tag.T_LE), start, -1), True
+
+class Closer:
+    """
+    Replaces the loops of a checked Prog that have closed forms; loops nested in others are tried first.
+    The values of inputs, DeclStmts whose initializers may be replaced, are never taken as constant.
+    """
+    def __init__(self, inputs = ()):
+        self.writes = {} # id(WhileStmt) -> ids of the DeclStmts assigned in it
+        self.inputs = {id(decl) for decl in inputs}
+        self.closed = 0
+
+    def prog(self, prog):
+        run(self.collect(prog.stmt))
+        run(self.stmt_list(prog.stmt, {}))
+        return self.closed
+
+    def collect(self, stmt):
+        if isinstance(stmt, AssignStmt):
+            return {id(stmt.decl)}
+        res = set()
+        if isinstance(stmt, StmtList):
+            for inner in stmt.stmts:
+                res |= yield self.collect(inner)
+        elif isinstance(stmt, IfStmt):
+            res = (yield self.collect(stmt.cons)) | (yield self.collect(stmt.alt))
+        elif isinstance(stmt, WhileStmt):
+            res = self.writes[id(stmt)] = yield self.collect(stmt.body)
+        return res
+
+    def stmt_list(self, stmt_list, known):
+        """
+        known maps the ids of the int variables whose values are constant to those; returns the ids of the assigned.
+        """
+        stmts, assigned = [], set()
+        for stmt in stmt_list.stmts:
+            stmts += yield self.stmt(stmt, known, assigned)
+        stmt_list.stmts = stmts
+        return assigned
+
+    def stmt(self, stmt, known, assigned):
+        """
+        Returns the statements that replace stmt.
+        """
+        if isinstance(stmt, (DeclStmt, AssignStmt)):
+            decl = stmt if isinstance(stmt, DeclStmt) else stmt.decl
+            if isinstance(stmt, AssignStmt):
+                assigned.add(id(decl))
+            val = value(stmt.init, known) if decl.ty is Tag.K_INT and id(stmt) not in self.inputs else None
+            if val is None:
+                known.pop(id(decl), None)
+            else:
+                known[id(decl)] = val
+            return [stmt]
+        if isinstance(stmt, StmtList):
+            assigned |= yield self.stmt_list(stmt, known)
+            return [stmt]
+        if isinstance(stmt, IfStmt):
+            writes = (yield self.stmt_list(stmt.cons, dict(known))) | (yield self.stmt_list(stmt.alt, dict(known)))
+            res    = None
+        else:
+            writes = self.writes[id(stmt)]
+            yield self.stmt_list(stmt.body, {key: val for key, val in known.items() if key not in writes})
+            res    = close(stmt, known)
+        for key in writes:
+            known.pop(key, None)
+        assigned |= writes
+        if res is None:
+            return [stmt]
+        self.closed += 1
+        for new in res: # the closed form may make values constant again
+            yield self.stmt(new, known, assigned)
+        return res
+
+def value(expr, known):
+    """
+    Returns the value of the int expression expr if known makes it constant, or None.
+    """
+    def lookup(decl):
+        val = known.get(id(decl))
+        if val is None:
+            raise Unsolvable
+        return constant(val)
+    try:
+        res = run(poly(expr, lookup))
+    except Unsolvable:
+        return None
+    return int(res.get((), 0)) if not res or list(res) == [()] else None
+
+class Recurrence:
+    """
+    The values of the variables a loop assigns, in terms of the iteration and the values at entry.
+    """
+    def __init__(self, loop, known):
+        body         = loop.body.stmts
+        temps        = {id(stmt) for stmt in body if isinstance(stmt, DeclStmt)}
+        self.known   = known
+        self.carried = {id(stmt.decl): stmt.decl for stmt in body
+                        if isinstance(stmt, AssignStmt) and id(stmt.decl) not in temps}
+        self.decls   = dict(self.carried) # id(DeclStmt) -> DeclStmt, for all the atoms
+        self.sym     = {}                 # id(DeclStmt) -> value so far in the iteration
+
+    def lookup(self, decl):
+        key = id(decl)
+        self.decls[key] = decl
+        if key in self.sym:     return self.sym[key]
+        if key in self.carried: return atom(("s", key))
+        if key in self.known:   return constant(self.known[key])
+        return atom(("e", key))
+
+    def finals(self, loop):
+        """
+        Returns the values of the assigned variables after loop and whether they only hold if it runs at all.
+        """
+        for stmt in loop.body.stmts:
+            decl = stmt if isinstance(stmt, DeclStmt) else stmt.decl
+            if decl.ty is not Tag.K_INT:
+                raise Unsolvable
+            self.sym[id(decl)] = run(poly(stmt.init, self.lookup))
+        entries = {key: constant(self.known[key]) if key in self.known else atom(("e", key)) for key in self.carried}
+        closed, derived = solve({key: self.sym[key] for key in self.carried}, entries)
+
+        cond = loop.cond
+        if not isinstance(cond, BinExpr):
+            raise Unsolvable
+        self.sym.clear()
+        diff = add(run(poly(cond.lhs, self.lookup)), run(poly(cond.rhs, self.lookup)), -1)
+        num, guarded = trips(starts_replaced(diff, closed), cond.op)
+        if not num:
+            return {}, False # the loop never runs
+        last = add(num, constant(1), -1)
+        return {key: subst(closed[key], ITER, num) if key in closed else subst(derived[key], ITER, last)
+                for key in self.carried}, guarded
+
+def close(loop, known):
+    """
+    Returns the statements that replace loop, or None if it has no closed form.
+    """
+    if not all(isinstance(stmt, (DeclStmt, AssignStmt)) for stmt in loop.body.stmts):
+        return None
+    rec = Recurrence(loop, known)
+    try:
+        finals, guarded = rec.finals(loop)
+        stmts = []
+        for key in ordered(finals):
+            stmts.append(AssignStmt(loop.loc, rec.carried[key].sym, expression(finals[key], rec.decls, loop.loc)))
+            stmts[-1].decl = rec.carried[key]
+    except Unsolvable:
+        return None
+    if guarded:
+        return [IfStmt(loop.loc, loop.cond, StmtList(loop.loc, stmts), StmtList(loop.loc, []))]
+    return stmts
+
+def ordered(finals):
+    """
+    Orders the assignments of the final values such that none overwrites a value at entry that a later one reads.
+    """
+    order, pending = [], dict(finals)
+    while pending:
+        users = {key for owner, p in pending.items() for kind, key in atoms(p) if kind == "e" and key != owner}
+        ready = [key for key in pending if key not in users]
+        if not ready:
+            raise Unsolvable
+        for key in ready:
+            del pending[key]
+        order += ready
+    return order
+
+def expression(p, decls, loc):
+    """
+    Builds an Expr of p, whose atoms are values at entry of decls.
+    """
+    res = None
+    def sort_key(mono):
+        return (not mono, [(decls[key].loc.begin, exp) for (_, key), exp in mono])
+    for mono in sorted(p, key=sort_key):
+        coef = p[mono]
+        if coef.denominator != 1:
+            raise Unsolvable
+        term = None
+        for (_, key), exp in mono:
+            for _ in range(exp):
+                sym = SymExpr(loc, decls[key].sym)
+                sym.decl = decls[key]
+                term = sym if term is None else BinExpr(loc, term, Tag.T_MUL, sym)
+        if term is None:
+            term = LitExpr(loc, abs(int(coef)))
+        elif abs(coef) != 1:
+            term = BinExpr(loc, LitExpr(loc, abs(int(coef))), Tag.T_MUL, term)
+        if res is None:
+            res = term if coef > 0 else UnaryExpr(loc, Tag.T_SUB, term)
+        else:
+            res = BinExpr(loc, res, Tag.T_ADD if coef > 0 else Tag.T_SUB, term)
+    return LitExpr(loc, 0) if res is None else res
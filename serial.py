@@ -0,0 +1,223 @@
+"""
+Compact binary format of checked ASTs, which lets repeated runs on the same source skip Lexer, Parser and Sema.
+
+A Prog is written in postorder as a flat array of 32-bit integers, so load rebuilds it with a stack instead of recursion.
+Identifiers and literals live in tables of their own. Every node starts with its kind and its Loc as offset and length:
+    LIT     literal
+    BOOL    value
+    SYM     identifier, declaration or -1
+    BIN     operator                                          after lhs and rhs
+    UNARY   operator                                          after rhs
+    ERR
+    DECL    type, identifier, offset and length of it, slot   after init
+    ASSIGN  identifier, offset and length of it, declaration  after init
+    LIST    number of statements                              after them
+    IF                                                        after cond, cons and alt
+    WHILE                                                     after cond and body
+    PROG    number of slots                                   after stmt and ret
+Declarations are numbered in postorder, which is also the order in which the Parser creates them;
+so they get the same DeclStmt.counter as when parsing, and a reference always follows its declaration.
+The cached entries are keyed by the source text and the compiler version; see cache.py.
+"""
+
+import gc
+import struct
+import sys
+from array import array
+
+from cache import Cache
+from loc import Loc, Source
+from opt import nodes
+from tok import Tag, Tok
+from while_ast import Prog,                                 \
+    DeclStmt, AssignStmt, StmtList, IfStmt, WhileStmt,      \
+    BinExpr, UnaryExpr, BoolExpr, LitExpr, SymExpr, ErrExpr
+
+MAGIC   = b"WAST"
+VERSION = 2
+HEADER  = struct.Struct("<4sHIIII") # magic, version, number of tokens, sizes of identifiers, literals and integers
+
+LIT, BOOL, SYM, BIN, UNARY, ERR, DECL, ASSIGN, LIST, IF, WHILE, PROG = range(12)
+
+KINDS = {LitExpr: LIT, BoolExpr: BOOL, SymExpr: SYM, BinExpr: BIN, UnaryExpr: UNARY, ErrExpr: ERR,
+         DeclStmt: DECL, AssignStmt: ASSIGN, StmtList: LIST, IfStmt: IF, WhileStmt: WHILE, Prog: PROG}
+TAGS  = {0: None, **{tag.value: tag for tag in Tag}} # types and operators
+
+def code(tag):
+    return 0 if tag is None else tag.value
+
+def dump(prog, num_toks):
+    """
+    Serializes the checked prog; num_toks is kept for --stats.
+    """
+    ints  = array("i")
+    names = {} # identifier -> index
+    lits  = {} # literal -> index
+    decls = {} # id(DeclStmt) -> index
+    for node in reversed(list(nodes(prog))): # postorder
+        kind = KINDS[type(node)]
+        ints.extend((kind, node.loc.begin, node.loc.finis - node.loc.begin))
+        if kind == LIT:
+            ints.append(lits.setdefault(node.val, len(lits)))
+        elif kind == BOOL:
+            ints.append(int(node.val))
+        elif kind == SYM:
+            ints.extend((names.setdefault(node.sym.sym, len(names)), decls.get(id(node.decl), -1)))
+        elif kind in (BIN, UNARY):
+            ints.append(code(node.op))
+        elif kind == DECL:
+            decls[id(node)] = len(decls)
+            sym = node.sym
+            ints.extend((code(node.ty), names.setdefault(sym.sym, len(names)), sym.loc.begin, sym.loc.finis - sym.loc.begin,
+                         -1 if node.slot is None else node.slot))
+        elif kind == ASSIGN:
+            sym = node.sym
+            ints.extend((names.setdefault(sym.sym, len(names)), sym.loc.begin, sym.loc.finis - sym.loc.begin,
+                         decls.get(id(node.decl), -1)))
+        elif kind == LIST:
+            ints.append(len(node.stmts))
+        elif kind == PROG:
+            ints.append(node.num_slots)
+
+    if sys.byteorder == "big":
+        ints.byteswap()
+    name_bytes = "\n".join(names).encode("ASCII")
+    lit_bytes  = "\n".join(map(str, lits)).encode("ASCII")
+    return HEADER.pack(MAGIC, VERSION, num_toks, len(name_bytes), len(lit_bytes), len(ints)) \
+        + name_bytes + lit_bytes + ints.tobytes()
+
+def load(data, src):
+    """
+    Rebuilds the Prog dumped into data with Locs into src; returns it along with its number of tokens.
+    Raises ValueError if data is not in this format.
+    """
+    magic, version, num_toks, name_size, lit_size, num_ints = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("not a serialized AST of this version")
+    offset = HEADER.size
+    names  = [sys.intern(name) for name in data[offset:offset + name_size].decode("ASCII").split("\n")]
+    offset += name_size
+    lits   = [int(lit) for lit in data[offset:offset + lit_size].decode("ASCII").split("\n")] if lit_size else []
+    offset += lit_size
+    ints   = array("i", data[offset:])
+    if len(ints) != num_ints:
+        raise ValueError("truncated serialized AST")
+    if sys.byteorder == "big":
+        ints.byteswap()
+
+    enabled = gc.isenabled()
+    gc.disable() # the tree has no cycles, but collections triggered while it grows would scan it over and over
+    try:
+        return Loader(ints.tolist(), names, lits, src).build(), num_toks
+    finally:
+        if enabled:
+            gc.enable()
+
+class Loader:
+    """
+    Rebuilds the nodes in the order of the integers; each method builds one node from the integers at i, pushes it
+    and returns where the next node starts.
+    """
+    def __init__(self, ints, names, lits, src):
+        self.ints  = ints
+        self.names = names
+        self.lits  = lits
+        self.src   = src
+        self.stack = []
+        self.decls = []
+
+    def build(self):
+        kinds = (self.lit, self.bool, self.sym, self.bin, self.unary, self.err,
+                 self.decl, self.assign, self.list, self.if_, self.while_, self.prog)
+        ints, num_ints, i = self.ints, len(self.ints), 0
+        while i < num_ints:
+            i = kinds[ints[i]](i)
+        if len(self.stack) != 1 or not isinstance(self.stack[0], Prog):
+            raise ValueError("malformed serialized AST")
+        return self.stack[0]
+
+    def loc(self, i):
+        return Loc(self.src, self.ints[i], self.ints[i] + self.ints[i + 1])
+
+    def lit(self, i):
+        self.stack.append(LitExpr(self.loc(i + 1), self.lits[self.ints[i + 3]]))
+        return i + 4
+
+    def bool(self, i):
+        self.stack.append(BoolExpr(self.loc(i + 1), bool(self.ints[i + 3])))
+        return i + 4
+
+    def sym(self, i):
+        loc  = self.loc(i + 1)
+        node = SymExpr(loc, Tok(loc, self.names[self.ints[i + 3]]))
+        node.decl = self.decls[self.ints[i + 4]] if self.ints[i + 4] >= 0 else None
+        self.stack.append(node)
+        return i + 5
+
+    def bin(self, i):
+        rhs = self.stack.pop()
+        self.stack.append(BinExpr(self.loc(i + 1), self.stack.pop(), TAGS[self.ints[i + 3]], rhs))
+        return i + 4
+
+    def unary(self, i):
+        self.stack.append(UnaryExpr(self.loc(i + 1), TAGS[self.ints[i + 3]], self.stack.pop()))
+        return i + 4
+
+    def err(self, i):
+        self.stack.append(ErrExpr(self.loc(i + 1)))
+        return i + 3
+
+    def decl(self, i):
+        node = DeclStmt(self.loc(i + 1), TAGS[self.ints[i + 3]], Tok(self.loc(i + 5), self.names[self.ints[i + 4]]),
+                        self.stack.pop())
+        node.slot    = self.ints[i + 7] if self.ints[i + 7] >= 0 else None
+        node.counter = len(self.decls)
+        self.decls.append(node)
+        self.stack.append(node)
+        return i + 8
+
+    def assign(self, i):
+        node = AssignStmt(self.loc(i + 1), Tok(self.loc(i + 4), self.names[self.ints[i + 3]]), self.stack.pop())
+        node.decl = self.decls[self.ints[i + 6]] if self.ints[i + 6] >= 0 else None
+        self.stack.append(node)
+        return i + 7
+
+    def list(self, i):
+        begin = len(self.stack) - self.ints[i + 3]
+        node  = StmtList(self.loc(i + 1), self.stack[begin:])
+        del self.stack[begin:]
+        self.stack.append(node)
+        return i + 4
+
+    def if_(self, i):
+        alt, cons = self.stack.pop(), self.stack.pop()
+        self.stack.append(IfStmt(self.loc(i + 1), self.stack.pop(), cons, alt))
+        return i + 3
+
+    def while_(self, i):
+        body = self.stack.pop()
+        self.stack.append(WhileStmt(self.loc(i + 1), self.stack.pop(), body))
+        return i + 3
+
+    def prog(self, i):
+        ret  = self.stack.pop()
+        node = Prog(self.loc(i + 1), self.stack.pop(), ret)
+        node.num_slots = self.ints[i + 3]
+        self.stack.append(node)
+        return i + 4
+
+def fetch(text, name):
+    """
+    Returns the checked Prog of text, whose file is called name, and its number of tokens from the cache, or None.
+    """
+    cache = Cache("ast")
+    if (data := cache.get(cache.key(text))) is not None:
+        try:
+            return load(data, Source(name, text))
+        except (ValueError, IndexError, KeyError, struct.error):
+            pass # corrupt entry; it will be overwritten
+    return None
+
+def store(text, prog, num_toks):
+    cache = Cache("ast")
+    cache.put(cache.key(text), dump(prog, num_toks))
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Long-lived compile/eval server; see client.py for the protocol.
+
+The server imports the compiler once and handles the requests of all connections concurrently with asyncio.
+The CPU-bound work runs in a pool of worker processes, which are forked from the server and so start with everything
+imported.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import signal
+import socket
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import closure
+import fuel
+import ir
+import pyexec
+import tier
+import vm
+from client import ACTIONS, ENGINES, socket_path
+from compiler import compile_source
+from err import Diagnostic
+from loc import Source
+from while_ast import Emit
+
+EMITS = {"emit-while": Emit.WHILE, "emit-c": Emit.C, "emit-py": Emit.PY}
+
+def evaluate(engine, prog, backend, name, limits):
+    if engine == "ast":
+        prog.eval(tier.Tiering(fuel=limits).run)
+    elif engine == "closure":
+        closure.eval_prog(prog, limits)
+    elif engine == "vm":
+        print(vm.compile_prog(prog, limits is not None).run(limits))
+    elif engine == "ir":
+        ir.eval_func(backend if isinstance(backend, ir.Func) else ir.build(prog), limits)
+    elif engine == "py":
+        pyexec.run(pyexec.compile_prog(backend, name, limits is not None), limits)
+
+def validate(request):
+    if not isinstance(request, dict) or not isinstance(request.get("source"), str):
+        raise ValueError("request must be an object with a 'source' string")
+    if not isinstance(request.get("actions"), list) or not set(request["actions"]) <= set(ACTIONS):
+        raise ValueError(f"'actions' must be a list of: {', '.join(ACTIONS)}")
+    if "eval" in request["actions"] and request.get("engine") not in ENGINES:
+        raise ValueError(f"'engine' must be one of: {', '.join(ENGINES)}")
+    if request.get("opt", 0) not in (0, 1, 2):
+        raise ValueError("'opt' must be 0, 1 or 2")
+    steps, timeout = request.get("max_steps"), request.get("timeout")
+    if steps is not None and (isinstance(steps, bool) or not isinstance(steps, int) or steps < 0):
+        raise ValueError("'max_steps' must be a non-negative integer")
+    if timeout is not None and (isinstance(timeout, bool) or not isinstance(timeout, (int, float)) or not timeout > 0):
+        raise ValueError("'timeout' must be a positive number of seconds")
+
+def handle(request):
+    """
+    Runs in a worker process: compiles the source of request and performs its actions.
+    Like while.py, -O2 hands the optimized SSA form to the backends except for the AST-based engines.
+    """
+    name     = request.get("name", "<request>")
+    emits    = [EMITS[action] for action in request["actions"] if action in EMITS]
+    result   = compile_source(request["source"], name, request.get("opt", 0), emits)
+    response = {"status": 0, "diagnostics": [str(diag) for diag in result.diagnostics], "outputs": {}}
+    if result.errors != 0:
+        return {**response, "status": 1, "errors": result.errors}
+
+    outputs = response["outputs"]
+    limits  = fuel.limits(request.get("max_steps"), request.get("timeout"))
+    for action in request["actions"]:
+        if action == "eval":
+            out = io.StringIO()
+            try:
+                with contextlib.redirect_stdout(out):
+                    evaluate(request["engine"], result.prog, result.backend, name, limits)
+            except fuel.Exhausted as error: # reported like while.py, without "aborting due to"
+                response["diagnostics"].append(str(Diagnostic("error", error.loc(Source(name, request["source"])), error.msg)))
+                return {**response, "status": 1}
+            except SystemExit as stop: # pyexec gives up via sys.exit, like the backends of while.py
+                response["diagnostics"].append(str(stop.code))
+                return {**response, "status": 1}
+            outputs["eval"] = out.getvalue()
+        elif action in EMITS:
+            outputs[action] = result.outputs[EMITS[action]]
+    return response
+
+class Server:
+    def __init__(self, pool):
+        self.pool = pool
+
+    async def connection(self, reader, writer):
+        lock  = asyncio.Lock() # responses are written whole, one at a time
+        tasks = []
+        while line := await reader.readline():
+            tasks.append(asyncio.create_task(self.respond(line, writer, lock)))
+        await asyncio.gather(*tasks)
+        writer.close()
+        await writer.wait_closed()
+
+    async def respond(self, line, writer, lock):
+        request = None
+        try:
+            request = json.loads(line)
+            validate(request)
+            response = await asyncio.get_running_loop().run_in_executor(self.pool, handle, request)
+        except ValueError as error:
+            response = {"status": 1, "error": f"bad request: {error}"}
+        except Exception as error: # pylint: disable=broad-exception-caught
+            response = {"status": 1, "error": f"internal error: {error!r}"}
+        response["id"] = request.get("id") if isinstance(request, dict) else None
+
+        async with lock:
+            writer.write(json.dumps(response).encode() + b"\n")
+            try:
+                await writer.drain()
+            except ConnectionError:
+                pass # the client is gone
+
+def remove_stale(path):
+    """
+    Removes the socket at path unless a server is listening on it.
+    """
+    if not os.path.exists(path):
+        return
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(path)
+        except OSError:
+            os.unlink(path)
+            return
+    sys.exit(f"error: a server is already listening on '{path}'")
+
+async def serve(path, jobs):
+    remove_stale(path)
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        pool.submit(int).result() # fork the workers now, while the server is still idle
+        server = await asyncio.start_unix_server(Server(pool).connection, path, limit=2**30)
+        loop   = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, server.close)
+        print(f"listening on {path}", file=sys.stderr)
+        try:
+            async with server:
+                await server.wait_closed()
+        finally:
+            with contextlib.suppress(FileNotFoundError):
+                os.unlink(path)
+
+def main():
+    cli = argparse.ArgumentParser(description="Compile/eval server for the While language.")
+    cli.add_argument("--socket", action="store", metavar="path", default=socket_path(), dest="socket", help="socket to listen on (default: %(default)s)")
+    cli.add_argument("-j", "--jobs", type=int, default=os.cpu_count(), metavar="N", dest="jobs", help="number of worker processes (default: %(default)s)")
+    args = cli.parse_args()
+    asyncio.run(serve(args.socket, args.jobs))
+
+if __name__ == "__main__":
+    main()
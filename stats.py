@@ -0,0 +1,80 @@
+"""
+Collects what the driver spends per phase - wall time, CPU time and, with memory tracing, the peak of memory allocated
+by Python - and counts about the program, and reports them as text or JSON.
+"""
+
+import json
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+
+import opt
+from arena import Arena
+
+class Stats:
+    def __init__(self, file, trace_memory):
+        self.file         = file
+        self.trace_memory = trace_memory
+        self.phases       = {} # name -> {"wall": s, "cpu": s[, "peak_bytes": n]}
+        self.counts       = {}
+        if trace_memory:
+            tracemalloc.start()
+
+    @contextmanager
+    def phase(self, name):
+        """
+        Measures the body of the with statement; phases run several times, like emission, add up.
+        peak_bytes is the peak above the memory in use when the phase started. Python 3.8 lacks tracemalloc.reset_peak,
+        so tracing starts over instead and forgets the blocks allocated before.
+        """
+        if self.trace_memory:
+            if hasattr(tracemalloc, "reset_peak"):
+                tracemalloc.reset_peak()
+            else:
+                tracemalloc.stop()
+                tracemalloc.start()
+            base = tracemalloc.get_traced_memory()[0]
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            res = self.phases.setdefault(name, {"wall": 0.0, "cpu": 0.0})
+            res["wall"] += time.perf_counter() - wall
+            res["cpu"]  += time.process_time() - cpu
+            if self.trace_memory:
+                peak = max(tracemalloc.get_traced_memory()[1] - base, 0) # base may predate a restart of a nested phase
+                res["peak_bytes"] = max(res.get("peak_bytes", 0), peak)
+
+    def count_prog(self, num_toks, prog):
+        classes = prog.classes() if isinstance(prog, Arena) else Counter(type(node).__name__ for node in opt.nodes(prog))
+        self.counts["tokens"] = num_toks
+        self.counts["nodes"]  = dict(sorted(classes.items()))
+        self.counts["decls"]  = classes["DeclStmt"]
+
+    def to_dict(self):
+        return {
+            "file"  : self.file,
+            "phases": self.phases,
+            "total" : {key: sum(phase[key] for phase in self.phases.values()) for key in ("wall", "cpu")},
+            "counts": self.counts,
+        }
+
+    def to_text(self):
+        res    = self.to_dict()
+        mem    = "  peak memory" if self.trace_memory else ""
+        lines  = [f"===== {self.file} =====", f"{'phase':<16} {'wall':>10} {'cpu':>10}{mem}"]
+        for name, phase in [*res["phases"].items(), ("total", res["total"])]:
+            line = f"{name:<16} {phase['wall']:>9.4f}s {phase['cpu']:>9.4f}s"
+            if "peak_bytes" in phase:
+                line += f" {phase['peak_bytes'] / 2**10:>10.1f} KiB"
+            lines.append(line)
+        for name, num in res["counts"].items():
+            if isinstance(num, dict):
+                lines.append(f"{name}: " + ", ".join(f"{key} {val}" for key, val in num.items()))
+            else:
+                lines.append(f"{name}: {num}")
+        return "\n".join(lines) + "\n"
+
+    def format(self, fmt):
+        return json.dumps(self.to_dict(), indent=2) + "\n" if fmt == "json" else self.to_text()
@@ -0,0 +1,141 @@
+"""
+Tiered execution for the AST interpreter.
+
+Tiering.run replaces while_ast.run as the driver of Prog.eval, like prof.Profiler.run, and counts the iterations of every
+WhileStmt - the executions of its body. Once a loop has run THRESHOLD iterations, the driver drops the loop's generator
+when it next asks for its condition and calls a Python function compiled from the loop by the Python backend instead. That function loads the variables declared outside of the loop from the environment into locals, runs
+the whole loop and stores the variables it assigns back. Later entries of the loop call the function right away.
+Expressions have no side effects, so abandoning the loop before its condition leaves nothing half done.
+A loop nested too deeply for the parser or compiler of Python stays in the tree walker.
+With a fuel.Fuel, the driver counts the steps of the loops it runs itself and the compiled loops count their own.
+"""
+
+import io
+from types import GeneratorType
+
+from fuel import Exhausted
+from loc import Loc
+from opt import nodes
+from while_ast import DeclStmt, AssignStmt, SymExpr, StmtList, WhileStmt, Emit, Emitter, name, run
+
+THRESHOLD = 1000 # iterations in the tree walker before a loop is compiled
+
+WHILE_EVAL = WhileStmt.eval.__code__
+LIST_EVAL  = StmtList.eval.__code__
+
+def compile_loop(loop, fuel = None):
+    """
+    Returns a function that runs loop on an environment, along with its Python source.
+    """
+    inner  = {id(node) for node in nodes(loop) if isinstance(node, DeclStmt)}
+    outer  = {} # id(DeclStmt) -> DeclStmt, for the declarations the loop uses but does not contain
+    stored = {}
+    for node in nodes(loop):
+        if isinstance(node, (SymExpr, AssignStmt)) and node.decl is not None and id(node.decl) not in inner:
+            outer[id(node.decl)] = node.decl
+            if isinstance(node, AssignStmt):
+                stored[id(node.decl)] = node.decl
+
+    sink = io.StringIO()
+    out  = Emitter(sink, Emit.PY)
+    out.fuel = fuel is not None
+    out.write("def loop(env):\n")
+    out.indent()
+    out.py_prologue()
+    for decl in outer.values():
+        out.write(f"{out.ind}{name(Emit.PY, decl)} = env[{decl.slot}]\n")
+    out.write(out.ind)
+    run(loop.emit(out))
+    out.write("\n")
+    for decl in stored.values():
+        out.write(f"{out.ind}env[{decl.slot}] = {name(Emit.PY, decl)}\n")
+    if out.fuel:
+        out.write(f"{out.ind}fuel.steps = fuel_steps\n") # the tree walker goes on counting
+
+    source    = sink.getvalue()
+    namespace = {"fuel": fuel}
+    exec(compile(source, f"<loop at {loop.loc}>", "exec"), namespace) # pylint: disable=exec-used
+    return namespace["loop"], source
+
+class Tiering:
+    def __init__(self, threshold = THRESHOLD, fuel = None):
+        self.threshold = threshold
+        self.fuel      = fuel
+        self.counts    = {} # id(WhileStmt) -> iterations in the tree walker
+        self.funcs     = {} # id(WhileStmt) -> compiled loop
+        self.promoted  = {} # id(WhileStmt) -> [WhileStmt, number of calls of its compiled loop]
+        self.kept      = set() # id(WhileStmt) of the loops Python cannot compile
+
+    def run(self, gen):
+        """
+        Drives gen like while_ast.run while counting loop iterations and handing hot loops over to compiled code.
+        """
+        if type(gen) is not GeneratorType: # pylint: disable=unidiomatic-typecheck
+            return gen
+
+        stack = [gen]
+        loops = [] # (id(WhileStmt), environment) for each loop generator on stack
+        val   = None
+        while stack:
+            try:
+                res = stack[-1].send(val)
+            except StopIteration as stop:
+                if stack.pop().gi_code is WHILE_EVAL:
+                    loops.pop()
+                val = stop.value
+                continue
+
+            if stack[-1].gi_code is WHILE_EVAL: # res is the condition or the body of the innermost loop
+                key, env = loops[-1]
+                if getattr(res, "gi_code", None) is LIST_EVAL:
+                    self.counts[key] = self.counts.get(key, 0) + 1
+                    if self.fuel is not None:
+                        self.fuel.steps -= 1
+                        if self.fuel.steps < 0:
+                            self.fuel.refill(stack[-1].gi_frame.f_locals["self"].loc)
+                elif self.counts.get(key, 0) >= self.threshold and self.promote(key, stack[-1]):
+                    loop = stack.pop().gi_frame.f_locals["self"] # drop the condition of a hot loop and the loop
+                    loops.pop()
+                    self.call(key, loop, env)
+                    val = None
+                    continue
+            if type(res) is not GeneratorType: # pylint: disable=unidiomatic-typecheck
+                val = res
+                continue
+            val = None
+            if res.gi_code is WHILE_EVAL:
+                args = res.gi_frame.f_locals
+                key  = id(args["self"])
+                if key in self.funcs:
+                    self.call(key, args["self"], args["env"])
+                    continue
+                loops.append((key, args["env"]))
+            stack.append(res)
+        return val
+
+    def promote(self, key, gen):
+        """
+        Compiles the loop of gen unless Python cannot; returns whether it did.
+        """
+        if key in self.kept:
+            return False
+        try:
+            self.funcs[key] = compile_loop(gen.gi_frame.f_locals["self"], self.fuel)[0]
+        except (SyntaxError, RecursionError, MemoryError): # see pyexec.compile_prog
+            self.kept.add(key)
+            return False
+        return True
+
+    def call(self, key, loop, env):
+        self.promoted.setdefault(key, [loop, 0])[1] += 1
+        try:
+            self.funcs[key](env)
+        except Exhausted as error:
+            error.where = Loc(loop.loc.src, error.where, error.where) # the compiled code only knows the offset
+            raise
+
+    def report(self):
+        """
+        Returns the position of each promoted loop along with how often its compiled code ran.
+        """
+        return {str(loop.loc.src.pos(loop.loc.begin)): calls for loop, calls in self.promoted.values()}
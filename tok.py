@@ -52,6 +52,8 @@ class Tag(Enum):
         if self is self.K_TRUE:      return "true"
         if self is self.K_FALSE:     return "false"
         if self is self.K_RETURN:    return "return"
+        if self is self.K_IF:        return "if"
+        if self is self.K_ELSE:      return "else"
         if self is self.K_WHILE:     return "while"
         if self is self.M_SYM:       return "<identifier>"
         if self is self.M_LIT:       return "<literal>"
@@ -108,8 +110,10 @@ class Tag(Enum):
             or self is self.K_NOT
 
 class Tok:
+    __slots__ = ("loc", "tag", "sym", "val")
+
     def __init__(self, loc, arg):
-        self.loc = loc.copy()
+        self.loc = loc
 
         if isinstance(arg, str):
             self.tag = Tag.M_SYM
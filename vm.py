@@ -0,0 +1,327 @@
+"""
+Lowers a checked Prog to register bytecode and runs it in a dispatch loop.
+
+Every instruction consists of four words (op, a, b, c) in an array.array.
+The registers are laid out as follows:
+    [0, num_slots)                      slots assigned by Prog.check
+    [num_slots, num_slots + num_temps)  temporaries for intermediate results
+    [num_slots + num_temps, ...)        constants
+"""
+
+from array import array
+import operator
+
+from tok import Tag
+from while_ast import DeclStmt, AssignStmt, StmtList, IfStmt, WhileStmt, \
+    BinExpr, UnaryExpr, BoolExpr, LitExpr, SymExpr, run
+
+NAMES = (
+    "mov",                                              # r[a] = r[b]
+    "iadd", "isub", "imul",                             # r[a] = r[b] op r[c]
+    "band", "bor",
+    "ieq", "ine", "ilt", "ile", "igt", "ige",
+    "ineg", "bnot",                                     # r[a] = op r[b]
+    "jmp",                                              # goto a
+    "jt", "jf",                                         # if     r[b]: goto a / if not r[b]: goto a
+    "jeq", "jne", "jlt", "jle", "jgt", "jge",           # if r[b] op r[c]: goto a
+    "ret",                                              # return r[b]
+    "tick",                                             # count a step of loop a; see fuel.py
+)
+
+(MOV,
+ IADD, ISUB, IMUL,
+ BAND, BOR,
+ IEQ, INE, ILT, ILE, IGT, IGE,
+ INEG, BNOT,
+ JMP,
+ JT, JF,
+ JEQ, JNE, JLT, JLE, JGT, JGE,
+ RET,
+ TICK) = range(len(NAMES))
+
+WIDTH = 4 # words per instruction
+
+# the Python operator behind each binary op and each compare-and-jump
+FUNCS = [None] * len(NAMES)
+FUNCS[IADD]              = operator.add
+FUNCS[ISUB]              = operator.sub
+FUNCS[IMUL]              = operator.mul
+FUNCS[BAND]              = operator.and_
+FUNCS[BOR ]              = operator.or_
+FUNCS[IEQ ] = FUNCS[JEQ] = operator.eq
+FUNCS[INE ] = FUNCS[JNE] = operator.ne
+FUNCS[ILT ] = FUNCS[JLT] = operator.lt
+FUNCS[ILE ] = FUNCS[JLE] = operator.le
+FUNCS[IGT ] = FUNCS[JGT] = operator.gt
+FUNCS[IGE ] = FUNCS[JGE] = operator.ge
+
+BIN_OPS = {
+    Tag.T_ADD: IADD,
+    Tag.T_SUB: ISUB,
+    Tag.T_MUL: IMUL,
+    Tag.K_AND: BAND,
+    Tag.K_OR : BOR,
+    Tag.T_EQ : IEQ,
+    Tag.T_NE : INE,
+    Tag.T_LT : ILT,
+    Tag.T_LE : ILE,
+    Tag.T_GT : IGT,
+    Tag.T_GE : IGE,
+}
+
+JUMPS = { IEQ: JEQ, INE: JNE, ILT: JLT, ILE: JLE, IGT: JGT, IGE: JGE }
+NEGATED = { JEQ: JNE, JNE: JEQ, JLT: JGE, JLE: JGT, JGT: JLE, JGE: JLT }
+
+class Code:
+    def __init__(self, code, num_slots, num_temps, consts, locs):
+        self.code      = code
+        self.num_slots = num_slots
+        self.num_temps = num_temps
+        self.consts    = consts
+        self.locs      = locs # of the loops counted by tick
+
+    def run(self, fuel = None):
+        """
+        fuel counts the steps of the code compiled with it.
+        """
+        code  = self.code.tolist() # indexing a list is faster than an array
+        regs  = [None] * (self.num_slots + self.num_temps) + self.consts
+        pc    = 0
+        steps = 0 if fuel is None else fuel.steps # a local is faster than fuel.steps
+
+        while True:
+            op = code[pc]
+            if op == MOV:
+                regs[code[pc + 1]] = regs[code[pc + 2]]
+                pc += WIDTH
+            elif op < INEG:
+                regs[code[pc + 1]] = FUNCS[op](regs[code[pc + 2]], regs[code[pc + 3]])
+                pc += WIDTH
+            elif op == INEG:
+                regs[code[pc + 1]] = -regs[code[pc + 2]]
+                pc += WIDTH
+            elif op == BNOT:
+                regs[code[pc + 1]] = not regs[code[pc + 2]]
+                pc += WIDTH
+            elif op == JMP:
+                pc = code[pc + 1]
+            elif op < JEQ:
+                if bool(regs[code[pc + 2]]) is (op == JT):
+                    pc = code[pc + 1]
+                else:
+                    pc += WIDTH
+            elif op < RET:
+                if FUNCS[op](regs[code[pc + 2]], regs[code[pc + 3]]):
+                    pc = code[pc + 1]
+                else:
+                    pc += WIDTH
+            elif op == RET:
+                return regs[code[pc + 2]]
+            else:
+                steps -= 1
+                if steps < 0:
+                    steps = fuel.refill(self.locs[code[pc + 1]])
+                pc += WIDTH
+
+    # disassembler
+
+    def reg(self, reg):
+        if reg < self.num_slots:
+            return f"s{reg}"
+        if reg < self.num_slots + self.num_temps:
+            return f"t{reg - self.num_slots}"
+        val = self.consts[reg - self.num_slots - self.num_temps]
+        if isinstance(val, bool):
+            return "true" if val else "false"
+        return f"{val}"
+
+    def dis(self):
+        res  = f"; {self.num_slots} slot(s), {self.num_temps} temporary(s), {len(self.consts)} constant(s)\n"
+        for pc in range(0, len(self.code), WIDTH):
+            op, a, b, c = self.code[pc:pc + WIDTH]
+            if op in (MOV, INEG, BNOT):
+                args = f"{self.reg(a)}, {self.reg(b)}"
+            elif op < JMP:
+                args = f"{self.reg(a)}, {self.reg(b)}, {self.reg(c)}"
+            elif op == JMP:
+                args = f"{a:04}"
+            elif op < JEQ:
+                args = f"{a:04}, {self.reg(b)}"
+            elif op < RET:
+                args = f"{a:04}, {self.reg(b)}, {self.reg(c)}"
+            elif op == RET:
+                args = f"{self.reg(b)}"
+            else:
+                args = f"{self.locs[a].src.pos(self.locs[a].begin)}"
+            res += f"{pc:04}  {NAMES[op]:<4}  {args}\n"
+        return res
+
+class CodeGen:
+    def __init__(self, num_slots, fuel = False):
+        self.code      = array("q")
+        self.num_slots = num_slots
+        self.locs      = [] if fuel else None # of the loops that count their steps
+        self.num_temps = 0
+        self.temps     = 0  # temporaries currently in use
+        self.consts    = {} # (type, value) -> index; constants are referred to by -index - 1 until finalize
+        self.patches   = [] # positions in self.code that refer to constants
+
+    def emit(self, op, a = 0, b = 0, c = 0):
+        pc = len(self.code)
+        for i, arg in ((1, a), (2, b), (3, c)):
+            if arg < 0 and (op < JMP or i != 1):
+                self.patches.append(pc + i)
+        self.code.extend((op, a, b, c))
+        return pc
+
+    def label(self):
+        return len(self.code)
+
+    def patch(self, pc, target):
+        self.code[pc + 1] = target
+
+    def const(self, val):
+        key = (type(val), val)
+        if key not in self.consts:
+            self.consts[key] = len(self.consts)
+        return -self.consts[key] - 1
+
+    def temp(self):
+        reg = self.num_slots + self.temps
+        self.temps    += 1
+        self.num_temps = max(self.num_temps, self.temps)
+        return reg
+
+    def finalize(self):
+        base = self.num_slots + self.num_temps
+        for pc in self.patches:
+            self.code[pc] = base - self.code[pc] - 1
+        consts = [val for (_, val) in self.consts]
+        return Code(self.code, self.num_slots, self.num_temps, consts, self.locs)
+
+    # Prog
+
+    def prog(self, prog):
+        run(self.stmt(prog.stmt))
+        self.emit(RET, 0, run(self.expr(prog.ret)))
+        return self.finalize()
+
+    # Stmt - like the traversals in while_ast, these are generators driven by run
+
+    def stmt(self, stmt):
+        if isinstance(stmt, DeclStmt):
+            yield self.into(stmt.init, stmt.slot)
+        elif isinstance(stmt, AssignStmt):
+            yield self.into(stmt.init, stmt.decl.slot)
+        elif isinstance(stmt, StmtList):
+            for s in stmt.stmts:
+                yield self.stmt(s)
+        elif isinstance(stmt, IfStmt):
+            yield self.if_stmt(stmt)
+        elif isinstance(stmt, WhileStmt):
+            yield self.while_stmt(stmt)
+        else:
+            assert False
+
+    def if_stmt(self, if_stmt):
+        jumps = yield self.cond(if_stmt.cond, False)
+        yield self.stmt(if_stmt.cons)
+        if if_stmt.alt.stmts:
+            end = self.emit(JMP)
+            self.patch_all(jumps, self.label())
+            yield self.stmt(if_stmt.alt)
+            self.patch(end, self.label())
+        else:
+            self.patch_all(jumps, self.label())
+
+    def while_stmt(self, while_stmt):
+        # test the condition at the bottom: only one jump per iteration
+        head = self.emit(JMP)
+        body = self.label()
+        if self.locs is not None:
+            self.emit(TICK, len(self.locs))
+            self.locs.append(while_stmt.loc)
+        yield self.stmt(while_stmt.body)
+        self.patch(head, self.label())
+        self.patch_all((yield self.cond(while_stmt.cond, True)), body)
+
+    def patch_all(self, jumps, target):
+        for pc in jumps:
+            self.patch(pc, target)
+
+    def cond(self, expr, jump_if):
+        """
+        Emits jumps that are taken iff expr evaluates to jump_if and returns them to be patched.
+        """
+        if isinstance(expr, BoolExpr):
+            return [self.emit(JMP)] if expr.val is jump_if else []
+
+        if isinstance(expr, UnaryExpr) and expr.op is Tag.K_NOT:
+            return (yield self.cond(expr.rhs, not jump_if))
+
+        if isinstance(expr, BinExpr):
+            op = BIN_OPS[expr.op]
+            if op in JUMPS:
+                jump = JUMPS[op] if jump_if else NEGATED[JUMPS[op]]
+                mark = self.temps
+                lhs  = yield self.expr(expr.lhs)
+                rhs  = yield self.expr(expr.rhs)
+                self.temps = mark
+                return [self.emit(jump, 0, lhs, rhs)]
+
+            if (op == BAND) is not jump_if:
+                # jump_if = False: "and" is false as soon as one side is false - "or" vice versa
+                return (yield self.cond(expr.lhs, jump_if)) + (yield self.cond(expr.rhs, jump_if))
+
+            # jump_if = True: "and" is true only if both sides are true - "or" vice versa
+            skip  = yield self.cond(expr.lhs, not jump_if)
+            jumps = yield self.cond(expr.rhs, jump_if)
+            self.patch_all(skip, self.label())
+            return jumps
+
+        mark = self.temps
+        reg  = yield self.expr(expr)
+        self.temps = mark
+        return [self.emit(JT if jump_if else JF, 0, reg)]
+
+    # Expr
+
+    def into(self, expr, dst):
+        reg = yield self.expr(expr, dst)
+        if reg != dst:
+            self.emit(MOV, dst, reg)
+
+    def expr(self, expr, dst = None):
+        """
+        Returns the register holding the value of expr.
+        Intermediate results go into dst if given, otherwise into a fresh temporary.
+        """
+        if isinstance(expr, (LitExpr, BoolExpr)):
+            return self.const(expr.val)
+        if isinstance(expr, SymExpr):
+            return expr.decl.slot
+
+        if isinstance(expr, UnaryExpr) and expr.op is Tag.T_ADD:
+            return (yield self.expr(expr.rhs, dst))
+
+        mark = self.temps
+        if isinstance(expr, BinExpr):
+            lhs = yield self.expr(expr.lhs)
+            rhs = yield self.expr(expr.rhs)
+            self.temps = mark
+            dst = self.temp() if dst is None else dst
+            self.emit(BIN_OPS[expr.op], dst, lhs, rhs)
+        elif isinstance(expr, UnaryExpr):
+            rhs = yield self.expr(expr.rhs)
+            self.temps = mark
+            dst = self.temp() if dst is None else dst
+            self.emit(BNOT if expr.op is Tag.K_NOT else INEG, dst, rhs)
+        else:
+            assert False
+        return dst
+
+def compile_prog(prog, fuel = False):
+    return CodeGen(prog.num_slots, fuel).prog(prog)
+
+def eval_prog(prog, fuel = None):
+    print(compile_prog(prog, fuel is not None).run(fuel))
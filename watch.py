@@ -0,0 +1,258 @@
+"""
+--watch: recompiles a file whenever it changes and reuses what the change did not touch.
+
+The statements of the root StmtList are kept as Items along with their span in the current text, their diagnostics and
+their emitted code. On a change, only the text between the unchanged statements around the edit is lexed and parsed
+again. The Locs of the statements after the edit stay valid as the old Source forwards to the new one (see Source.move).
+Prog.check runs again for the new statements; if they change the top-level declarations, it also runs for all
+statements after them. The statements before are merely replayed into the Sema.
+If the edited text does not parse on its own, e.g. because it opens a block, the whole file is parsed and checked again.
+"""
+
+import io
+import os
+import sys
+import time
+from bisect import bisect_left, bisect_right
+
+import closure
+import fuel
+import tier
+import vm
+from err import Diagnostic, Diagnostics
+from lexer import BufLexer
+from loc import Source
+from parse import Parser
+from tok import Tag
+from while_ast import Sema, StmtList, DeclStmt, Emit, Emitter, Nodes, run
+
+POLL = 0.1 # seconds between checks of the file
+
+def captured(sema, node):
+    """
+    Checks node with a Diagnostics of its own; returns the diagnostics and the number of errors among them.
+    """
+    out = io.StringIO()
+    sema.diags = Diagnostics(file=out)
+    run(node.check(sema))
+    return out.getvalue(), sema.diags.num_errors
+
+def common_prefix(a, b):
+    """
+    Length of the common prefix of a and b, by comparing ever smaller slices in C instead of char by char.
+    """
+    lo, hi = 0, min(len(a), len(b))
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[lo:mid] == b[lo:mid]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+def common_suffix(a, b, limit):
+    lo, hi = 0, min(len(a), len(b), limit)
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[len(a) - mid:len(a) - lo] == b[len(b) - mid:len(b) - lo]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+class Item:
+    __slots__ = ("stmt", "begin", "finis", "diags", "errors", "peak", "texts")
+
+    def __init__(self, stmt):
+        self.stmt   = stmt
+        self.begin  = stmt.loc.begin # span in the current text
+        self.finis  = stmt.loc.finis
+        self.diags  = ""  # output of checking stmt
+        self.errors = 0
+        self.peak   = 0   # Sema.max_slots while checking stmt
+        self.texts  = {}  # Emit -> emitted code
+
+class Incremental:
+    def __init__(self, name):
+        self.name  = name
+        self.src   = None
+        self.prog  = None
+        self.items = []
+        self.nodes = Nodes() # numbers the declarations of all parses since the last full one
+        self.parse_diags = ("", 0) # diagnostics and number of errors of the last full parse
+        self.ret_diags   = ("", 0)
+
+    def update(self, text):
+        """
+        Brings the Prog up to date with text; returns the numbers of statements parsed and checked again.
+        """
+        if self.prog is None or self.parse_diags[1] != 0:
+            return self.full(text)
+
+        first, last, end, delta = self.affected(text)
+        tail = last == len(self.items) # the edit reaches into the return statement
+        lo   = self.items[first - 1].finis + 1 if first > 0 else 0
+        hi   = len(text) if tail else self.items[last].begin + delta
+        src  = Source(self.name, text)
+        if (res := self.parse_region(src, lo, hi, tail)) is None:
+            return self.full(text) # reports the errors in the context of the whole file
+
+        stmts = res.stmt.stmts if tail else res.stmts
+        for item in self.items[last:]:
+            item.begin += delta
+            item.finis += delta
+        decls = any(isinstance(item.stmt, DeclStmt) for item in self.items[first:last]) \
+            or any(isinstance(stmt, DeclStmt) for stmt in stmts)
+        self.items[first:last] = [Item(stmt) for stmt in stmts]
+        self.prog.stmt.stmts[first:last] = stmts
+        if tail:
+            self.prog.ret = res.ret
+        self.src.move(end, delta, src)
+        self.src = src
+
+        # without new or removed top-level declarations, the statements after the edit resolve their symbols as before;
+        # only their diagnostics, which print positions that may have moved, must be produced again
+        end = len(self.items) if decls else first + len(stmts)
+        end = max([end] + [idx + 1 for idx in range(end, len(self.items)) if self.items[idx].diags])
+        return len(stmts), self.check(first, end)
+
+    def parse_region(self, src, lo, hi, tail):
+        """
+        Parses src.text[lo:hi] as statements, or as the rest of the Prog if tail; returns None if that fails.
+        """
+        diags  = Diagnostics(echo=False)
+        parser = Parser(None, lambda _, diags: BufLexer(None, diags, (src, lo, hi)), self.nodes, diags)
+        res    = parser.parse_prog() if tail else parser.parse_stmt()
+        return res if diags.num_errors == 0 and parser.ahead.isa(Tag.M_EOF) else None
+
+    def affected(self, text):
+        """
+        Finds the edit that turns the current text into text.
+        Returns the range of items that overlap or touch it, the end of the replaced text and the change in length.
+        """
+        old = self.src.text
+        pre = common_prefix(old, text)
+        suf = common_suffix(old, text, min(len(old), len(text)) - pre)
+        end = len(old) - suf # the edit replaced old[pre:end]
+        first = bisect_left([item.finis for item in self.items], pre - 1)
+        last  = max(first, bisect_right([item.begin for item in self.items], end))
+        return first, last, end, len(text) - len(old)
+
+    def full(self, text):
+        file = io.StringIO(text)
+        file.name = self.name
+        out    = io.StringIO()
+        parser = Parser(file, nodes=Nodes(), diags=Diagnostics(file=out))
+        prog   = parser.parse_prog()
+        self.src   = parser.lexer.src
+        self.prog  = prog
+        self.items = [Item(stmt) for stmt in prog.stmt.stmts]
+        self.nodes = parser.nodes
+        self.parse_diags = (out.getvalue(), parser.diags.num_errors)
+        return len(self.items), self.check(0, len(self.items))
+
+    def check(self, begin, end):
+        """
+        Checks the statements from begin up to end and the return expression; returns the number of checked statements.
+        """
+        sema = Sema(Diagnostics(echo=False))
+        self.replay(sema, self.items[:begin])
+        for item in self.items[begin:end]:
+            sema.max_slots = sema.num_slots
+            item.diags, item.errors = captured(sema, item.stmt)
+            item.peak  = sema.max_slots
+            item.texts = {}
+        sema.diags = Diagnostics(echo=False)
+        self.replay(sema, self.items[end:])
+        self.ret_diags = captured(sema, self.prog.ret)
+        self.prog.num_slots = max((item.peak for item in self.items), default=0)
+        return end - begin
+
+    @staticmethod
+    def replay(sema, items):
+        """
+        Brings sema to the state after checking the unchanged statements of items; their diagnostics were recorded when
+        they were checked.
+        """
+        for item in items:
+            if isinstance(item.stmt, DeclStmt):
+                sema.bind(item.stmt.sym, item.stmt)
+                sema.alloc()
+
+    def report(self):
+        """
+        Prints the diagnostics in the order of a full compile and returns the number of errors.
+        """
+        sys.stdout.write(self.parse_diags[0] + "".join(item.diags for item in self.items) + self.ret_diags[0])
+        return self.parse_diags[1] + sum(item.errors for item in self.items) + self.ret_diags[1]
+
+    def emit(self, emit):
+        sink = io.StringIO()
+        out  = Emitter(sink, emit)
+        self.prog.emit_head(out)
+        for item in self.items:
+            if (text := item.texts.get(emit)) is None:
+                part = io.StringIO()
+                part_out = Emitter(part, emit)
+                part_out.ind = out.ind
+                run(StmtList(item.stmt.loc, [item.stmt]).emit(part_out))
+                text = item.texts[emit] = part.getvalue()
+            out.write(text)
+        if not self.items:
+            run(self.prog.stmt.emit(out))
+        run(self.prog.emit_tail(out))
+        return sink.getvalue()
+
+def build(args, inc, text):
+    start = time.perf_counter()
+    parsed, checked = inc.update(text)
+    errors = inc.report()
+    if errors != 0:
+        print(f"error: aborting due to {errors} error(s)", file=sys.stderr)
+    else:
+        for filename, emit in ((args.output, Emit.WHILE), (args.output_c, Emit.C), (args.output_py, Emit.PY)):
+            if filename is not None:
+                code = inc.emit(emit)
+                if filename == "-":
+                    sys.stdout.write(code)
+                else:
+                    with open(filename, "w", encoding='ASCII') as out_file:
+                        out_file.write(code)
+    if args.verbose:
+        secs = time.perf_counter() - start
+        print(f"{inc.name}: parsed {parsed}, checked {checked} of {len(inc.items)} statement(s) in {secs * 1000:.1f}ms",
+              file=sys.stderr)
+    if errors == 0 and args.eval is not None:
+        limits = fuel.limits(args.max_steps, args.timeout)
+        try:
+            {"ast": lambda prog, limits: prog.eval(tier.Tiering(fuel=limits).run), "closure": closure.eval_prog,
+             "vm": vm.eval_prog}[args.eval](inc.prog, limits)
+        except fuel.Exhausted as error: # the engines of --watch only report Locs
+            print(Diagnostic("error", error.loc(None), error.msg), file=sys.stderr)
+    sys.stdout.flush()
+
+def watch(args):
+    """
+    Polls args.files[0] until interrupted and rebuilds it whenever it changes.
+    """
+    path    = args.files[0]
+    inc     = Incremental(path)
+    text    = None
+    stamp   = None
+    missing = False
+    while True:
+        try:
+            stat = os.stat(path)
+            if (stat.st_mtime_ns, stat.st_size) != stamp:
+                stamp = (stat.st_mtime_ns, stat.st_size)
+                with open(path, "r", encoding='ASCII') as in_file:
+                    new = in_file.read()
+                if new != text:
+                    text = new
+                    build(args, inc, text)
+            missing = False
+        except OSError as error:
+            if not missing:
+                print(f"error: cannot open '{path}': {error.strerror}", file=sys.stderr)
+            missing = True
+        time.sleep(POLL)
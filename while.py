@@ -4,46 +4,369 @@ Main driver for compiler/interpreter.
 """
 
 import argparse
+import contextlib
+import io
+import os
 import sys
+from concurrent.futures import ProcessPoolExecutor
 
+import arena
+import batch
+import closure
 import err
+import fuel
+import ir
+import native
+import opt
+import prof
+import pyexec
+import serial
+import stats
+import tier
+import vm
+import watch
 import while_ast
+from loc import Source
 from parse import Parser
 
 cli = argparse.ArgumentParser(
     description="Compiler and interpreter for the While languge.",
-    epilog="Use '-' to output to stdout.")
+    epilog="Use '-' to output to stdout. "
+           "Output names may contain {stem}, {name} and {dir}: the name of the input file without and with extension, and its directory.")
 
-cli.add_argument(      "--eval",      action="store_true",              dest="eval",      help="interpret input program")
+cli.add_argument(      "--eval",      nargs="?", const="closure", choices=["ast", "closure", "vm", "ir", "py", "native"], dest="eval", help="interpret input program with the given engine (default: closure); right before an input file, only --eval=engine works")
 cli.add_argument("-o", "--output",    action="store", metavar="output", dest="output",    help="print program again")
 cli.add_argument(      "--output-c",  action="store", metavar="output", dest="output_c",  help="compile program to C")
 cli.add_argument(      "--output-py", action="store", metavar="output", dest="output_py", help="compile program to Python")
-cli.add_argument("file",                                                                  help="input file")
+cli.add_argument(      "--dump-bytecode", action="store", metavar="output", dest="dump_bytecode", help="disassemble the bytecode run by --eval=vm")
+cli.add_argument(      "--dump-ir",   action="store", metavar="output", dest="dump_ir",   help="print the SSA form run by --eval=ir")
+cli.add_argument("-O",                type=int, choices=[0, 1, 2], default=0, metavar="level", dest="opt", help="optimization level (default: 0)")
+cli.add_argument("-v", "--verbose",   action="store_true",                                 dest="verbose", help="report what the optimizer did")
+cli.add_argument(      "--stats",     nargs="?", const="text", choices=["text", "json"],   dest="stats", help="report time, peak memory and counts per phase (default: text); right before an input file, only --stats=format works")
+cli.add_argument(      "--stats-output", action="store", metavar="output", dest="stats_output", help="write the report of --stats/--time-passes to output instead of stderr")
+cli.add_argument(      "--time-passes", action="store_true",                               dest="time_passes", help="report time per phase without tracing memory")
+cli.add_argument(      "--profile",   action="store_true",                                 dest="profile", help="report the hottest statements of --eval=ast on stderr")
+cli.add_argument(      "--profile-stacks", action="store", metavar="output", dest="profile_stacks", help="write collapsed stacks of --eval=ast for flamegraph tools")
+cli.add_argument("-j", "--jobs",      type=int, default=1, metavar="N",                    dest="jobs", help="compile N files in parallel (default: 1)")
+cli.add_argument(      "--arena",     action="store_true",                                 dest="arena", help="keep the program in flat arrays instead of objects to save memory")
+cli.add_argument(      "--batch",     action="store", metavar="table", dest="batch", help="run the program once per row of the CSV file table, whose columns override top-level declarations")
+cli.add_argument(      "--max-steps", type=int, metavar="N",                                 dest="max_steps", help="stop an evaluation after N iterations of loops")
+cli.add_argument(      "--timeout",   type=float, metavar="seconds",                        dest="timeout", help="stop an evaluation after the given wall-clock time")
+cli.add_argument(      "--watch",     action="store_true",                                 dest="watch", help="recompile the input file whenever it changes")
+cli.add_argument("files",             nargs="+", metavar="file",                            help="input files")
 
-args = cli.parse_args()
+# arguments that name an output file; they are expanded per input file
+OUTPUTS = ("output", "output_c", "output_py", "dump_bytecode", "dump_ir", "stats_output", "profile_stacks")
 
-with open(args.file, "r", encoding='ASCII') as in_file:
-    parser = Parser(in_file)
-    prog   = parser.parse_prog()
+def expand(pattern, path):
+    if pattern is None or pattern == "-":
+        return pattern
+    name = os.path.basename(path)
+    return pattern.format(stem=os.path.splitext(name)[0], name=name, dir=os.path.dirname(path) or ".")
 
-def output(filename, emit):
-    if filename is not None:
-        while_ast.EMIT = emit
-        if filename == "-":
-            sys.stdout.write(str(prog))
-        else:
-            with open(filename, "w", encoding='ASCII') as out_file:
-                out_file.write(str(prog))
+def expanded(args, path):
+    return argparse.Namespace(**{**vars(args), **{out: expand(getattr(args, out), path) for out in OUTPUTS}})
 
-output(args.output, while_ast.Emit.WHILE)
+def open_output(filename):
+    if os.path.dirname(filename):
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+    return open(filename, "w", encoding='ASCII')
 
-prog.check()
-if err.NUM_ERRORS != 0:
-    sys.exit(f"error: aborting due to {err.NUM_ERRORS} error(s)")
+def write(filename, text):
+    if filename == "-":
+        sys.stdout.write(text)
+    else:
+        with open_output(filename) as out_file:
+            out_file.write(text)
 
-if args.eval:
-    while_ast.EMIT = while_ast.Emit.EVAL
-    prog.eval()
+class Job:
+    """
+    Runs the compiler/interpreter on a single input file.
+    """
+    def __init__(self, args, path):
+        self.args     = expanded(args, path)
+        self.path     = path
+        self.stats    = stats.Stats(path, trace_memory=args.stats is not None) if args.stats or args.time_passes else None
+        self.profiler = prof.Profiler() if args.profile or args.profile_stacks is not None else None
+        self.diags    = err.Diagnostics()
 
-output(args.output_c,  while_ast.Emit.C)
-output(args.output_py, while_ast.Emit.PY)
+    def phase(self, name):
+        return self.stats.phase(name) if self.stats is not None else contextlib.nullcontext()
+
+    @property
+    def fueled(self):
+        return self.args.max_steps is not None or self.args.timeout is not None
+
+    def limits(self):
+        """
+        Returns a fresh fuel.Fuel for the next evaluation, or None; its clock starts now.
+        """
+        return fuel.limits(self.args.max_steps, self.args.timeout)
+
+    def exhausted(self, error, src):
+        print(err.Diagnostic("error", error.loc(src), error.msg), file=sys.stderr)
+        return 1
+
+    def abort(self):
+        print(f"error: aborting due to {self.diags.num_errors} error(s)", file=sys.stderr)
+        return 1
+
+    def output(self, filename, emit, node):
+        if filename is not None:
+            with self.phase(f"emit.{emit.name}"):
+                if filename == "-":
+                    node.emit(while_ast.Emitter(sys.stdout, emit))
+                else:
+                    with open_output(filename) as out_file:
+                        node.emit(while_ast.Emitter(out_file, emit))
+
+    def run(self):
+        """
+        Returns the exit status; the report of --stats also covers runs that stop early, e.g. due to errors.
+        """
+        try:
+            return self.compile()
+        except OSError as error:
+            print(f"error: cannot open '{error.filename}': {error.strerror}", file=sys.stderr)
+            return 1
+        except SystemExit as stop: # the backends give up via sys.exit
+            if isinstance(stop.code, str):
+                print(stop.code, file=sys.stderr)
+                return 1
+            return stop.code or 0
+        finally:
+            if self.stats is not None:
+                self.stats.counts["errors"] = self.diags.num_errors
+                text = self.stats.format(self.args.stats or "text")
+                if self.args.stats_output is None:
+                    sys.stderr.write(text)
+                else:
+                    write(self.args.stats_output, text)
+
+    def compile(self):
+        args = self.args
+        # the compiled programs of --eval=py and --eval=native are cached; on their own, they may skip the front end
+        cached    = {"py": pyexec, "native": native}.get(args.eval)
+        only_eval = cached is not None and not args.verbose \
+            and all(out is None for out in (args.output, args.output_c, args.output_py, args.dump_bytecode, args.dump_ir))
+
+        with open(self.path, "r", encoding='ASCII') as in_file:
+            if args.arena:
+                return self.compile_arena(in_file)
+            source = in_file.read()
+            if only_eval:
+                with self.phase("cache"):
+                    code = cached.load(source, args.opt, self.fueled)
+                if code is not None:
+                    try:
+                        with self.phase(f"eval.{args.eval}"):
+                            cached.run(code, self.limits())
+                    except fuel.Exhausted as error:
+                        return self.exhausted(error, Source(self.path, source))
+                    return 0
+            # so is the checked AST, which skips the front end for all other uses
+            with self.phase("ast.load"):
+                loaded = serial.fetch(source, self.path)
+            if loaded is not None:
+                prog, num_toks = loaded
+            else:
+                in_file.seek(0)
+                with self.phase("parse"):
+                    parser = Parser(in_file, diags=self.diags)
+                    prog   = parser.parse_prog()
+                num_toks = parser.num_toks
+        if args.stats:
+            self.stats.count_prog(num_toks, prog)
+
+        if args.opt == 0:
+            self.output(args.output, while_ast.Emit.WHILE, prog)
+
+        if loaded is None:
+            with self.phase("check"):
+                prog.check(self.diags)
+            if self.diags.num_errors != 0:
+                return self.abort()
+            with self.phase("ast.store"):
+                serial.store(source, prog, num_toks)
+
+        if args.opt >= 1:
+            with self.phase("opt"):
+                # the optimized prog must still let --batch override the top-level declarations
+                counts = opt.optimize(prog, batch.inputs(prog).values() if args.batch is not None else ())
+            if args.verbose:
+                print("ast: " + ", ".join(f"{name}: {num}" for name, num in counts.items()), file=sys.stderr)
+            self.output(args.output, while_ast.Emit.WHILE, prog)
+
+        func, backend = self.lower(prog)
+        try:
+            self.evaluate(prog, func, backend, source)
+        except fuel.Exhausted as error:
+            return self.exhausted(error, Source(self.path, source))
+        self.output(args.output_c,  while_ast.Emit.C,  backend)
+        self.output(args.output_py, while_ast.Emit.PY, backend)
+        return 0
+
+    def compile_arena(self, in_file):
+        """
+        Parses, checks, evaluates and emits the program as an arena.Arena.
+        """
+        args  = self.args
+        nodes = arena.Arena()
+        with self.phase("parse"):
+            parser = Parser(in_file, nodes=nodes, diags=self.diags)
+            parser.parse_prog()
+        if args.stats:
+            self.stats.count_prog(parser.num_toks, nodes)
+
+        self.output(args.output, while_ast.Emit.WHILE, nodes)
+        with self.phase("check"):
+            nodes.check(self.diags)
+        if self.diags.num_errors != 0:
+            return self.abort()
+
+        if args.eval is not None:
+            try:
+                with self.phase("eval.arena"):
+                    nodes.eval(self.limits())
+            except fuel.Exhausted as error:
+                return self.exhausted(error, nodes.src)
+        self.output(args.output_c,  while_ast.Emit.C,  nodes)
+        self.output(args.output_py, while_ast.Emit.PY, nodes)
+        return 0
+
+    def lower(self, prog):
+        """
+        Returns the SSA form of prog, if needed, and what the backends consume:
+        with -O2, the backends except for the AST-based engines consume the optimized SSA form.
+        """
+        args = self.args
+        if args.eval != "ir" and args.dump_ir is None and args.opt < 2:
+            return None, prog
+
+        with self.phase("ir.build"):
+            func = ir.build(prog)
+        if args.opt >= 2:
+            with self.phase("ir.opt"):
+                counts = func.optimize()
+            if args.verbose:
+                print("ssa: " + ", ".join(f"{name}: {num}" for name, num in counts.items()), file=sys.stderr)
+        if args.dump_ir is not None:
+            with self.phase("dump.ir"):
+                write(args.dump_ir, str(func))
+        return func, func if args.opt >= 2 else prog
+
+    def evaluate(self, prog, func, backend, source):
+        args = self.args
+        if args.batch is not None:
+            with self.phase("eval.batch"):
+                batch.run_table(prog, args.batch, self.limits())
+        if args.eval == "ast":
+            # hot loops are compiled to Python unless the profiler has to see every statement
+            tiering = tier.Tiering(fuel=self.limits()) if self.profiler is None else None
+            if tiering is None:
+                self.profiler.fuel = self.limits()
+            with self.phase("eval.ast"):
+                prog.eval(self.profiler.run if tiering is None else tiering.run)
+            if tiering is not None and self.stats is not None:
+                self.stats.counts["promoted loops"] = tiering.report()
+            if args.profile:
+                sys.stderr.write(self.profiler.report())
+            if args.profile_stacks is not None:
+                write(args.profile_stacks, self.profiler.collapsed())
+        elif args.eval == "closure":
+            with self.phase("eval.closure"):
+                closure.eval_prog(prog, self.limits())
+        elif args.eval == "ir":
+            with self.phase("eval.ir"):
+                ir.eval_func(func, self.limits())
+
+        if args.eval == "vm" or args.dump_bytecode is not None:
+            with self.phase("vm.compile"):
+                code = vm.compile_prog(prog, self.fueled)
+            if args.dump_bytecode is not None:
+                with self.phase("dump.bytecode"):
+                    write(args.dump_bytecode, code.dis())
+            if args.eval == "vm":
+                with self.phase("eval.vm"):
+                    print(code.run(self.limits()))
+
+        if args.eval == "py":
+            with self.phase("py.compile"):
+                code = pyexec.compile_prog(backend, self.path, self.fueled)
+                pyexec.store(source, args.opt, code, self.fueled)
+            with self.phase("eval.py"):
+                pyexec.run(code, self.limits())
+
+        if args.eval == "native":
+            with self.phase("native.build"):
+                lib = native.build(backend, source, args.opt, self.fueled)
+            with self.phase("eval.native"):
+                native.run(lib, self.limits())
+
+def compile_file(args, path):
+    """
+    Runs a Job in a worker process and returns its exit status along with what it printed, which is kept per file.
+    """
+    out, errs = io.StringIO(), io.StringIO()
+    with contextlib.redirect_stdout(out), contextlib.redirect_stderr(errs):
+        status = Job(args, path).run()
+    return status, out.getvalue(), errs.getvalue()
+
+def parse_args():
+    args = cli.parse_args()
+    if args.jobs < 1:
+        cli.error("-j requires at least one worker")
+    if (args.max_steps is not None and args.max_steps < 0) or (args.timeout is not None and not args.timeout > 0):
+        cli.error("--max-steps requires N >= 0 and --timeout a positive number of seconds")
+    if args.profile or args.profile_stacks is not None:
+        if args.eval not in (None, "ast"):
+            cli.error("--profile and --profile-stacks require --eval=ast")
+        args.eval = "ast" # the profiler hooks into the AST interpreter
+    if args.arena:
+        # the arena has an evaluator of its own, which walks the arrays like --eval=ast walks the objects
+        extras = (args.opt, args.profile, args.watch, args.dump_bytecode is not None, args.dump_ir is not None)
+        if args.eval not in (None, "ast", "closure") or any(extras):
+            cli.error("--arena supports -o, --output-c, --output-py and --eval at -O0")
+    if args.batch is not None and (args.eval is not None or args.profile or args.arena or args.watch):
+        cli.error("--batch cannot be combined with --eval, --profile, --arena or --watch")
+    if args.watch:
+        extras = (args.opt, args.stats, args.time_passes, args.profile, *(getattr(args, out) for out in OUTPUTS[3:]))
+        if len(args.files) != 1 or args.eval not in (None, "ast", "closure", "vm") or any(extras):
+            cli.error("--watch supports a single file with -o, --output-c, --output-py, -v and --eval=ast/closure/vm")
+
+    for out in OUTPUTS:
+        if (pattern := getattr(args, out)) is None or pattern == "-":
+            continue
+        try:
+            names = {expand(pattern, path) for path in args.files}
+        except (KeyError, IndexError, ValueError):
+            cli.error(f"invalid output name '{pattern}': only {{stem}}, {{name}} and {{dir}} may be used")
+        if len(names) != len(set(args.files)):
+            cli.error(f"output '{pattern}' is the same for several input files; use {{stem}}, {{name}} or {{dir}}")
+    return args
+
+def main():
+    args = parse_args()
+    if args.watch:
+        try:
+            watch.watch(expanded(args, args.files[0]))
+        except KeyboardInterrupt:
+            sys.exit()
+    if args.jobs == 1 or len(args.files) == 1:
+        sys.exit(max(Job(args, path).run() for path in args.files))
+
+    status = 0
+    with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+        futures = [(path, pool.submit(compile_file, args, path)) for path in args.files]
+        for path, future in futures: # in the order of the input files
+            try:
+                res, out, errs = future.result()
+            except Exception as error: # pylint: disable=broad-exception-caught
+                res, out, errs = 1, "", f"error: {path}: {error!r}\n"
+            sys.stdout.write(out)
+            sys.stderr.write(errs)
+            status = max(status, res)
+    sys.exit(status)
+
+if __name__ == "__main__":
+    main()
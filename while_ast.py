@@ -3,326 +3,496 @@ The While AST (Abstract Syntax Tree)
 """
 
 from enum import Enum, auto
+from types import GeneratorType
+import io
+
 from tok import Tag
-from err import err, note
+from err import Diagnostics
 
 def same(t, u):
     return t is None or u is None or t == u
 
-class Tab:
-    def __init__(self, tab = "\t"):
-        self.ind = 0
-        self.tab = tab
-
-    def indent(self):
-        self.ind += 1
-
-    def dedent(self):
-        self.ind -= 1
-
-    def __str__(self):
-        res = ""
-        for _ in range(self.ind):
-            res += self.tab
-        return res
+def run(gen):
+    """
+    Drives a traversal without recursing on the Python stack.
+    The check/eval/emit methods of inner nodes are generators: instead of calling a child they yield the child's
+    generator and receive its result back. Leaves are plain methods; whatever they return is sent back as is.
+    """
+    if type(gen) is not GeneratorType: # pylint: disable=unidiomatic-typecheck
+        return gen
+
+    stack = [gen]
+    val   = None
+    while True:
+        try:
+            res = stack[-1].send(val)
+        except StopIteration as stop:
+            stack.pop()
+            if not stack:
+                return stop.value
+            val = stop.value
+            continue
+
+        if type(res) is GeneratorType: # pylint: disable=unidiomatic-typecheck
+            stack.append(res)
+            val = None
+        else:
+            val = res
 
 class Sema:
-    def __init__(self):
-        self.scopes = []
+    """
+    Symbol table in the style of LeBlanc and Cook: every key maps to the stack of its visible declarations, innermost
+    last, and an undo log records the keys bound since each scope was pushed.
+    So find and bind take constant time regardless of the nesting depth, and pop only undoes what its scope bound.
+    Keys are identifiers, which the lexers intern, or the name indices of arena.Checker.
+    Errors go to diags.
+    """
+    def __init__(self, diags = None):
+        self.diags     = diags if diags is not None else Diagnostics()
+        self.symbols   = {} # key -> [(depth, declaration)], innermost last
+        self.log       = [] # keys in the order they were bound
+        self.marks     = [] # (self.num_slots, len(self.log)) when the corresponding scope was pushed
+        self.num_slots = 0  # slots currently in use
+        self.max_slots = 0  # size of the environment needed to evaluate the program
         self.push() # root scope
 
     def push(self):
-        self.scopes.append({})
+        self.marks.append((self.num_slots, len(self.log)))
 
     def pop(self):
-        self.scopes.pop()
+        self.num_slots, size = self.marks.pop() # disjoint scopes reuse the slots
+        symbols = self.symbols
+        for key in self.log[size:]:
+            symbols[key].pop()
+        del self.log[size:]
+
+    def alloc(self):
+        slot = self.num_slots
+        self.num_slots += 1
+        self.max_slots  = max(self.max_slots, self.num_slots)
+        return slot
+
+    def lookup(self, key):
+        """
+        Returns the innermost visible declaration of key or None.
+        """
+        decls = self.symbols.get(key)
+        return decls[-1][1] if decls else None
+
+    def insert(self, key, decl):
+        """
+        Binds key to decl in the current scope; returns the declaration of key already in it instead, if any.
+        """
+        decls = self.symbols.setdefault(key, [])
+        depth = len(self.marks)
+        if decls and decls[-1][0] == depth:
+            return decls[-1][1]
+        decls.append((depth, decl))
+        self.log.append(key)
+        return None
 
     def find(self, tok):
         if tok.is_error(): return None
 
-        for scope in reversed(self.scopes):
-            if tok.sym in scope:
-                return scope[tok.sym]
+        if (decl := self.lookup(tok.sym)) is not None:
+            return decl
 
-        err(tok.loc, f"identifier '{tok}' not found")
+        self.diags.err(tok.loc, f"identifier '{tok}' not found")
         return None
 
     def bind(self, tok, decl):
         if tok.is_error():
             return True
 
-        curr_scope = self.scopes[-1]
-
-        if tok.sym in curr_scope:
-            prev = curr_scope[tok.sym]
-            err(decl.loc, f"redeclaration of '{tok}' in the same scope")
-            note(prev.loc, "previous declaration here")
+        if (prev := self.insert(tok.sym, decl)) is not None:
+            self.diags.err(decl.loc, f"redeclaration of '{tok}' in the same scope")
+            self.diags.note(prev.loc, "previous declaration here")
             return False
 
-        curr_scope[tok.sym] = decl
         return True
 
 class Emit(Enum):
-    EVAL  = auto()
     WHILE = auto()
     C     = auto()
     PY    = auto()
 
-TAB  = Tab()
-EMIT = Emit.WHILE
+class Emitter:
+    """
+    Writes an AST in the target language emit directly to sink, a file-like object.
+    For Emit.C, a program becomes a function named export that returns the result instead of a main that prints it,
+    if export is given.
+    With fuel, every loop body starts with the checks of fuel.py on a local counter fuel_steps; the Python code then
+    expects a fuel.Fuel named fuel and the function named export takes the callback fuel.Fuel.refill_native.
+    """
+    def __init__(self, sink, emit, tab = "\t", export = None):
+        self.write  = sink.write
+        self.emit   = emit
+        self.tab    = tab
+        self.export = export
+        self.fuel   = False
+        self.ind    = "" # current indentation
+
+    def c_prologue(self, ret_ty):
+        self.write("#include <stdbool.h>\n")
+        if self.export is None:
+            self.write("#include <stdio.h>\n")
+            self.write("\n")
+            self.write("int main() {\n")
+        else:
+            self.write("\n")
+            self.write(f"const int {self.export}_is_bool = {int(ret_ty is Tag.K_BOOL)};\n")
+            self.write("\n")
+            if not self.fuel:
+                self.write(f"int {self.export}(void) {{\n")
+            else:
+                self.write(f"int {self.export}(long (*fuel_refill)(long)) {{\n")
+                self.write(f"{self.tab}long fuel_steps = 0;\n")
+
+    def py_prologue(self):
+        """
+        Writes the start of Python code that counts steps; C does so in c_prologue.
+        """
+        if self.fuel:
+            self.write(f"{self.ind}fuel_steps = fuel.steps\n")
+
+    def fuel_check(self, offset):
+        """
+        Writes the check at the start of the body of the loop at offset.
+        """
+        if not self.fuel:
+            return
+        if self.emit is Emit.C:
+            self.write(f"{self.ind}if (--fuel_steps < 0 && (fuel_steps = fuel_refill({offset})) < 0) return 0;\n")
+        else:
+            self.write(f"{self.ind}fuel_steps -= 1\n")
+            self.write(f"{self.ind}if fuel_steps < 0: fuel_steps = fuel.refill({offset})\n")
+
+    def ret_head(self, ret_ty):
+        """
+        Writes what precedes the return expression of a program; ret_tail writes what follows it.
+        """
+        if self.emit is Emit.WHILE or (self.emit is Emit.C and self.export is not None):
+            self.write(f"{self.ind}return ")
+        elif self.emit is Emit.C:
+            self.write(f"{self.ind}printf(" if ret_ty is Tag.K_BOOL else f'{self.ind}printf("%i\\n", ')
+        else:
+            self.write(f'{self.ind}print("true" if ' if ret_ty is Tag.K_BOOL else f"{self.ind}print(")
+
+    def ret_tail(self, ret_ty):
+        if self.emit is Emit.WHILE:
+            self.write(";\n")
+        elif self.emit is Emit.C:
+            if self.export is not None:
+                self.write(";")
+            else:
+                self.write(' ? "true\\n" : "false\\n");' if ret_ty is Tag.K_BOOL else ");")
+            self.dedent()
+            self.write("\n}\n")
+        else:
+            self.write(' else "false")\n' if ret_ty is Tag.K_BOOL else ")\n")
+
+    def indent(self):
+        self.ind += self.tab
+
+    def dedent(self):
+        self.ind = self.ind[:-len(self.tab)]
+
+def to_str(node, emit):
+    sink = io.StringIO()
+    run(node.emit(Emitter(sink, emit)))
+    return sink.getvalue()
 
 # AST
 
+# Nodes have __slots__ instead of a __dict__ to keep large programs small; see also arena.py.
+# The type of an Expr is derived from its operator or declaration instead of being stored.
+
 class AST:
+    """
+    Base of all nodes.
+    The check, eval and emit methods of inner nodes are generators, so calling one does nothing: drive it with run,
+    e.g. run(stmt.emit(out)). Those of Prog and of leaves do their work when called.
+    """
+    __slots__ = ("loc",)
+
     def __init__(self, loc):
         self.loc = loc
 
+    def __str__(self):
+        return to_str(self, Emit.WHILE)
+
 class Prog(AST):
+    __slots__ = ("stmt", "ret", "num_slots")
+
     def __init__(self, loc, stmt, ret):
         super().__init__(loc)
         self.stmt = stmt
         self.ret  = ret
+        self.num_slots = 0
 
-    def __str__(self):
-        res = ""
-
-        if EMIT is Emit.C:
-            res += "#include <stdbool.h>\n"
-            res += "#include <stdio.h>\n"
-            res += "\n"
-            res += "int main() {\n"
-            TAB.indent()
-
-        res += f"{self.stmt}"
-
-        if EMIT is Emit.WHILE:
-            res += f"{TAB}return {self.ret};\n"
-        elif EMIT is Emit.C:
-            if self.ret.ty == Tag.K_BOOL:
-                res += f'{TAB}printf({self.ret} ? "true\\n" : "false\\n");'
-            else:
-                res += f'{TAB}printf("%i\\n", {self.ret});'
-        elif EMIT is Emit.PY:
-            if self.ret.ty is Tag.K_BOOL:
-                res += f'{TAB}print("true" if {self.ret} else "false")\n'
-            else:
-                res += f'{TAB}print({self.ret})\n'
+    def emit(self, out):
+        run(self.emit_gen(out))
 
-        if EMIT is Emit.C:
-            TAB.dedent()
-            res += "\n}\n"
-        return res
+    def emit_gen(self, out):
+        self.emit_head(out)
+        yield self.stmt.emit(out)
+        yield self.emit_tail(out)
 
-    def check(self):
-        sema = Sema()
-        self.stmt.check(sema)
-        self.ret.check(sema)
+    # the parts around the statements; watch.py emits the statements between them one by one
 
-    def eval(self):
-        assert EMIT is Emit.EVAL
-        env = {}
-        self.stmt.eval(env)
-        print(self.ret.eval(env))
+    def emit_head(self, out):
+        if out.emit is Emit.C:
+            out.c_prologue(self.ret.ty)
+            out.indent()
+        else:
+            out.py_prologue()
+
+    def emit_tail(self, out):
+        out.ret_head(self.ret.ty)
+        yield self.ret.emit(out)
+        out.ret_tail(self.ret.ty)
+
+    def check(self, diags = None):
+        sema = Sema(diags)
+        run(self.stmt.check(sema))
+        run(self.ret.check(sema))
+        self.num_slots = sema.max_slots
+
+    def eval(self, driver = run):
+        """
+        driver runs the traversals; see prof.Profiler.run.
+        """
+        env = [None] * self.num_slots
+        driver(self.stmt.eval(env))
+        print(driver(self.ret.eval(env)))
 
 # Stmt
 
 class Stmt(AST):
-    pass
+    __slots__ = ()
 
-DECL_COUNTER = 0
 
-def name(decl, sym = None):
-    if decl is None:                         return f"{sym}"
-    if EMIT is Emit.WHILE:                   return f"{decl.sym}"
-    if EMIT is Emit.C:                       return f"_{decl.sym}"
-    if EMIT is Emit.EVAL or EMIT is Emit.PY: return f"{decl.sym}_{decl.counter}"
+def name(emit, decl, sym = None):
+    if decl is None:        return f"{sym}"
+    if emit is Emit.WHILE:  return f"{decl.sym}"
+    if emit is Emit.C:      return f"_{decl.sym}"
+    if emit is Emit.PY:     return f"{decl.sym}_{decl.counter}"
     assert False
 
 class DeclStmt(Stmt):
+    __slots__ = ("ty", "sym", "init", "slot", "counter")
+
     def __init__(self, loc, ty, sym, init):
-        global DECL_COUNTER
         super().__init__(loc)
         self.ty   = ty
         self.sym  = sym
         self.init = init
-        self.counter = DECL_COUNTER
-        DECL_COUNTER += 1
+        self.slot = None # index into the environment; assigned by check
+        self.counter = None # tells declarations of the same program apart; assigned by Nodes
 
-    def __str__(self):
-        if EMIT is Emit.PY: return f"{name(self)} = {self.init}"
-        return f"{self.ty} {name(self)} = {self.init};"
+    def emit(self, out):
+        if out.emit is Emit.PY:
+            out.write(f"{name(out.emit, self)} = ")
+            yield self.init.emit(out)
+        else:
+            out.write(f"{self.ty} {name(out.emit, self)} = ")
+            yield self.init.emit(out)
+            out.write(";")
 
     def check(self, sema):
-        init_ty = self.init.check(sema)
+        init_ty = yield self.init.check(sema)
         if not same(init_ty, self.ty):
-            err(self.loc, f"initialization of declaration statement is of type '{init_ty}' but '{self.sym}' is declared of type '{self.ty}'")
+            sema.diags.err(self.loc, f"initialization of declaration statement is of type '{init_ty}' but '{self.sym}' is declared of type '{self.ty}'")
         sema.bind(self.sym, self)
+        self.slot = sema.alloc()
 
     def eval(self, env):
-        val = self.init.eval(env)
-        env[name(self)] = val
+        env[self.slot] = yield self.init.eval(env)
 
 class AssignStmt(Stmt):
+    __slots__ = ("sym", "init", "decl")
+
     def __init__(self, loc, sym, init):
         super().__init__(loc)
         self.sym  = sym
         self.init = init
         self.decl = None
 
-    def __str__(self):
-        if EMIT is Emit.PY:
-            return f"{name(self.decl, self.sym)} = {self.init}"
-        return f"{name(self.decl, self.sym)} = {self.init};"
+    def emit(self, out):
+        out.write(f"{name(out.emit, self.decl, self.sym)} = ")
+        yield self.init.emit(out)
+        if out.emit is not Emit.PY:
+            out.write(";")
 
     def check(self, sema):
-        init_ty = self.init.check(sema)
+        init_ty = yield self.init.check(sema)
         self.decl = sema.find(self.sym)
-        if not same(init_ty, self.decl.ty):
-            err(self.loc, f"right-hand side of asssignment statement is of type '{init_ty}' but '{self.decl.sym}' is declared of type '{self.decl.ty}'")
-            note(self.decl.loc, "previous declaration here")
+        if self.decl is not None and not same(init_ty, self.decl.ty):
+            sema.diags.err(self.loc, f"right-hand side of asssignment statement is of type '{init_ty}' but '{self.decl.sym}' is declared of type '{self.decl.ty}'")
+            sema.diags.note(self.decl.loc, "previous declaration here")
 
     def eval(self, env):
-        val = self.init.eval(env)
-        env[name(self.decl)] = val
+        env[self.decl.slot] = yield self.init.eval(env)
 
 class StmtList(Stmt):
+    __slots__ = ("stmts",)
+
     def __init__(self, loc, stmts):
         super().__init__(loc)
         self.stmts = stmts
 
-    def __str__(self):
-        if EMIT is Emit.PY and not self.stmts:
-            return f"{TAB}pass\n"
-        res = ""
+    def emit(self, out):
+        if out.emit is Emit.PY and not self.stmts:
+            out.write(f"{out.ind}pass\n")
         for stmt in self.stmts:
-            res += f"{TAB}{stmt}\n"
-        return res
+            out.write(out.ind)
+            yield stmt.emit(out)
+            out.write("\n")
 
     def check(self, sema):
         for stmt in self.stmts:
-            stmt.check(sema)
+            yield stmt.check(sema)
 
     def eval(self, env):
         for stmt in self.stmts:
-            stmt.eval(env)
+            yield stmt.eval(env)
 
 class IfStmt(Stmt):
+    __slots__ = ("cond", "cons", "alt")
+
     def __init__(self, loc, cond, cons, alt):
         super().__init__(loc)
         self.cond = cond
         self.cons = cons
         self.alt  = alt
 
-    def __str__(self):
-        if EMIT is Emit.WHILE:
-            head = f"if {self.cond} {{\n"
-        elif EMIT is Emit.C:
-            head = f"if ({self.cond}) {{\n"
+    def emit(self, out):
+        if out.emit is Emit.WHILE:
+            out.write("if ")
+            yield self.cond.emit(out)
+            out.write(" {\n")
+        elif out.emit is Emit.C:
+            out.write("if (")
+            yield self.cond.emit(out)
+            out.write(") {\n")
         else:
-            head = f"if {self.cond}:\n"
-
-        TAB.indent()
-        cons = f"{self.cons}"
-        TAB.dedent()
+            out.write("if ")
+            yield self.cond.emit(out)
+            out.write(":\n")
 
-        tail_cons = "" if EMIT is Emit.PY else f"{TAB}}}"
+        out.indent()
+        yield self.cons.emit(out)
+        out.dedent()
 
-        if EMIT is Emit.WHILE:
-            else_ = "else {{\n"
-        elif EMIT is Emit.C:
-            else_ = " else {{\n"
-        else:
-            else_ = "else:\n"
+        out.write(f"{out.ind}else:\n" if out.emit is Emit.PY else f"{out.ind}}} else {{\n")
 
-        TAB.indent()
-        alt = f"{self.alt}"
-        TAB.dedent()
+        out.indent()
+        yield self.alt.emit(out)
+        out.dedent()
 
-        tail_alt = "" if EMIT is Emit.PY else f"{TAB}}}"
-        return head + cons + tail_cons + else_ + alt + tail_alt
+        if out.emit is not Emit.PY:
+            out.write(f"{out.ind}}}")
 
     def check(self, sema):
-        cond_ty = self.cond.check(sema)
+        cond_ty = yield self.cond.check(sema)
         if not same(cond_ty, Tag.K_BOOL):
-            err(self.cond.loc, f"condition of an if statement must be of type `bool` but is of type '{cond_ty}'")
+            sema.diags.err(self.cond.loc, f"condition of an if statement must be of type `bool` but is of type '{cond_ty}'")
 
         sema.push()
-        self.cons.check(sema)
+        yield self.cons.check(sema)
         sema.pop()
 
         sema.push()
-        self.alt.check(sema)
+        yield self.alt.check(sema)
         sema.pop()
 
     def eval(self, env):
-        cond = self.cond.eval(env)
+        cond = yield self.cond.eval(env)
         if cond:
-            self.cons.eval(env)
+            yield self.cons.eval(env)
         else:
-            self.alt.eval(env)
+            yield self.alt.eval(env)
 
 class WhileStmt(Stmt):
+    __slots__ = ("cond", "body")
+
     def __init__(self, loc, cond, body):
         super().__init__(loc)
         self.cond = cond
         self.body = body
 
-    def __str__(self):
-        if EMIT is Emit.WHILE:
-            head = f"while {self.cond} {{\n"
-        elif EMIT is Emit.C:
-            head = f"while ({self.cond}) {{\n"
+    def emit(self, out):
+        if out.emit is Emit.WHILE:
+            out.write("while ")
+            yield self.cond.emit(out)
+            out.write(" {\n")
+        elif out.emit is Emit.C:
+            out.write("while (")
+            yield self.cond.emit(out)
+            out.write(") {\n")
         else:
-            head = f"while {self.cond}:\n"
+            out.write("while ")
+            yield self.cond.emit(out)
+            out.write(":\n")
+
+        out.indent()
+        out.fuel_check(self.loc.begin)
+        yield self.body.emit(out)
+        out.dedent()
 
-        TAB.indent()
-        body = f"{self.body}"
-        TAB.dedent()
-        tail = "" if EMIT is Emit.PY else f"{TAB}}}"
-        return head + body + tail
+        if out.emit is not Emit.PY:
+            out.write(f"{out.ind}}}")
 
     def check(self, sema):
-        cond_ty = self.cond.check(sema)
+        cond_ty = yield self.cond.check(sema)
         if not same(cond_ty, Tag.K_BOOL):
-            err(self.cond.loc, f"condition of a while statement must be of type `bool` but is of type '{cond_ty}'")
+            sema.diags.err(self.cond.loc, f"condition of a while statement must be of type `bool` but is of type '{cond_ty}'")
 
         sema.push()
-        self.body.check(sema)
+        yield self.body.check(sema)
         sema.pop()
 
     def eval(self, env):
         while True:
-            if not self.cond.eval(env): break
-            self.body.eval(env)
+            if not (yield self.cond.eval(env)): break
+            yield self.body.eval(env)
 
 # Expr
 
 class Expr(AST):
-    def __init__(self, loc):
-        super().__init__(loc)
-        self.ty = None
+    __slots__ = ()
 
 class BinExpr(Expr):
+    __slots__ = ("lhs", "op", "rhs")
+
     def __init__(self, loc, lhs, op, rhs):
         super().__init__(loc)
         self.lhs = lhs
         self.op  = op
         self.rhs = rhs
 
-    def __str__(self):
+    @property
+    def ty(self):
+        return Tag.K_INT if self.op.is_arith() else Tag.K_BOOL
+
+    def emit(self, out):
         op = str(self.op)
 
-        if EMIT is Emit.C:
+        if out.emit is Emit.C:
             if self.op is Tag.K_AND:
                 op = "&"
             elif self.op is Tag.K_OR:
                 op = "|"
 
-        return f"({self.lhs} {op} {self.rhs})"
+        out.write("(")
+        yield self.lhs.emit(out)
+        out.write(f" {op} ")
+        yield self.rhs.emit(out)
+        out.write(")")
 
     def check(self, sema):
-        l_ty  = self.lhs.check(sema)
-        r_ty  = self.rhs.check(sema)
+        l_ty  = yield self.lhs.check(sema)
+        r_ty  = yield self.rhs.check(sema)
 
         if self.op.is_arith():
             expected_ty = Tag.K_INT
@@ -337,15 +507,15 @@ class BinExpr(Expr):
             assert False
 
         if not same(l_ty, expected_ty):
-            err(self.lhs.loc, f"left-hand side of operator '{self.op}' must be of type '{expected_ty}' but is of type '{l_ty}'")
+            sema.diags.err(self.lhs.loc, f"left-hand side of operator '{self.op}' must be of type '{expected_ty}' but is of type '{l_ty}'")
         if not same(r_ty, expected_ty):
-            err(self.rhs.loc, f"right-hand side of operator '{self.op}' must be of type '{expected_ty}' but is of type '{r_ty}'")
+            sema.diags.err(self.rhs.loc, f"right-hand side of operator '{self.op}' must be of type '{expected_ty}' but is of type '{r_ty}'")
 
         return result_ty
 
     def eval(self, env):
-        l = self.lhs.eval(env)
-        r = self.rhs.eval(env)
+        l = yield self.lhs.eval(env)
+        r = yield self.rhs.eval(env)
         if self.op is Tag.T_ADD: return l +  r
         if self.op is Tag.T_SUB: return l -  r
         if self.op is Tag.T_MUL: return l *  r
@@ -360,17 +530,25 @@ class BinExpr(Expr):
         assert False
 
 class UnaryExpr(Expr):
+    __slots__ = ("op", "rhs")
+
     def __init__(self, loc, op, rhs):
         super().__init__(loc)
         self.op  = op
         self.rhs = rhs
 
-    def __str__(self):
-        op = "!" if EMIT is Emit.C and self.op is Tag.K_NOT else str(self.op)
-        return f"{op}({self.rhs})"
+    @property
+    def ty(self):
+        return Tag.K_BOOL if self.op is Tag.K_NOT else Tag.K_INT
+
+    def emit(self, out):
+        op = "!" if out.emit is Emit.C and self.op is Tag.K_NOT else str(self.op)
+        out.write(f"{op}(")
+        yield self.rhs.emit(out)
+        out.write(")")
 
     def check(self, sema):
-        r_ty = self.rhs.check(sema)
+        r_ty = yield self.rhs.check(sema)
 
         if self.op is Tag.K_NOT:
             expected_ty = Tag.K_BOOL
@@ -380,70 +558,110 @@ class UnaryExpr(Expr):
             result_ty   = Tag.K_INT
 
         if not same(r_ty, expected_ty):
-            err(self.rhs.loc, f"operand of operator '{self.op}' must be of type '{expected_ty}' but is of type '{r_ty}'")
+            sema.diags.err(self.rhs.loc, f"operand of operator '{self.op}' must be of type '{expected_ty}' but is of type '{r_ty}'")
 
         return result_ty
 
     def eval(self, env):
-        r = self.rhs.eval(env)
+        r = yield self.rhs.eval(env)
         if self.op is Tag.K_NOT: return not r
         if self.op is Tag.T_ADD: return     r
         if self.op is Tag.T_SUB: return -   r
         assert False
 
 class BoolExpr(Expr):
+    __slots__ = ("val",)
+    ty = Tag.K_BOOL
+
     def __init__(self, loc, val):
         super().__init__(loc)
         self.val = val
 
-    def __str__(self):
-        if EMIT is Emit.PY: return "True" if self.val else "False"
-        return "true" if self.val else "false"
+    def emit(self, out):
+        if out.emit is Emit.PY:
+            out.write("True" if self.val else "False")
+        else:
+            out.write("true" if self.val else "false")
 
     def check(self, _):
-        self.ty = Tag.K_BOOL
         return self.ty
 
     def eval(self, _):
         return self.val
 
 class SymExpr(Expr):
+    __slots__ = ("sym", "decl")
+
     def __init__(self, loc, sym):
         super().__init__(loc)
         self.sym  = sym
         self.decl = None
 
-    def __str__(self):
-        return f"{name(self.decl, self.sym)}"
+    @property
+    def ty(self):
+        return self.decl.ty if self.decl is not None else None
+
+    def emit(self, out):
+        out.write(name(out.emit, self.decl, self.sym))
 
     def check(self, sema):
         if (decl := sema.find(self.sym)) is not None:
             self.decl = decl
-            self.ty   = decl.ty
-            return self.ty
+            return decl.ty
         return None
 
     def eval(self, env):
-        return env[name(self.decl)]
+        return env[self.decl.slot]
 
 class LitExpr(Expr):
+    __slots__ = ("val",)
+    ty = Tag.K_INT
+
     def __init__(self, loc, val):
         super().__init__(loc)
         self.val = val
 
-    def __str__(self):
-        return f"{self.val}"
+    def emit(self, out):
+        out.write(f"{self.val}")
 
     def check(self, _):
-        self.ty = Tag.K_INT
         return self.ty
 
     def eval(self, _):
         return self.val
 
 class ErrExpr(Expr):
-    def __str__(self):
-        return "<error>"
+    __slots__ = ()
+    ty = None
+
+    def emit(self, out):
+        out.write("<error>")
 
     def check(self, _):
         return None
+
+class Nodes:
+    """
+    What the Parser builds the AST with; arena.Arena provides the same methods to build arrays instead.
+    The declarations built by the same Nodes are numbered in the order they are built.
+    """
+    prog        = Prog
+    assign_stmt = AssignStmt
+    stmt_list   = StmtList
+    if_stmt     = IfStmt
+    while_stmt  = WhileStmt
+    bin_expr    = BinExpr
+    unary_expr  = UnaryExpr
+    bool_expr   = BoolExpr
+    sym_expr    = SymExpr
+    lit_expr    = LitExpr
+    err_expr    = ErrExpr
+
+    def __init__(self):
+        self.num_decls = 0
+
+    def decl_stmt(self, loc, ty, sym, init):
+        decl = DeclStmt(loc, ty, sym, init)
+        decl.counter    = self.num_decls
+        self.num_decls += 1
+        return decl